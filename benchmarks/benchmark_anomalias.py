@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Detector de anomalías de tráfico (bandwidth_monitor.py) contra el Floodlight simulado:
+#
+#   python3 benchmarks/benchmark_anomalias.py --hosts 5000 --distribucion 8 --acceso 16 --usuarios 200 --atacantes 6
+#
+# Conecta --usuarios hosts (para que haya flujos 'conn-*'), sondea los contadores hasta pasar
+# el calentamiento y, tras un periodo limpio, hace que --atacantes hosts inunden la red: la
+# mitad con sesión (detectables por sus flujos) y la otra mitad sin ella (solo por su puerto).
+# Informa del coste de cada sondeo (descarga y cálculo), de los falsos positivos y del
+# tiempo desde el inicio del ataque hasta la cuarentena.
+
+import json
+import time
+import random
+import argparse
+import urllib.request
+
+from benchmark_sdn import Benchmark, percentile, silenciado
+from mock_floodlight import add_topology_arguments
+
+
+class BenchmarkAnomalias(Benchmark):
+
+    def post(self, path, body):
+        _, url = self.mocks[0]
+        request = urllib.request.Request(url + path, data=json.dumps(body).encode(), method="POST")
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+    def sondear(self, monitor, segundos, atacantes=None, bloqueos=None):
+        """
+        Sondea los puertos cada --intervalo y los flujos cada --intervalo-flujos durante
+        'segundos'. Con 'atacantes', termina en cuanto todos están en cuarentena y anota en
+        'bloqueos' el instante en que se vio a cada uno bloqueado.
+        """
+        fin = time.monotonic() + segundos
+        siguiente_flujos = time.monotonic()
+        while time.monotonic() < fin:
+            inicio = time.monotonic()
+            monitor.poll_ports()
+            if inicio >= siguiente_flujos:
+                siguiente_flujos = inicio + self.args.intervalo_flujos
+                monitor.poll_flows()
+            if atacantes is not None:
+                ahora = time.monotonic()
+                for mac in atacantes:
+                    if mac not in bloqueos and mac in monitor.batcher.blocked:
+                        bloqueos[mac] = ahora
+                if len(bloqueos) == len(atacantes):
+                    return
+            time.sleep(max(0.0, inicio + self.args.intervalo - time.monotonic()))
+
+    def run(self):
+        import bandwidth_monitor as bm
+        import sdn_manager
+        from topologias import H3_MAC
+
+        macs = self.sample_hosts()
+        with silenciado():
+            manager = sdn_manager.SdnConnectionManager()
+            roles = [f"ROLE={rol}" for rol in manager.policy.roles()]
+            for i, mac in enumerate(macs):
+                manager.crear_conexion(roles[i % len(roles)], mac)
+
+        cluster, device_cache, _, _ = bm.runtime()
+        pusher = bm.FlowPusher(bm.STATIC_FLOW_URL, max_workers=self.args.workers, logger=print, verbose=False,
+                               cluster=cluster)
+        batcher = bm.QuarantineBatcher(device_cache, pusher, 0.05, protected=[H3_MAC], source="bandwidth",
+                                       manager=manager).start()
+        topology = bm.TopologyGraph(bm.BASE_URL + bm.LINKS_PATH, logger=lambda message: None, cluster=cluster)
+        detector_args = {"z": self.args.umbral_z, "min_rate": self.args.min_mbps * 1e6 / 8,
+                         "warmup": self.args.calentamiento}
+        monitor = bm.BandwidthMonitor(batcher, device_cache, topology, detector_args, cluster=cluster)
+
+        calentamiento = (self.args.calentamiento + 2) * max(self.args.intervalo, self.args.intervalo_flujos)
+        with silenciado():
+            self.sondear(monitor, calentamiento)
+            falsos_antes = set(batcher.blocked)
+            self.sondear(monitor, self.args.limpio)
+        falsos = set(batcher.blocked)
+
+        todos = sorted({d["mac"][0] for devices in self._get_all("/wm/device/") for d in devices} - {H3_MAC} - set(macs))
+        random.Random(2).shuffle(todos)
+        atacantes = macs[:self.args.atacantes // 2] + todos[:self.args.atacantes - self.args.atacantes // 2]
+        bloqueos = {}
+        inicio = time.monotonic()
+        for mac in atacantes:
+            self.post("/mock/attack", {"mac": mac, "tasa": self.args.tasa_mbps * 1e6 / 8})
+        with silenciado():
+            self.sondear(monitor, self.args.espera, atacantes, bloqueos)
+        batcher.stop()
+        pusher.close()
+
+        latencias = [bloqueos[mac] - inicio for mac in atacantes if mac in bloqueos]
+        resultado = {
+            "puertos": len(monitor.ports),
+            "flujos": len(monitor.flows),
+            "hosts_con_flujos": len(monitor.macs),
+            "sondeo_p50_ms": round(percentile(monitor.poll_times, 50) * 1000, 2),
+            "sondeo_p99_ms": round(percentile(monitor.poll_times, 99) * 1000, 2),
+            "calculo_p50_ms": round(percentile(monitor.compute_times, 50) * 1000, 3),
+            "calculo_p99_ms": round(percentile(monitor.compute_times, 99) * 1000, 3),
+            "falsos_positivos": len(falsos),
+            "falsos_en_calentamiento": len(falsos_antes),
+            "atacantes": len(atacantes),
+            "detectados": len(latencias),
+            "deteccion_p50_s": round(percentile(latencias, 50), 2),
+            "deteccion_max_s": round(max(latencias, default=0.0), 2),
+        }
+        self.results.append(resultado)
+        print(f"[*] Topología '{self.args.topologia}', {self.args.hosts} hosts, {len(macs)} sesiones, "
+              f"sondeo cada {self.args.intervalo} s (flujos cada {self.args.intervalo_flujos} s)")
+        print(f"    {resultado['puertos']} puertos, {resultado['flujos']} flujos, {resultado['hosts_con_flujos']} hosts con flujos")
+        print(f"    sondeo de puertos p50 {resultado['sondeo_p50_ms']} ms, p99 {resultado['sondeo_p99_ms']} ms "
+              f"(cálculo p50 {resultado['calculo_p50_ms']} ms, p99 {resultado['calculo_p99_ms']} ms)")
+        print(f"    falsos positivos: {resultado['falsos_positivos']} (en el calentamiento {resultado['falsos_en_calentamiento']})")
+        print(f"    atacantes en cuarentena: {resultado['detectados']}/{resultado['atacantes']}, "
+              f"desde el inicio del ataque p50 {resultado['deteccion_p50_s']} s, máx {resultado['deteccion_max_s']} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector de anomalías de tráfico contra un Floodlight simulado.")
+    add_topology_arguments(parser)
+    parser.add_argument('--usuarios', type=int, default=100, help="Hosts con sesión (flujos 'conn-*').")
+    parser.add_argument('--atacantes', type=int, default=6, help="Hosts que empiezan a inundar la red.")
+    parser.add_argument('--tasa-mbps', type=float, default=100.0, help="Tráfico de cada atacante en Mbit/s.")
+    parser.add_argument('--intervalo', type=float, default=0.25, help="Segundos entre sondeos de los puertos.")
+    parser.add_argument('--intervalo-flujos', type=float, default=1.0, help="Segundos entre sondeos de los flujos.")
+    parser.add_argument('--umbral-z', type=float, default=6.0)
+    parser.add_argument('--min-mbps', type=float, default=10.0)
+    parser.add_argument('--calentamiento', type=int, default=10, help="Muestras antes de poder marcar una anomalía.")
+    parser.add_argument('--limpio', type=float, default=10.0, help="Segundos de tráfico normal tras el calentamiento.")
+    parser.add_argument('--espera', type=float, default=20.0, help="Segundos máximos para poner en cuarentena a los atacantes.")
+    parser.add_argument('--workers', type=int, default=32, help="Peticiones simultáneas por lote de cuarentena.")
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON.")
+    args = parser.parse_args()
+    args.controladores, args.respaldo = 1, False
+
+    bench = BenchmarkAnomalias(args)
+    try:
+        bench.run()
+    finally:
+        bench.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(bench.results, f, indent=2)
+        print(f"[*] Resultados guardados en {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compara tres formas de localizar una MAC en /wm/device/ según el tamaño de la tabla:
+#
+#   completa   descarga entera con response.json() y búsqueda en la lista (comportamiento anterior)
+#   filtro     DeviceCache con '?mac=' contra un controlador que admite el filtro
+#   streaming  DeviceCache contra un controlador que lo ignora: recorrido incremental
+#              que corta la descarga al encontrar la MAC
+#
+#   python3 benchmarks/benchmark_dispositivos.py --tamanos 1000,10000,50000 --busquedas 50
+#
+# Informa de la latencia p50/p99 por búsqueda y del pico de memoria de Python (tracemalloc).
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import tracemalloc
+
+import requests
+
+from benchmark_sdn import BENCH_DIR, SCRIPTS_DIR, percentile
+
+sys.path.insert(0, SCRIPTS_DIR)
+from device_cache import DeviceCache
+
+
+def start_mock(hosts, filtros):
+    cmd = [sys.executable, os.path.join(BENCH_DIR, "mock_floodlight.py"), "--hosts", str(hosts)]
+    if not filtros:
+        cmd.append("--sin-filtros")
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return proc, f"http://127.0.0.1:{int(proc.stdout.readline())}/wm/device/"
+
+
+def busqueda_completa(session, url):
+    """
+    Búsqueda tal como se hacía antes: toda la tabla en memoria para encontrar una MAC.
+    """
+    def buscar(mac):
+        devices = session.get(url, timeout=30).json()
+        for device in devices:
+            if mac in device.get("mac", []):
+                ap = device["attachmentPoint"][0]
+                return ap["switchDPID"], str(ap["port"])
+        return None, None
+    return buscar
+
+
+def busqueda_cache(session, url):
+    cache = DeviceCache(url, timeout=30, session=session, logger=lambda message: None)
+
+    def buscar(mac):
+        # Sin caché: cada búsqueda va al controlador
+        cache.invalidate()
+        return cache.get_attachment_point(mac)
+    return buscar
+
+
+def medir(buscar, macs, muestras_memoria):
+    """
+    Retorna (latencias, pico de memoria en bytes, encontradas).
+    """
+    buscar(macs[0])  # calienta la conexión HTTP
+    latencias = []
+    encontradas = 0
+    for mac in macs:
+        inicio = time.perf_counter()
+        dpid, _ = buscar(mac)
+        latencias.append(time.perf_counter() - inicio)
+        encontradas += dpid is not None
+    pico = 0
+    for mac in macs[:muestras_memoria]:
+        tracemalloc.start()
+        buscar(mac)
+        pico = max(pico, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return latencias, pico, encontradas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia y memoria de las búsquedas en /wm/device/ según el número de hosts.")
+    parser.add_argument('--tamanos', default="1000,10000,50000", help="Tamaños de la tabla de dispositivos, separados por comas.")
+    parser.add_argument('--busquedas', type=int, default=50, help="Búsquedas por método y tamaño.")
+    parser.add_argument('--muestras-memoria', type=int, default=5, help="Búsquedas medidas con tracemalloc.")
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON.")
+    args = parser.parse_args()
+
+    from topologias import host_mac
+    resultados = []
+    print(f"{'hosts':>8} {'método':<10} {'p50 ms':>10} {'p99 ms':>10} {'pico MB':>10} {'encontradas':>12}")
+    for hosts in [int(t) for t in args.tamanos.split(",")]:
+        rng = random.Random(hosts)
+        macs = [host_mac(rng.randint(1, hosts)) for _ in range(args.busquedas)]
+        con_filtro = start_mock(hosts, True)
+        sin_filtro = start_mock(hosts, False)
+        try:
+            metodos = [
+                ("completa", busqueda_completa, con_filtro[1]),
+                ("filtro", busqueda_cache, con_filtro[1]),
+                ("streaming", busqueda_cache, sin_filtro[1]),
+            ]
+            for nombre, construir, url in metodos:
+                with requests.Session() as session:
+                    latencias, pico, encontradas = medir(construir(session, url), macs, args.muestras_memoria)
+                resultado = {
+                    "hosts": hosts, "metodo": nombre, "busquedas": len(latencias),
+                    "p50_ms": round(percentile(latencias, 50) * 1000, 2),
+                    "p99_ms": round(percentile(latencias, 99) * 1000, 2),
+                    "pico_mb": round(pico / 2**20, 2),
+                    "encontradas": encontradas,
+                }
+                resultados.append(resultado)
+                print(f"{hosts:>8} {nombre:<10} {resultado['p50_ms']:>10} {resultado['p99_ms']:>10} "
+                      f"{resultado['pico_mb']:>10} {encontradas:>12}")
+        finally:
+            for proc, _ in (con_filtro, sin_filtro):
+                proc.terminate()
+                proc.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"parametros": vars(args), "resultados": resultados}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
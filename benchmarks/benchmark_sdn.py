@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Pruebas de carga de los scripts del proyecto contra el Floodlight simulado.
+#
+#   python3 benchmarks/benchmark_sdn.py --topologia campus --hosts 2000 --usuarios 200 --latencia-ms 2
+#
+# Mide crear_conexion, borrar_conexion.main y la instalación/borrado de cuarentenas de
+# default_flows, e informa de la latencia p50/p99 por operación y de los flujos/s.
+#
+# Con --controladores N arranca N simuladores que se reparten los switches (ver
+# controllers.py) y, al final, repite los logins con una de las instancias caída.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import urllib.request
+from collections import Counter
+
+from mock_floodlight import add_topology_arguments
+from topologias import H3_MAC
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), "scripts")
+
+
+def percentile(values, p):
+    """
+    Percentil p (0-100) por el método del rango más cercano.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+@contextlib.contextmanager
+def silenciado():
+    """
+    Descarta la salida de los scripts durante la medición.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        yield
+
+
+class Benchmark:
+    """
+    Arranca el Floodlight simulado (una o varias instancias) en subprocesos y prepara el
+    entorno de los scripts.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+        self.workdir = tempfile.mkdtemp(prefix="sdn-bench-")
+        self.mocks = [self._start_mock(i) for i in range(args.controladores)]
+        self.base_urls = [url for _, url in self.mocks]
+        # Los scripts leen la configuración del entorno al importarse
+        os.environ["FLOODLIGHT_IP"], os.environ["FLOODLIGHT_PORT"] = self.base_urls[0][len("http://"):].split(":")
+        if args.controladores > 1:
+            os.environ["FLOODLIGHT_CONTROLLERS"] = ",".join(self.base_urls)
+        os.environ["SDN_FLOW_REGISTRY"] = os.path.join(self.workdir, "flows.db")
+        os.environ["SDN_MANAGER_SOCKET"] = os.path.join(self.workdir, "sin-demonio.sock")
+        os.environ["SDN_SNAPSHOT"] = os.path.join(self.workdir, "estado.snap")
+        sys.path.insert(0, SCRIPTS_DIR)
+
+    def _start_mock(self, instancia):
+        cmd = [sys.executable, os.path.join(BENCH_DIR, "mock_floodlight.py"),
+               "--topologia", self.args.topologia, "--hosts", str(self.args.hosts),
+               "--distribucion", str(self.args.distribucion), "--acceso", str(self.args.acceso),
+               "--k", str(self.args.k), "--flujos", str(self.args.flujos),
+               "--latencia-ms", str(self.args.latencia_ms),
+               "--instancias", str(self.args.controladores), "--instancia", str(instancia)]
+        cmd += ["--sin-filtros"] if self.args.sin_filtros else []
+        cmd += ["--respaldo"] if self.args.respaldo else []
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        return proc, f"http://127.0.0.1:{int(proc.stdout.readline())}"
+
+    def _get_all(self, path):
+        """
+        GET de 'path' en todas las instancias que siguen en marcha.
+        """
+        results = []
+        for proc, url in self.mocks:
+            if proc.poll() is None:
+                with urllib.request.urlopen(url + path) as response:
+                    results.append(json.load(response))
+        return results
+
+    def mock_stats(self):
+        total = Counter()
+        for stats in self._get_all("/mock/stats"):
+            total.update(stats)
+        return total
+
+    def sample_hosts(self):
+        macs = sorted({d["mac"][0] for devices in self._get_all("/wm/device/") for d in devices} - {H3_MAC})
+        random.Random(1).shuffle(macs)
+        return macs[:self.args.usuarios]
+
+    def record(self, nombre, latencias, flujos, total):
+        """
+        Guarda y muestra el resultado de una prueba.
+        """
+        resultado = {
+            "prueba": nombre,
+            "operaciones": len(latencias),
+            "p50_ms": round(percentile(latencias, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencias, 99) * 1000, 2),
+            "flujos": flujos,
+            "flujos_s": round(flujos / total, 1) if total else 0.0,
+            "total_s": round(total, 3),
+        }
+        self.results.append(resultado)
+        print(f"{nombre:<32} {resultado['operaciones']:>6} {resultado['p50_ms']:>10} {resultado['p99_ms']:>10} "
+              f"{flujos:>8} {resultado['flujos_s']:>10}")
+
+    def timed(self, nombre, operaciones, contador):
+        """
+        Ejecuta cada operación midiendo su latencia; 'contador' indica qué peticiones del
+        simulador cuentan como flujos (push o delete).
+        """
+        antes = self.mock_stats().get(contador, 0)
+        latencias = []
+        inicio = time.perf_counter()
+        with silenciado():
+            for operacion in operaciones:
+                t = time.perf_counter()
+                operacion()
+                latencias.append(time.perf_counter() - t)
+        total = time.perf_counter() - inicio
+        flujos = self.mock_stats().get(contador, 0) - antes
+        self.record(nombre, latencias, flujos, total)
+
+    def run(self):
+        import sdn_manager
+        import borrar_conexion
+        import default_flows
+
+        macs = self.sample_hosts()
+        print(f"[*] Topología '{self.args.topologia}', {self.args.hosts} hosts, {len(macs)} usuarios, "
+              f"latencia {self.args.latencia_ms} ms")
+        print(f"{'prueba':<32} {'ops':>6} {'p50 ms':>10} {'p99 ms':>10} {'flujos':>8} {'flujos/s':>10}")
+
+        with silenciado():
+            manager = sdn_manager.SdnConnectionManager()
+        roles = [f"ROLE={rol}" for rol in manager.policy.roles()]
+        self.timed("crear_conexion", [lambda m=m, i=i: manager.crear_conexion(roles[i % len(roles)], m)
+                                      for i, m in enumerate(macs)], "push")
+
+        def borrar(mac):
+            sys.argv = ["borrar_conexion.py", mac]
+            try:
+                borrar_conexion.main()
+            except SystemExit:
+                pass
+        self.timed("borrar_conexion.main", [lambda m=m: borrar(m) for m in macs], "delete")
+
+        hosts = {m: m for m in macs}
+        with silenciado():
+            attachment_points = default_flows.runtime().device_cache.lookup_many(macs)
+        self.timed("default_flows install (host)",
+                   [lambda m=m: default_flows.setup_quarantine_for_host(m, *attachment_points[m])
+                    for m in macs if m in attachment_points], "push")
+        self.timed("default_flows delete (host)",
+                   [lambda m=m: default_flows.clear_quarantine_for_host(m) for m in macs], "delete")
+
+        pusher = default_flows.FlowPusher(default_flows.STATIC_FLOW_URL, max_workers=self.args.workers,
+                                          logger=print, verbose=False, cluster=default_flows.runtime().cluster)
+        self.timed("default_flows install (masivo)", [lambda: default_flows.bulk_install(hosts, pusher)], "push")
+        self.timed("default_flows delete (masivo)", [lambda: default_flows.bulk_delete(hosts, pusher)], "delete")
+        pusher.close()
+
+        if self.args.controladores > 1:
+            # Conmutación: cae la última instancia y se repiten los logins
+            proc, url = self.mocks[-1]
+            proc.terminate()
+            proc.wait()
+            self.timed(f"crear_conexion ({url[len('http://'):]} caída)",
+                       [lambda m=m, i=i: manager.crear_conexion(roles[i % len(roles)], m)
+                        for i, m in enumerate(macs)], "push")
+            print(f"[*] Flujos enviados a una instancia que no controla su switch: {self.mock_stats().get('push_ajeno', 0)}")
+
+    def close(self):
+        for proc, _ in self.mocks:
+            if proc.poll() is None:
+                proc.terminate()
+                proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas de carga contra un Floodlight simulado.")
+    add_topology_arguments(parser)
+    parser.add_argument('--usuarios', type=int, default=100, help="Usuarios (MACs) a conectar y desconectar.")
+    parser.add_argument('--workers', type=int, default=32, help="Peticiones simultáneas en las pruebas masivas.")
+    parser.add_argument('--controladores', type=int, default=1, help="Instancias de Floodlight simuladas que se reparten los switches.")
+    parser.add_argument('--respaldo', action='store_true', help="Cada instancia controla también los switches de la siguiente.")
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON.")
+    args = parser.parse_args()
+
+    bench = Benchmark(args)
+    try:
+        bench.run()
+    finally:
+        bench.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"parametros": vars(args), "resultados": bench.results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Histórico de tráfico por sesión (bandwidth_monitor.py --uso y usage_store.py) contra el
+# Floodlight simulado:
+#
+#   python3 benchmarks/benchmark_uso.py --hosts 5000 --distribucion 8 --acceso 16 --usuarios 2000 --filas 20000000
+#
+# Conecta --usuarios hosts (sus flujos 'conn-*' son los que se contabilizan), sondea los
+# contadores de flujos --sondeos veces e informa del coste de cada sondeo (descarga y cálculo
+# del tráfico por host). Después añade al almacén --filas filas sintéticas repartidas en
+# --dias días y mide las consultas: los que más tráfico movieron por rol en un día y en
+# toda la ventana, el total por rol y el histórico de una MAC.
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from benchmark_sdn import Benchmark, percentile, silenciado
+from mock_floodlight import add_topology_arguments
+
+
+class BenchmarkUso(Benchmark):
+
+    def medir(self, nombre, consulta, repeticiones=5):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = consulta()
+            tiempos.append(time.perf_counter() - inicio)
+        self.consultas[nombre] = round(percentile(tiempos, 50) * 1000, 1)
+        return resultado
+
+    def historico(self, store, macs, roles):
+        """
+        Añade --filas filas sintéticas: una por host activo cada --intervalo-uso segundos
+        durante --dias días, terminando ahora.
+        """
+        rng = np.random.default_rng(1)
+        por_intervalo = min(len(macs), max(1, self.args.filas // int(self.args.dias * 86400 / self.args.intervalo_uso)))
+        intervalos = self.args.filas // por_intervalo
+        fin = time.time()
+        inicio = time.perf_counter()
+        for i in range(intervalos):
+            activos = rng.choice(len(macs), por_intervalo, replace=False)
+            trafico = np.column_stack([rng.lognormal(12, 2, (por_intervalo, 3)) * [1, 4, 0.01],
+                                       rng.lognormal(5, 1, (por_intervalo, 3))])
+            store.append(fin - (intervalos - i) * self.args.intervalo_uso, [macs[a] for a in activos],
+                         [roles[a % len(roles)] for a in activos], trafico)
+        return intervalos * por_intervalo, time.perf_counter() - inicio
+
+    def run(self):
+        import bandwidth_monitor as bm
+        import sdn_manager
+        from usage_store import UsageStore, UsageRecorder
+
+        macs = self.sample_hosts()
+        with silenciado():
+            manager = sdn_manager.SdnConnectionManager()
+            roles = [f"ROLE={rol}" for rol in manager.policy.roles()]
+            for i, mac in enumerate(macs):
+                manager.crear_conexion(roles[i % len(roles)], mac)
+
+        directorio = os.path.join(self.workdir, "uso")
+        recorder = UsageRecorder(UsageStore(directorio), manager.flow_registry, self.args.intervalo_uso)
+        cluster, device_cache, _, _ = bm.runtime()
+        topology = bm.TopologyGraph(bm.BASE_URL + bm.LINKS_PATH, logger=lambda message: None, cluster=cluster)
+        monitor = bm.BandwidthMonitor(None, device_cache, topology, cluster=cluster, usage=recorder)
+
+        calculo = []
+        medir_uso = monitor._record_usage
+
+        def record_usage(*args):
+            inicio = time.perf_counter()
+            medir_uso(*args)
+            calculo.append(time.perf_counter() - inicio)
+        monitor._record_usage = record_usage
+
+        sondeos = []
+        with silenciado():
+            for _ in range(self.args.sondeos):
+                inicio = time.perf_counter()
+                flujos = monitor.poll_flows()
+                sondeos.append(time.perf_counter() - inicio)
+                time.sleep(max(0.0, inicio + self.args.intervalo_flujos - time.perf_counter()))
+            recorder.flush()
+
+        store = UsageStore(directorio)
+        ahora = time.time()
+        top = store.top_talkers(ahora - 3600, ahora + 1, 3)
+        por_rol = store.by_role(ahora - 3600, ahora + 1)
+        sesiones = sum(hosts for rol, (hosts, *_) in por_rol.items() if rol)
+
+        filas, escritura = self.historico(store, macs, roles)
+        self.consultas = {}
+        desde_dia, desde_todo = ahora - 86400, ahora - self.args.dias * 86400
+        self.medir("top_1_dia_ms", lambda: store.top_talkers(desde_dia, ahora, 10))
+        self.medir("top_todo_ms", lambda: store.top_talkers(desde_todo, ahora, 10))
+        self.medir("top_rol_todo_ms", lambda: store.top_talkers(desde_todo, ahora, 10, roles[0]))
+        self.medir("por_rol_todo_ms", lambda: store.by_role(desde_todo, ahora))
+        self.medir("mac_7_dias_ms", lambda: store.history(macs[0], ahora - 7 * 86400, ahora, 3600))
+
+        tamano = sum(os.path.getsize(os.path.join(raiz, f)) for raiz, _, ficheros in os.walk(directorio) for f in ficheros)
+        resultado = {
+            "flujos": flujos,
+            "hosts_con_flujos": len(monitor.macs),
+            "sesiones_registradas": sesiones,
+            "sondeo_p50_ms": round(percentile(sondeos, 50) * 1000, 1),
+            "sondeo_p99_ms": round(percentile(sondeos, 99) * 1000, 1),
+            "calculo_p50_ms": round(percentile(calculo, 50) * 1000, 2),
+            "calculo_p99_ms": round(percentile(calculo, 99) * 1000, 2),
+            "filas": len(store),
+            "filas_sinteticas_s": round(filas / escritura),
+            "bytes_por_fila": round(tamano / len(store), 1),
+            **self.consultas,
+        }
+        self.results.append(resultado)
+        print(f"[*] Topología '{self.args.topologia}', {self.args.hosts} hosts, {len(macs)} sesiones")
+        print(f"    {flujos} flujos por sondeo, {resultado['hosts_con_flujos']} hosts con flujos, "
+              f"{sesiones} con tráfico y rol en la última hora")
+        print(f"    sondeo p50 {resultado['sondeo_p50_ms']} ms, p99 {resultado['sondeo_p99_ms']} ms "
+              f"(tráfico por host p50 {resultado['calculo_p50_ms']} ms, p99 {resultado['calculo_p99_ms']} ms)")
+        for rol, usos in sorted(top.items()):
+            print(f"    {rol or '(sin sesión)'}: " + ", ".join(f"{u.mac} {(u.tx_bytes + u.rx_bytes) / 1e6:.1f} MB" for u in usos))
+        print(f"    {resultado['filas']} filas en {self.args.dias} días ({resultado['bytes_por_fila']} bytes/fila, "
+              f"{resultado['filas_sinteticas_s']} filas/s al añadir)")
+        print("    consultas (p50): " + ", ".join(f"{k[:-3]} {v} ms" for k, v in self.consultas.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Histórico de tráfico por sesión contra un Floodlight simulado.")
+    add_topology_arguments(parser)
+    parser.add_argument('--usuarios', type=int, default=1000, help="Hosts con sesión (flujos 'conn-*').")
+    parser.add_argument('--sondeos', type=int, default=10, help="Sondeos de los contadores de flujos.")
+    parser.add_argument('--intervalo-flujos', type=float, default=1.0, help="Segundos entre sondeos de los flujos.")
+    parser.add_argument('--intervalo-uso', type=float, default=60.0, help="Segundos acumulados en cada fila del histórico.")
+    parser.add_argument('--filas', type=int, default=5_000_000, help="Filas sintéticas añadidas al histórico.")
+    parser.add_argument('--dias', type=float, default=30, help="Días que abarcan las filas sintéticas.")
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON.")
+    args = parser.parse_args()
+    args.controladores, args.respaldo = 1, False
+
+    bench = BenchmarkUso(args)
+    try:
+        bench.run()
+    finally:
+        bench.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(bench.results, f, indent=2)
+        print(f"[*] Resultados guardados en {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Floodlight simulado para pruebas de carga. Implementa los endpoints REST que usa el
+# proyecto sobre una topología sintética (ver topologias.py):
+#   GET    /wm/device/          (admite el filtro ?mac=, salvo con --sin-filtros)
+#   GET    /wm/core/controller/switches/json
+#   GET    /wm/topology/links/json
+#   GET    /wm/topology/route/<src>/<port>/<dst>/<port>/json
+#   POST   /wm/staticflowpusher/json
+#   DELETE /wm/staticflowpusher/json
+#   GET    /wm/staticflowpusher/list/<dpid|all>/json
+#   GET    /wm/core/switch/all/port/json   (contadores de puertos con tráfico simulado)
+#   GET    /wm/core/switch/all/flow/json   (contadores de los flujos estáticos, por cookie)
+#   GET    /wm/core/controller/summary/json
+#   GET    /wm/core/system/uptime/json
+#   GET    /mock/stats          (contadores de peticiones del propio simulador)
+#   POST   /mock/attack         {"mac": ..., "tasa": bytes/s}: el host empieza a inundar la red
+#
+# Con --instancias N --instancia I el simulador hace de una de N instancias de Floodlight que
+# se reparten los switches (el switch k es de la instancia k % N): solo ve los hosts, enlaces
+# y rutas de sus switches. Con --respaldo controla además los de la instancia siguiente.
+
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs
+from collections import deque, Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from topologias import TOPOLOGIAS
+
+
+def _listed_flow(flow):
+    """
+    Convierte un flujo en formato de envío al formato que devuelve /list en Floodlight.
+    """
+    skip = {"switch", "name", "priority", "active", "actions", "idle_timeout", "hard_timeout"}
+    listed = {
+        "version": "OF_13", "command": "ADD",
+        "priority": str(flow.get("priority", "32768")),
+        "idleTimeoutSec": str(flow.get("idle_timeout", "0")),
+        "hardTimeoutSec": str(flow.get("hard_timeout", "0")),
+        "match": {k: str(v) for k, v in flow.items() if k not in skip},
+        "instructions": {},
+    }
+    if flow.get("actions"):
+        listed["instructions"] = {"instruction_apply_actions": {"actions": flow["actions"]}}
+    return listed
+
+
+def static_flow_cookie(name):
+    """
+    Cookie que Floodlight asigna a un flujo del Static Flow Pusher (identificador de
+    aplicación 10 y hash del nombre, como StaticFlowEntries.computeEntryCookie).
+    """
+    flow_hash = 2311
+    for c in name:
+        flow_hash = (flow_hash * 211 + ord(c)) & 0xFFFFFFFF
+    return (10 << 52) | flow_hash
+
+
+class FloodlightState:
+    """
+    Estado del controlador simulado: topología, dispositivos y tabla de flujos estáticos.
+    """
+    def __init__(self, topologia, background_flows=0, device_filters=True, owned=None):
+        self.switches = topologia["switches"]
+        # Switches que controla esta instancia (todos si no se reparten)
+        self.owned = set(owned) if owned is not None else set(self.switches)
+        self.links = [l for l in topologia["links"] if l["src-switch"] in self.owned or l["dst-switch"] in self.owned]
+        self.devices = topologia["devices"]
+        # False imita a un controlador que ignora los filtros de /wm/device/
+        self.device_filters = device_filters
+        self._devices_body = None
+        self._devices_by_mac = {mac.lower(): d for d in self.devices for mac in d["mac"]}
+        self.adjacency = {}
+        for link in topologia["links"]:
+            self.adjacency.setdefault(link["src-switch"], []).append((link["dst-switch"], link["src-port"], link["dst-port"]))
+            self.adjacency.setdefault(link["dst-switch"], []).append((link["src-switch"], link["dst-port"], link["src-port"]))
+        # dpid -> {nombre: flujo}
+        self.flows = {}
+        self.flow_switch = {}
+        # nombre -> instante en que caduca (flujos con hard_timeout)
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.started = time.monotonic()
+        self._init_traffic()
+        rng = random.Random(0)
+        for n in range(background_flows):
+            switch = rng.choice(sorted(self.owned))
+            self.push({"switch": switch, "name": f"bg-{n}", "priority": "100", "active": "true",
+                       "in_port": str(rng.randint(1, 48)), "actions": "output=normal"})
+
+    def _init_traffic(self):
+        """
+        Tráfico simulado: cada puerto tiene una tasa base (bytes/s, log-normal) y sus
+        contadores avanzan con ella y un 20 % de ruido cada vez que se consultan.
+        """
+        rng = random.Random(1)
+        self._rng = random.Random(2)
+        # (dpid, puerto) -> [bytes recibidos, bytes enviados, tasa base]
+        self.port_counters = {}
+        ports = [(l["src-switch"], l["src-port"]) for l in self.links] + [(l["dst-switch"], l["dst-port"]) for l in self.links]
+        ports += [(ap["switchDPID"], ap["port"]) for d in self.devices for ap in d["attachmentPoint"]]
+        for switch, port in ports:
+            if switch in self.owned and (switch, int(port)) not in self.port_counters:
+                self.port_counters[(switch, int(port))] = [0.0, 0.0, rng.lognormvariate(math.log(50_000), 1.0)]
+        # mac sin ':' -> (dpid, puerto) del host
+        self.host_ports = {mac.lower().replace(':', ''): (d["attachmentPoint"][0]["switchDPID"], int(d["attachmentPoint"][0]["port"]))
+                           for d in self.devices for mac in d["mac"]}
+        # mac sin ':' -> bytes/s de ataque que el host añade a su puerto y a sus flujos
+        self.attacks = {}
+        # nombre de flujo -> bytes contados
+        self.flow_bytes = {}
+        self._traffic_at = time.monotonic()
+
+    def _advance_traffic(self):
+        now = time.monotonic()
+        dt, self._traffic_at = now - self._traffic_at, now
+        attacked = {self.host_ports[mac]: rate for mac, rate in self.attacks.items() if mac in self.host_ports}
+        for key, counters in self.port_counters.items():
+            noise = max(0.0, 1 + 0.2 * self._rng.gauss(0, 1))
+            counters[0] += (counters[2] * noise + attacked.get(key, 0)) * dt
+            counters[1] += counters[2] * noise * dt
+        for switch in self.owned:
+            for name in self.flows.get(switch, {}):
+                parts = name.split('-')
+                mac, rate = parts[1], 0.0
+                if parts[0] == "conn" and "fwd" in parts:
+                    base = self.port_counters.get(self.host_ports.get(mac), (0, 0, 0))[2]
+                    # Con cuarentena el tráfico del ataque lo cuenta el flujo 'drop-all'
+                    blocked = f"qtn-{mac}-drop-all" in self.flow_switch
+                    rate = base + (0 if blocked else self.attacks.get(mac, 0))
+                elif parts[0] == "conn" and "rev" in parts:
+                    # Las respuestas de los servicios: más tráfico de bajada que de subida
+                    rate = 4 * self.port_counters.get(self.host_ports.get(mac), (0, 0, 0))[2]
+                elif name.endswith("-drop-all"):
+                    rate = self.attacks.get(mac, 0)
+                self.flow_bytes[name] = self.flow_bytes.get(name, 0.0) + rate * dt
+
+    def attack(self, mac, rate):
+        with self.lock:
+            key = mac.lower().replace(':', '')
+            if rate:
+                self.attacks[key] = float(rate)
+            else:
+                self.attacks.pop(key, None)
+
+    def port_stats(self):
+        """
+        Cuerpo de /wm/core/switch/all/port/json (formato de Floodlight 1.x con OpenFlow 1.3).
+        """
+        with self.lock:
+            self._advance_traffic()
+            body = {}
+            for (switch, port), (rx, tx, _) in self.port_counters.items():
+                replies = body.setdefault(switch, {"port_reply": [{"version": "OF_13", "port": []}]})
+                replies["port_reply"][0]["port"].append({
+                    "port_number": str(port), "receive_bytes": str(int(rx)), "transmit_bytes": str(int(tx)),
+                    "receive_packets": str(int(rx) // 700), "transmit_packets": str(int(tx) // 700),
+                    "receive_dropped": "0", "transmit_dropped": "0", "duration_sec": "0"})
+            return body
+
+    def flow_stats(self):
+        """
+        Cuerpo de /wm/core/switch/all/flow/json: los flujos estáticos con su cookie y sus contadores.
+        """
+        with self.lock:
+            self._advance_traffic()
+            body = {}
+            for switch in self.owned:
+                flows = body.setdefault(switch, {"flows": []})["flows"]
+                for name, flow in self.flows.get(switch, {}).items():
+                    byte_count = int(self.flow_bytes.get(name, 0))
+                    flows.append({"version": "OF_13", "cookie": str(static_flow_cookie(name)), "table_id": "0x0",
+                                  "packet_count": str(byte_count // 700), "byte_count": str(byte_count),
+                                  "priority": str(flow.get("priority", "32768"))})
+            return body
+
+    def push(self, flow):
+        if flow["switch"] not in self.owned:
+            # Flujo enviado a una instancia que no controla el switch
+            self.requests["push_ajeno"] += 1
+        with self.lock:
+            old = self.flow_switch.get(flow["name"])
+            if old is not None:
+                self.flows[old].pop(flow["name"], None)
+            self.flows.setdefault(flow["switch"], {})[flow["name"]] = flow
+            self.flow_switch[flow["name"]] = flow["switch"]
+            hard_timeout = int(flow.get("hard_timeout", 0))
+            if hard_timeout:
+                self.expires[flow["name"]] = time.monotonic() + hard_timeout
+            else:
+                self.expires.pop(flow["name"], None)
+
+    def delete(self, name):
+        with self.lock:
+            switch = self.flow_switch.pop(name, None)
+            self.expires.pop(name, None)
+            if switch is None:
+                return False
+            self.flows[switch].pop(name, None)
+            self.flow_bytes.pop(name, None)
+            return True
+
+    def _expire(self):
+        """
+        Retira los flujos cuyo hard_timeout ha vencido, como hace el switch (y Floodlight
+        los quita de su almacén). El idle_timeout no se simula: no hay tráfico.
+        """
+        now = time.monotonic()
+        for name in [n for n, t in self.expires.items() if t <= now]:
+            del self.expires[name]
+            self.flows[self.flow_switch.pop(name)].pop(name, None)
+
+    def list_flows(self, dpid):
+        with self.lock:
+            self._expire()
+            switches = self.flows.keys() if dpid == "all" else [dpid]
+            return {s: [{name: _listed_flow(f)} for name, f in self.flows.get(s, {}).items()] for s in switches}
+
+    def summary(self):
+        """
+        Cuerpo de /wm/core/controller/summary/json.
+        """
+        return {"# Switches": len(self.owned), "# hosts": sum(1 for d in self.devices if self._visible(d)),
+                "# quarantine ports": 0, "# inter-switch links": len(self.links)}
+
+    def uptime(self):
+        return {"systemUptimeMsec": int((time.monotonic() - self.started) * 1000)}
+
+    def devices_body(self, query):
+        """
+        Cuerpo de /wm/device/. La tabla completa se serializa una sola vez.
+        """
+        macs = parse_qs(query).get("mac")
+        if macs and self.device_filters:
+            device = self._devices_by_mac.get(macs[0].lower())
+            return json.dumps([device] if device and self._visible(device) else []).encode()
+        if self._devices_body is None:
+            self._devices_body = json.dumps([d for d in self.devices if self._visible(d)]).encode()
+        return self._devices_body
+
+    def _visible(self, device):
+        return any(ap["switchDPID"] in self.owned for ap in device["attachmentPoint"])
+
+    def switches_body(self):
+        """
+        Cuerpo de /wm/core/controller/switches/json: los switches de esta instancia.
+        """
+        return [{"switchDPID": sw, "inetAddress": "/127.0.0.1:6653", "openFlowVersion": "OF_13"}
+                for sw in self.switches if sw in self.owned]
+
+    def move_device(self, mac, dpid, port):
+        """
+        Cambia el punto de conexión de un host, como si se hubiera movido a otro AP o puerto.
+        """
+        device = self._devices_by_mac[mac.lower()]
+        device["attachmentPoint"] = [{"switchDPID": dpid, "port": int(port)}]
+        device["lastSeen"] = int(time.time() * 1000)
+        self._devices_body = None
+
+    def route(self, src, src_port, dst, dst_port):
+        """
+        Ruta de menor número de saltos con el formato de /wm/topology/route. Una instancia
+        solo conoce rutas entre sus propios switches.
+        """
+        if src not in self.owned or dst not in self.owned:
+            return []
+        parent = {src: None}
+        queue = deque([src])
+        while queue and dst not in parent:
+            current = queue.popleft()
+            for neighbour, local_port, remote_port in self.adjacency.get(current, []):
+                if neighbour not in parent:
+                    parent[neighbour] = (current, local_port, remote_port)
+                    queue.append(neighbour)
+        if dst not in parent:
+            return []
+        hops = []
+        current, out_port = dst, dst_port
+        while parent[current] is not None:
+            previous, local_port, remote_port = parent[current]
+            hops.append((current, remote_port, out_port))
+            current, out_port = previous, local_port
+        hops.append((src, src_port, out_port))
+        route = []
+        for switch, in_port, out in reversed(hops):
+            route += [{"switch": switch, "port": {"portNumber": int(in_port)}},
+                      {"switch": switch, "port": {"portNumber": int(out)}}]
+        return route
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo van en escrituras separadas: sin esto, Nagle y el ACK retardado
+    # añaden ~40 ms a cada respuesta pequeña
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, obj, code=200):
+        self._reply_body(json.dumps(obj).encode(), code)
+
+    def _reply_body(self, body, code=200):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó la descarga en cuanto encontró lo que buscaba
+            self.close_connection = True
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _delay(self, kind):
+        self.server.state.requests[kind] += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def do_GET(self):
+        state = self.server.state
+        path, _, query = self.path.partition("?")
+        parts = path.strip("/").split("/")
+        if path == "/mock/stats":
+            return self._reply(dict(state.requests))
+        if path.startswith("/wm/device"):
+            self._delay("device")
+            return self._reply_body(state.devices_body(query))
+        if path == "/wm/core/controller/switches/json":
+            self._delay("switches")
+            return self._reply(state.switches_body())
+        if path == "/wm/topology/links/json":
+            self._delay("links")
+            return self._reply(state.links)
+        if path == "/wm/core/controller/summary/json":
+            self._delay("summary")
+            return self._reply(state.summary())
+        if path == "/wm/core/system/uptime/json":
+            self._delay("uptime")
+            return self._reply(state.uptime())
+        if parts[:3] == ["wm", "topology", "route"] and len(parts) == 8:
+            self._delay("route")
+            return self._reply(state.route(parts[3], parts[4], parts[5], parts[6]))
+        if path == "/wm/core/switch/all/port/json":
+            self._delay("port_stats")
+            return self._reply(state.port_stats())
+        if path == "/wm/core/switch/all/flow/json":
+            self._delay("flow_stats")
+            return self._reply(state.flow_stats())
+        if parts[:3] == ["wm", "staticflowpusher", "list"] and len(parts) == 5:
+            self._delay("list")
+            return self._reply(state.list_flows(parts[3]))
+        self._reply({"status": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path == "/mock/attack":
+            body = self._body()
+            self.server.state.attack(body["mac"], body.get("tasa", 0))
+            return self._reply({"status": "ok"})
+        if self.path != "/wm/staticflowpusher/json":
+            return self._reply({"status": "not found"}, 404)
+        self._delay("push")
+        flow = self._body()
+        self.server.state.push(flow)
+        self._reply({"status": "Flow rule pushed"})
+
+    def do_DELETE(self):
+        if self.path != "/wm/staticflowpusher/json":
+            return self._reply({"status": "not found"}, 404)
+        self._delay("delete")
+        name = self._body().get("name")
+        if self.server.state.delete(name):
+            return self._reply({"status": f"Entry {name} deleted"})
+        self._reply({"status": f"Entry {name} not found"})
+
+
+class MockFloodlight(ThreadingHTTPServer):
+    """
+    Servidor HTTP del controlador simulado. 'latency' son los segundos que se retrasa
+    cada petición para imitar la latencia del controlador real.
+    """
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, state, port=0, latency=0.0, host="127.0.0.1"):
+        super().__init__((host, port), MockHandler)
+        self.state = state
+        self.latency = latency
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def build_state(args):
+    kwargs = {"hosts": args.hosts}
+    if args.topologia == "campus":
+        kwargs.update(distribucion=args.distribucion, acceso=args.acceso)
+    else:
+        kwargs.update(k=args.k)
+    topologia = TOPOLOGIAS[args.topologia](**kwargs)
+    owned = None
+    if getattr(args, "instancias", 1) > 1:
+        propias = {args.instancia % args.instancias}
+        if args.respaldo:
+            propias.add((args.instancia + 1) % args.instancias)
+        owned = [sw for k, sw in enumerate(topologia["switches"]) if k % args.instancias in propias]
+    return FloodlightState(topologia, background_flows=args.flujos, device_filters=not args.sin_filtros, owned=owned)
+
+
+def add_topology_arguments(parser):
+    """
+    Argumentos comunes para describir la topología sintética.
+    """
+    parser.add_argument('--topologia', choices=sorted(TOPOLOGIAS), default="campus")
+    parser.add_argument('--hosts', type=int, default=1000, help="Número de hosts.")
+    parser.add_argument('--distribucion', type=int, default=4, help="Switches de distribución (campus).")
+    parser.add_argument('--acceso', type=int, default=8, help="Switches de acceso por distribución (campus).")
+    parser.add_argument('--k', type=int, default=4, help="Parámetro k del fat-tree.")
+    parser.add_argument('--flujos', type=int, default=0, help="Flujos estáticos de fondo precargados.")
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help="Latencia añadida a cada petición.")
+    parser.add_argument('--sin-filtros', action='store_true', help="Ignorar los filtros de /wm/device/ (como un controlador que no los admite).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Floodlight simulado para pruebas de carga.")
+    add_topology_arguments(parser)
+    parser.add_argument('--puerto', type=int, default=0, help="Puerto TCP (0 = uno libre).")
+    parser.add_argument('--instancias', type=int, default=1, help="Instancias de Floodlight que se reparten los switches.")
+    parser.add_argument('--instancia', type=int, default=0, help="Instancia que simula este proceso (0..instancias-1).")
+    parser.add_argument('--respaldo', action='store_true', help="Controlar también los switches de la instancia siguiente.")
+    args = parser.parse_args()
+
+    server = MockFloodlight(build_state(args), args.puerto, args.latencia_ms / 1000)
+    # La primera línea de stdout es el puerto, para que benchmark_sdn.py pueda leerlo
+    print(server.port, flush=True)
+    print(f"[*] Floodlight simulado escuchando en 127.0.0.1:{server.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Generadores de topologías sintéticas para el Floodlight simulado (mock_floodlight.py).
+# Cada topología es un diccionario con:
+#   "switches": lista de DPIDs
+#   "links":    lista de enlaces con el formato de /wm/topology/links/json
+#   "devices":  lista de hosts con el formato de /wm/device/
+# El servidor de servicios H3 se conecta siempre al primer switch del núcleo.
+
+H3_MAC = "fa:16:3e:30:99:e6"
+H3_IP = "10.0.0.3"
+
+
+def dpid(n):
+    """
+    DPID con el formato de Floodlight a partir de un entero.
+    """
+    raw = f"{n:016x}"
+    return ':'.join(raw[i:i+2] for i in range(0, 16, 2))
+
+
+def host_mac(n):
+    return "02:" + ':'.join(f"{(n >> s) & 0xff:02x}" for s in (32, 24, 16, 8, 0))
+
+
+def _link(src, src_port, dst, dst_port):
+    return {"src-switch": src, "src-port": src_port, "dst-switch": dst, "dst-port": dst_port,
+            "type": "internal", "direction": "bidirectional"}
+
+
+def _device(mac, ip, switch, port):
+    return {"mac": [mac], "ipv4": [ip] if ip else [], "vlan": [],
+            "attachmentPoint": [{"switchDPID": switch, "port": port}]}
+
+
+def _attach_hosts(edges, hosts, first_port):
+    """
+    Reparte 'hosts' hosts entre los switches de acceso a partir del puerto 'first_port'.
+    """
+    devices = []
+    for n in range(hosts):
+        switch = edges[n % len(edges)]
+        port = first_port + n // len(edges)
+        devices.append(_device(host_mac(n + 1), f"10.{(n >> 16) & 0xff}.{(n >> 8) & 0xff}.{n & 0xff}", switch, port))
+    return devices
+
+
+def campus_tree(distribucion=4, acceso=8, hosts=1000):
+    """
+    Árbol de campus de tres niveles: un núcleo, 'distribucion' switches de distribución
+    y 'acceso' switches de acceso por cada uno.
+    """
+    core = dpid(1)
+    switches, links = [core], []
+    edges = []
+    counter = 2
+    for d in range(distribucion):
+        dist = dpid(counter)
+        counter += 1
+        switches.append(dist)
+        links.append(_link(core, d + 1, dist, 1))
+        for a in range(acceso):
+            acc = dpid(counter)
+            counter += 1
+            switches.append(acc)
+            edges.append(acc)
+            links.append(_link(dist, a + 2, acc, 1))
+    devices = _attach_hosts(edges, hosts, first_port=2)
+    devices.append(_device(H3_MAC, H3_IP, core, distribucion + 1))
+    return {"switches": switches, "links": links, "devices": devices}
+
+
+def fat_tree(k=4, hosts=None):
+    """
+    Fat-tree de parámetro k (par): (k/2)^2 switches de núcleo, k pods con k/2 switches de
+    agregación y k/2 de acceso. Por defecto k^3/4 hosts, uno por puerto de acceso libre.
+    """
+    half = k // 2
+    counter = 1
+    cores = []
+    for _ in range(half * half):
+        cores.append(dpid(counter))
+        counter += 1
+    switches, links, edges = list(cores), [], []
+    for pod in range(k):
+        aggs, accs = [], []
+        for _ in range(half):
+            aggs.append(dpid(counter))
+            counter += 1
+        for _ in range(half):
+            accs.append(dpid(counter))
+            counter += 1
+        switches += aggs + accs
+        edges += accs
+        for i, agg in enumerate(aggs):
+            # Puertos 1..k/2 hacia el núcleo, k/2+1..k hacia el acceso
+            for j in range(half):
+                links.append(_link(agg, j + 1, cores[i * half + j], pod + 1))
+            for j, acc in enumerate(accs):
+                links.append(_link(agg, half + j + 1, acc, i + 1))
+    if hosts is None:
+        hosts = k ** 3 // 4
+    devices = _attach_hosts(edges, hosts, first_port=half + 1)
+    devices.append(_device(H3_MAC, H3_IP, cores[0], k + 1))
+    return {"switches": switches, "links": links, "devices": devices}
+
+
+TOPOLOGIAS = {
+    "campus": campus_tree,
+    "fattree": fat_tree,
+}
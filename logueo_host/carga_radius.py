@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Generador de carga RADIUS: lanza muchos Access-Request simultáneos, construidos igual
+# que en radius_login.py, a partir de un fichero de credenciales con una línea por usuario:
+#
+#   <usuario> <contraseña> <mac> [rol]
+#
+# El rol solo lo usa el servidor de prueba (--stub), que acepta a los usuarios del fichero
+# y responde con "Reply-Message = ROLE=<rol>" como lo hace FreeRADIUS en este proyecto.
+#
+#   python3 carga_radius.py --stub 18120 --credenciales usuarios.txt
+#   python3 carga_radius.py --credenciales usuarios.txt --servidor 127.0.0.1 --puerto 18120 \
+#       --peticiones 5000 --tasa 500 --concurrencia 1000
+
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+import pyrad.packet
+from pyrad.packet import AccessAccept, AccessReject, PacketError
+
+from radius_login import (SERVIDOR_RADIUS, SECRETO_RADIUS, crear_cliente, crear_peticion, extraer_rol)
+
+# El diccionario se busca junto a este script para poder lanzarlo desde cualquier directorio
+DICCIONARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionary")
+# Cada socket UDP admite como mucho 256 peticiones pendientes (el identificador es de 8 bits)
+IDS_POR_SOCKET = 256
+
+
+def leer_credenciales(path):
+    """
+    Retorna una lista de (usuario, contraseña, mac, rol o None).
+    """
+    credenciales = []
+    with open(path) as f:
+        for linea in f:
+            campos = linea.split("#", 1)[0].split()
+            if len(campos) < 3:
+                continue
+            credenciales.append((campos[0], campos[1], campos[2], campos[3] if len(campos) > 3 else None))
+    return credenciales
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+class CanalRadius(asyncio.DatagramProtocol):
+    """
+    Socket UDP hacia el servidor RADIUS. Empareja cada respuesta con su petición por el
+    identificador y la verifica con el autenticador, como hace pyrad en SendPacket.
+    """
+    def __init__(self):
+        self.transport = None
+        # id -> (petición, futuro)
+        self.pendientes = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < 20 or data[1] not in self.pendientes:
+            return
+        req, futuro = self.pendientes[data[1]]
+        try:
+            reply = req.CreateReply(packet=data)
+            if not req.VerifyReply(reply, data):
+                return
+        except PacketError:
+            return
+        if not futuro.done():
+            futuro.set_result(reply)
+
+    def error_received(self, exc):
+        for _, futuro in self.pendientes.values():
+            if not futuro.done():
+                futuro.set_exception(exc)
+
+
+class GeneradorCarga:
+    """
+    Envía Access-Request concurrentes. 'concurrencia' es el máximo de peticiones pendientes;
+    cada una espera 'timeout' segundos por intento y se reenvía hasta 'reintentos' veces.
+    """
+    def __init__(self, srv, servidor, puerto, concurrencia=1000, timeout=3.0, reintentos=2):
+        self.srv = srv
+        self.destino = (servidor, puerto)
+        self.concurrencia = concurrencia
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.canales = []
+        self.libres = asyncio.Queue()
+        self.resultados = Counter()
+        self.roles = Counter()
+        self.latencias = []
+        self.reenvios = 0
+
+    async def abrir(self):
+        loop = asyncio.get_running_loop()
+        sockets = -(-self.concurrencia // IDS_POR_SOCKET)
+        for _ in range(sockets):
+            _, canal = await loop.create_datagram_endpoint(CanalRadius, remote_addr=self.destino)
+            self.canales.append(canal)
+        for n in range(self.concurrencia):
+            self.libres.put_nowait((self.canales[n % sockets], n // sockets))
+
+    def cerrar(self):
+        for canal in self.canales:
+            canal.transport.close()
+
+    async def login(self, usuario, password, mac):
+        canal, id = await self.libres.get()
+        try:
+            req = crear_peticion(self.srv, usuario, password, mac, id=id)
+            raw = req.RequestPacket()
+            futuro = asyncio.get_running_loop().create_future()
+            canal.pendientes[id] = (req, futuro)
+            inicio = time.perf_counter()
+            for intento in range(self.reintentos + 1):
+                if intento:
+                    self.reenvios += 1
+                canal.transport.sendto(raw)
+                try:
+                    reply = await asyncio.wait_for(asyncio.shield(futuro), self.timeout)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+                except OSError:
+                    self.resultados["error"] += 1
+                    return
+            else:
+                self.resultados["timeout"] += 1
+                return
+            self.latencias.append(time.perf_counter() - inicio)
+            if reply.code == AccessAccept:
+                self.resultados["aceptado"] += 1
+                self.roles[extraer_rol(reply) or "(sin rol)"] += 1
+            elif reply.code == AccessReject:
+                self.resultados["rechazado"] += 1
+            else:
+                self.resultados[f"codigo {reply.code}"] += 1
+        finally:
+            canal.pendientes.pop(id, None)
+            self.libres.put_nowait((canal, id))
+
+    async def ejecutar(self, credenciales, peticiones, tasa=None):
+        """
+        Lanza 'peticiones' logins recorriendo las credenciales en bucle, a 'tasa' peticiones/s
+        (sin límite si es None). Retorna la duración total en segundos.
+        """
+        await self.abrir()
+        inicio = time.perf_counter()
+        tareas = []
+        try:
+            for n in range(peticiones):
+                if tasa:
+                    espera = inicio + n / tasa - time.perf_counter()
+                    if espera > 0:
+                        await asyncio.sleep(espera)
+                usuario, password, mac, _ = credenciales[n % len(credenciales)]
+                tareas.append(asyncio.ensure_future(self.login(usuario, password, mac)))
+            await asyncio.gather(*tareas)
+        finally:
+            self.cerrar()
+        return time.perf_counter() - inicio
+
+    def informe(self, total):
+        enviados = sum(self.resultados.values())
+        informe = {
+            "peticiones": enviados,
+            "segundos": round(total, 3),
+            "peticiones_s": round(enviados / total, 1) if total else 0.0,
+            "resultados": dict(self.resultados),
+            "roles": dict(self.roles),
+            "reenvios": self.reenvios,
+            "p50_ms": round(percentil(self.latencias, 50) * 1000, 2),
+            "p90_ms": round(percentil(self.latencias, 90) * 1000, 2),
+            "p99_ms": round(percentil(self.latencias, 99) * 1000, 2),
+        }
+        print(f"[*] {enviados} Access-Request en {informe['segundos']} s ({informe['peticiones_s']} peticiones/s), "
+              f"{self.reenvios} reenvíos")
+        for resultado in ("aceptado", "rechazado", "timeout", "error"):
+            print(f"    {resultado:<10} {self.resultados.get(resultado, 0):>8}")
+        for resultado, n in self.resultados.items():
+            if resultado.startswith("codigo"):
+                print(f"    {resultado:<10} {n:>8}")
+        print("[*] Roles asignados:")
+        for rol, n in self.roles.most_common():
+            print(f"    {rol:<20} {n:>8}")
+        print(f"[*] Latencia: p50 {informe['p50_ms']} ms, p90 {informe['p90_ms']} ms, p99 {informe['p99_ms']} ms")
+        return informe
+
+
+class StubRadius(asyncio.DatagramProtocol):
+    """
+    Servidor RADIUS de prueba: acepta a los usuarios del fichero de credenciales con su
+    contraseña y responde con su rol; rechaza al resto. 'latencia' son los segundos que
+    tarda en responder.
+    """
+    def __init__(self, srv, credenciales, latencia=0.0):
+        self.srv = srv
+        self.usuarios = {usuario: (password, rol) for usuario, password, _, rol in credenciales}
+        self.latencia = latencia
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            pkt = self.srv.CreateAuthPacket(packet=data)
+            usuario = pkt["User-Name"][0]
+            # Se lee el valor cifrado sin decodificar (atributo 2, User-Password)
+            password = pkt.PwDecrypt(pkt[2][0])
+        except (PacketError, KeyError, IndexError, UnicodeDecodeError):
+            return
+        reply = pkt.CreateReply()
+        esperado = self.usuarios.get(usuario)
+        if esperado and esperado[0] == password:
+            reply.code = AccessAccept
+            if esperado[1]:
+                reply["Reply-Message"] = f"ROLE={esperado[1]}"
+        else:
+            reply.code = pyrad.packet.AccessReject
+        raw = reply.ReplyPacket()
+        if self.latencia:
+            asyncio.get_running_loop().call_later(self.latencia, self.transport.sendto, raw, addr)
+        else:
+            self.transport.sendto(raw, addr)
+
+
+async def servir_stub(srv, credenciales, puerto, latencia):
+    loop = asyncio.get_running_loop()
+    await loop.create_datagram_endpoint(lambda: StubRadius(srv, credenciales, latencia),
+                                        local_addr=("0.0.0.0", puerto))
+    print(f"[*] Servidor RADIUS de prueba escuchando en UDP {puerto} ({len(credenciales)} usuarios)")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga de Access-Request contra FreeRADIUS o un servidor de prueba.")
+    parser.add_argument('--credenciales', required=True, help="Fichero con '<usuario> <contraseña> <mac> [rol]' por línea.")
+    parser.add_argument('--servidor', default=SERVIDOR_RADIUS)
+    parser.add_argument('--puerto', type=int, default=1812)
+    parser.add_argument('--secreto', default=SECRETO_RADIUS.decode())
+    parser.add_argument('--peticiones', type=int, help="Total de Access-Request (por defecto, uno por línea del fichero).")
+    parser.add_argument('--tasa', type=float, help="Peticiones por segundo (por defecto, sin límite).")
+    parser.add_argument('--concurrencia', type=int, default=1000, help="Máximo de peticiones pendientes a la vez.")
+    parser.add_argument('--timeout', type=float, default=3.0, help="Segundos de espera por intento.")
+    parser.add_argument('--reintentos', type=int, default=2, help="Reenvíos de una petición sin respuesta.")
+    parser.add_argument('--json', help="Guardar el informe en este fichero JSON.")
+    parser.add_argument('--stub', type=int, metavar="PUERTO", help="No generar carga: servir un RADIUS de prueba en este puerto UDP.")
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help="Latencia de respuesta del servidor de prueba.")
+    args = parser.parse_args()
+
+    credenciales = leer_credenciales(args.credenciales)
+    if not credenciales:
+        parser.error(f"'{args.credenciales}' no contiene credenciales.")
+    srv = crear_cliente(args.servidor, args.secreto.encode(), DICCIONARIO)
+
+    if args.stub:
+        try:
+            asyncio.run(servir_stub(srv, credenciales, args.stub, args.latencia_ms / 1000))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    generador = GeneradorCarga(srv, args.servidor, args.puerto, args.concurrencia, args.timeout, args.reintentos)
+    total = asyncio.run(generador.ejecutar(credenciales, args.peticiones or len(credenciales), args.tasa))
+    informe = generador.informe(total)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"parametros": vars(args), "informe": informe}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -2,59 +2,101 @@ from pyrad.client import Client
 from pyrad.dictionary import Dictionary
 from pyrad.packet import AccessRequest
 import pyrad.packet
+import os
+import json
+import time
 import getpass
-import netifaces
+
+# Configuración del servidor RADIUS
+SERVIDOR_RADIUS = "192.168.201.200"
+SECRETO_RADIUS = b"testing123"
+DICCIONARIO = "dictionary"
+
+# Fichero JSON lines donde se registra la duración del intercambio RADIUS (vacío = no se registra)
+METRICS_FILE = os.environ.get("RADIUS_METRICS_FILE", "")
 
 #Funcion para capturar la direccion mac
 def get_mac(interface="ens4"):
+    # netifaces solo hace falta en el login interactivo, no al importar este módulo
+    import netifaces
     try:
         return netifaces.ifaddresses(interface)[netifaces.AF_LINK][0]['addr']
     except Exception:
         return "00:00:00:00:00:00"
 
-# Configuración del cliente RADIUS
-srv = Client(server="192.168.201.200", secret=b"testing123", dict=Dictionary("dictionary"))
-srv.AuthPort = 1812
-
-# Entrada por CLI
-username = input("Usuario: ")
-password = getpass.getpass("Password: ")
-mac_address = get_mac()
+#Funcion para registrar la duracion del intercambio con el servidor RADIUS
+def registrar_metrica(duracion, **atributos):
+    if not METRICS_FILE:
+        return
+    linea = {"ts": round(time.time(), 6), "span": "radius.access_request",
+             "duration_ms": round(duracion * 1000, 3), **atributos}
+    with open(METRICS_FILE, "a") as f:
+        f.write(json.dumps(linea) + "\n")
 
-# Crear y enviar paquete RADIUS
-req = srv.CreateAuthPacket(code=AccessRequest, User_Name=username)
-req["User-Password"] = req.PwCrypt(password)
-req["Calling-Station-Id"] = mac_address
+#Funcion para crear el cliente RADIUS
+def crear_cliente(servidor=SERVIDOR_RADIUS, secreto=SECRETO_RADIUS, diccionario=DICCIONARIO):
+    srv = Client(server=servidor, secret=secreto, dict=Dictionary(diccionario))
+    srv.AuthPort = 1812
+    return srv
 
-try:
-    reply = srv.SendPacket(req)
-except Exception as e:
-    print("Error al conectar con el servidor RADIUS:", e)
-    exit()
+#Funcion para construir el Access-Request de un usuario
+def crear_peticion(srv, username, password, mac_address, id=None):
+    req = srv.CreateAuthPacket(code=AccessRequest, User_Name=username, id=id)
+    req["User-Password"] = req.PwCrypt(password)
+    req["Calling-Station-Id"] = mac_address
+    return req
 
-# Procesar respuesta
-if reply.code == pyrad.packet.AccessAccept:
-    print("Acceso permitido")
-
-    rol = None
+#Funcion para extraer el rol del Reply-Message ("ROLE=<rol>")
+def extraer_rol(reply):
     if "Reply-Message" in reply:
         mensaje = reply["Reply-Message"][0]
         if "ROLE=" in mensaje:
-            rol = mensaje.split("=")[1]
-
-    if rol:
-        print(f"Rol asignado: {rol}")
-        # Acciones según rol
-        if rol == "admin":
-            print("Bienvenido administrador")
-        elif rol == "alumno":
-            print("Acceso a recursos académicos habilitado")
-        elif rol == "invitado":
-            print("Acceso limitado como invitado")
+            return mensaje.split("=")[1]
+    return None
+
+def main():
+    # Configuración del cliente RADIUS
+    srv = crear_cliente()
+
+    # Entrada por CLI
+    username = input("Usuario: ")
+    password = getpass.getpass("Password: ")
+    mac_address = get_mac()
+
+    # Crear y enviar paquete RADIUS
+    req = crear_peticion(srv, username, password, mac_address)
+
+    inicio = time.perf_counter()
+    try:
+        reply = srv.SendPacket(req)
+    except Exception as e:
+        registrar_metrica(time.perf_counter() - inicio, mac=mac_address, error=type(e).__name__)
+        print("Error al conectar con el servidor RADIUS:", e)
+        exit()
+    registrar_metrica(time.perf_counter() - inicio, mac=mac_address, code=reply.code,
+                      bytes=len(getattr(reply, "raw_packet", b"") or b""))
+
+    # Procesar respuesta
+    if reply.code == pyrad.packet.AccessAccept:
+        print("Acceso permitido")
+
+        rol = extraer_rol(reply)
+
+        if rol:
+            print(f"Rol asignado: {rol}")
+            # Acciones según rol
+            if rol == "admin":
+                print("Bienvenido administrador")
+            elif rol == "alumno":
+                print("Acceso a recursos académicos habilitado")
+            elif rol == "invitado":
+                print("Acceso limitado como invitado")
+            else:
+                print("Rol no reconocido")
         else:
-            print("Rol no reconocido")
+            print("No se recibió rol del servidor")
     else:
-        print("No se recibió rol del servidor")
-else:
-    print("Acceso denegado. Código:", reply.code)
+        print("Acceso denegado. Código:", reply.code)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Cierre de sesiones a partir del Accounting de RADIUS: recibe los Accounting-Request por
+# UDP (del NAS, o de FreeRADIUS con el módulo 'replicate') o sigue el fichero 'detail' en el
+# que FreeRADIUS los escribe, y borra los flujos 'conn-<mac>-' de los usuarios que cierran
+# sesión sin que nadie tenga que ejecutar borrar_conexion.py.
+#
+#   python3 accounting.py --escuchar 1813
+#   python3 accounting.py --detalle /var/log/freeradius/radacct/10.20.12.1/detail
+#
+# Los Accounting-Stop se encolan y se borran en lotes cada --ventana-ms: una avalancha de
+# logouts (el final de una clase) se convierte en unos pocos borrados por lotes agrupados por
+# switch (SdnConnectionManager.borrar_conexiones). Un Start o Interim-Update de otra sesión
+# de la misma MAC que llegue mientras su Stop espera en la cola cancela el borrado.
+#
+# Servidor de prueba (NAS simulado): reproduce los registros de un fichero 'detail' como
+# Accounting-Request hacia el consumidor:
+#
+#   python3 accounting.py --escuchar 18130 &
+#   python3 accounting.py --reproducir registros.detail --destino 127.0.0.1:18130 --tasa 500 --hora-actual
+
+import os
+import re
+import sys
+import time
+import queue
+import socket
+import argparse
+import threading
+from collections import OrderedDict, namedtuple, deque, Counter
+
+from metrics import METRICS, Span, span
+from log_tail import FileTail, percentile
+
+# --- CONFIGURACIÓN ---
+# Puerto estándar de RADIUS Accounting
+ACCT_PORT = 1813
+# Secreto compartido con el NAS (el mismo que en clients.conf de FreeRADIUS)
+ACCT_SECRET = os.environ.get("SDN_ACCT_SECRET", "testing123").encode()
+# Segundos que se acumulan cierres de sesión antes de borrar un lote
+COALESCE_WINDOW = 0.5
+# MACs como máximo por lote
+MAX_BATCH = 1000
+# Intentos de borrado de una sesión antes de dejársela a flow_sweeper.py
+MAX_ATTEMPTS = 3
+# Sesiones cerradas que se recuerdan para ignorar las retransmisiones de su Stop
+RECENT_SESSIONS = 10000
+# Búfer de recepción del socket UDP, para no perder Accounting-Request en las avalanchas
+RECV_BUFFER = 4 * 1024 * 1024
+# Servidor de prueba: segundos entre retransmisiones de una petición sin respuesta, y
+# retransmisiones como máximo (como un NAS)
+RETRY_INTERVAL = 1.0
+MAX_RETRANSMISSIONS = 3
+# El diccionario se busca junto a este script para poder lanzarlo desde cualquier directorio
+DICTIONARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionary")
+
+# Acct-Status-Type numérico (NAS con diccionarios incompletos) -> nombre
+STATUS_NAMES = {"1": "Start", "2": "Stop", "3": "Interim-Update", "7": "Accounting-On", "8": "Accounting-Off"}
+
+# Calling-Station-Id: 'AA-BB-CC-DD-EE-FF', 'aa:bb:cc:dd:ee:ff', 'aabbccddeeff' o 'aabb.ccdd.eeff',
+# a veces seguido de ':<SSID>'
+MAC_RE = re.compile(r"^\s*((?:[0-9a-f]{2}[-:]?){5}[0-9a-f]{2}|[0-9a-f]{4}\.[0-9a-f]{4}\.[0-9a-f]{4})", re.I)
+
+# Un registro de accounting: tipo ('Start', 'Stop', 'Interim-Update'...), MAC del usuario,
+# Acct-Session-Id, instante del evento (epoch) y usuario
+AccountingRecord = namedtuple("AccountingRecord", ["status", "mac", "session_id", "timestamp", "user"])
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def normalize_mac(value):
+    """
+    Convierte un Calling-Station-Id en 'aa:bb:cc:dd:ee:ff'. Retorna None si no es una MAC.
+    """
+    match = MAC_RE.match(value or "")
+    if match is None:
+        return None
+    hexa = re.sub(r"[-:.]", "", match.group(1)).lower()
+    return ':'.join(hexa[i:i+2] for i in range(0, 12, 2))
+
+
+def parse_detail(text):
+    """
+    Retorna la lista de registros (diccionario atributo -> valor) de un texto en el formato
+    'detail' de FreeRADIUS: una línea con la fecha y una línea '\tAtributo = valor' por
+    atributo, con los registros separados por una línea en blanco.
+    """
+    records = []
+    for bloque in re.split(r"\n[ \t]*\n", text):
+        attrs = {}
+        for linea in bloque.splitlines():
+            # La cabecera con la fecha no va sangrada
+            if '=' in linea and linea[:1].isspace():
+                nombre, valor = linea.split('=', 1)
+                attrs[nombre.strip()] = valor.strip().strip('"')
+        if attrs:
+            records.append(attrs)
+    return records
+
+
+def record_from_attributes(attrs, received=None):
+    """
+    Construye un AccountingRecord con los atributos de un paquete o de un registro 'detail'.
+    El instante del evento es Event-Timestamp, o el Timestamp que añade FreeRADIUS al fichero,
+    o el de llegada. Retorna None si faltan Acct-Status-Type o una MAC en Calling-Station-Id.
+    """
+    status = attrs.get("Acct-Status-Type")
+    mac = normalize_mac(attrs.get("Calling-Station-Id"))
+    if status is None or mac is None:
+        return None
+    timestamp = time.time() if received is None else received
+    for key in ("Event-Timestamp", "Timestamp"):
+        try:
+            timestamp = float(attrs[key])
+            break
+        except (KeyError, ValueError):
+            pass
+    return AccountingRecord(STATUS_NAMES.get(str(status), str(status)), mac, attrs.get("Acct-Session-Id"),
+                            timestamp, attrs.get("User-Name"))
+
+
+class LogoutQueue:
+    """
+    Cola de cierres de sesión pendientes.
+
+    Cada 'window' segundos (antes, si se juntan 'max_batch') borra de una vez los flujos de
+    las MACs pendientes con SdnConnectionManager.borrar_conexiones. Mientras una MAC espera:
+      - otro Stop suyo (retransmisión del NAS o Stop duplicado) se funde con el pendiente;
+      - un Start o Interim-Update de otra sesión lo cancela: el usuario ha vuelto a entrar.
+    Tampoco se borra una sesión cuyo último login es posterior al Stop, ni se repite el
+    borrado de una sesión ya cerrada cuando su Stop llega otra vez.
+    """
+    def __init__(self, manager, window=COALESCE_WINDOW, max_batch=MAX_BATCH, max_attempts=MAX_ATTEMPTS):
+        self.manager = manager
+        self.window = window
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        # mac -> [instante de llegada del Stop (monotonic), AccountingRecord, intentos]
+        self.pending = {}
+        # mac -> AccountingRecord de las sesiones del lote que se está borrando
+        self.inflight = {}
+        # (mac, Acct-Session-Id) de las sesiones cerradas recientemente
+        self.closed = OrderedDict()
+        # Latencias llegada del Stop -> flujos borrados de los últimos cierres
+        self.latencies = deque(maxlen=10000)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def depth(self):
+        return len(self.pending)
+
+    def submit(self, record, received=None):
+        """
+        Entrega un registro de accounting. Retorna True si cambió la cola.
+        """
+        received = time.monotonic() if received is None else received
+        with self._lock:
+            self.stats[record.status] += 1
+            entry = self.pending.get(record.mac)
+            if record.status == "Stop":
+                if (record.mac, record.session_id) in self.closed:
+                    self.stats["duplicados"] += 1
+                    return False
+                inflight = self.inflight.get(record.mac)
+                if inflight is not None and inflight.session_id == record.session_id:
+                    self.stats["fusionados"] += 1
+                    return False
+                if entry is not None:
+                    entry[1] = record
+                    self.stats["fusionados"] += 1
+                    return False
+                self.pending[record.mac] = [received, record, 0]
+                if len(self.pending) >= self.max_batch:
+                    self._wake.set()
+                return True
+            if record.status in ("Start", "Interim-Update") and entry is not None and _new_session(record, entry[1]):
+                del self.pending[record.mac]
+                self.stats["cancelados"] += 1
+                return True
+            return False
+
+    def flush(self):
+        """
+        Borra los flujos de un lote de MACs pendientes. Retorna el número de MACs del lote.
+        """
+        with self._lock:
+            batch = dict(list(self.pending.items())[:self.max_batch])
+            for mac, (_, record, _) in batch.items():
+                del self.pending[mac]
+                self.inflight[mac] = record
+            depth = len(self.pending)
+        if not batch:
+            return 0
+
+        macs = []
+        for mac, (_, record, _) in batch.items():
+            last_login = self.manager.flow_registry.last_login(mac)
+            if last_login is not None and last_login > record.timestamp:
+                self.stats["obsoletos"] += 1
+            else:
+                macs.append(mac)
+        with span("accounting.batch", macs=len(macs), cola=depth):
+            try:
+                resultado = self.manager.borrar_conexiones(macs) if macs else {}
+            except Exception as e:
+                # El lote se reintenta como si no se hubiera podido listar los flujos
+                log(f"[!] Error al borrar el lote de {len(macs)} sesiones: {e}")
+                resultado = None
+
+        now = time.monotonic()
+        with self._lock:
+            for mac in batch:
+                del self.inflight[mac]
+            for mac in macs:
+                received, record, attempts = batch[mac]
+                if resultado is not None and resultado[mac][1] == 0:
+                    self.latencies.append(now - received)
+                    METRICS.record(Span("accounting.logout", {"mac": mac}), now - received)
+                    self.closed[(mac, record.session_id)] = None
+                    if len(self.closed) > RECENT_SESSIONS:
+                        self.closed.popitem(last=False)
+                    self.stats["cerradas"] += 1
+                elif attempts + 1 < self.max_attempts and mac not in self.pending:
+                    self.pending[mac] = [received, record, attempts + 1]
+                    self.stats["reintentos"] += 1
+                else:
+                    self.stats["fallidas"] += 1
+                    log(f"[!] No se pudieron borrar todos los flujos de {mac} tras {attempts + 1} intentos; "
+                        "quedan para el barrido de flow_sweeper.py.")
+            if len(self.pending) >= self.max_batch:
+                self._wake.set()
+        return len(batch)
+
+    def report(self):
+        log(f"[*] Accounting: {self.depth()} cierres en cola, {self.stats['cerradas']} sesiones cerradas, "
+            f"{self.stats['fusionados']} Stop fundidos, {self.stats['cancelados']} cancelados, "
+            f"{self.stats['fallidas']} fallidas; Stop->borrado p50 {percentile(self.latencies, 50) * 1000:.0f} ms, "
+            f"p99 {percentile(self.latencies, 99) * 1000:.0f} ms")
+
+    def run(self, report_interval=None):
+        last_report = time.monotonic()
+        while not self._stop.is_set():
+            self._wake.wait(self.window)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log(f"[!] Error al cerrar sesiones: {e}")
+            if report_interval and time.monotonic() - last_report >= report_interval:
+                self.report()
+                last_report = time.monotonic()
+
+    def start(self, report_interval=None):
+        threading.Thread(target=self.run, args=(report_interval,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+def _new_session(record, stop):
+    """
+    True si 'record' (Start o Interim-Update) pertenece a una sesión posterior a 'stop'.
+    """
+    if record.session_id and stop.session_id:
+        return record.session_id != stop.session_id
+    return record.timestamp > stop.timestamp
+
+
+class AccountingServer:
+    """
+    Servidor de RADIUS Accounting mínimo: comprueba el autenticador de cada Accounting-Request
+    con el secreto compartido, entrega el registro a la cola y responde con un
+    Accounting-Response (el NAS retransmite hasta recibirlo).
+    """
+    def __init__(self, logouts, port=ACCT_PORT, secret=ACCT_SECRET, host="0.0.0.0"):
+        # Importación diferida: pyrad solo hace falta para recibir el accounting por UDP
+        from pyrad.dictionary import Dictionary
+        self.logouts = logouts
+        self.secret = secret
+        self.dictionary = Dictionary(DICTIONARY)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+
+    def handle(self, data, addr):
+        from pyrad.packet import AcctPacket, AccountingRequest, PacketError
+        received = time.monotonic()
+        try:
+            request = AcctPacket(packet=data, secret=self.secret, dict=self.dictionary)
+        except (PacketError, KeyError, ValueError):
+            self.logouts.stats["descartados"] += 1
+            return
+        if request.code != AccountingRequest or not request.VerifyAcctRequest():
+            self.logouts.stats["descartados"] += 1
+            return
+        record = record_from_attributes({name: request[name][0] for name in request.keys() if isinstance(name, str)},
+                                        time.time())
+        if record is not None:
+            self.logouts.submit(record, received)
+        self.sock.sendto(request.CreateReply().ReplyPacket(), addr)
+
+    def serve_forever(self):
+        while True:
+            data, addr = self.sock.recvfrom(4096)
+            try:
+                self.handle(data, addr)
+            except Exception as e:
+                log(f"[!] Error al procesar un Accounting-Request de {addr[0]}: {e}")
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class DetailTail(FileTail):
+    """
+    Fichero 'detail' de FreeRADIUS (módulo detail de la sección accounting), leído a medida
+    que crece. Solo se procesan los registros completos, terminados por una línea en blanco.
+    """
+    def _parse(self, data):
+        end = data.rfind(b"\n\n") + 2 if b"\n\n" in data else 0
+        return end, parse_detail(data[:end].decode("utf-8", errors="replace")), {}
+
+    def follow(self, logouts, poll_interval=0.1):
+        while True:
+            try:
+                attrs_list, _ = self.read()
+                for attrs in attrs_list:
+                    record = record_from_attributes(attrs)
+                    if record is not None:
+                        logouts.submit(record)
+            except Exception as e:
+                log(f"[!] Error al leer el fichero de accounting {self.path}: {e}")
+                attrs_list = None
+            if not attrs_list:
+                time.sleep(poll_interval)
+
+    def start(self, logouts):
+        threading.Thread(target=self.follow, args=(logouts,), daemon=True).start()
+        return self
+
+
+def _attribute_value(dictionary, name, value):
+    """
+    Valor de un atributo de un registro 'detail' listo para pyrad, o None si no se puede enviar.
+    """
+    attribute = dictionary.attributes[name]
+    if attribute.type in ("integer", "date"):
+        if attribute.values.HasForward(value):
+            return value
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return value
+
+
+def replay(path, destino, secret=ACCT_SECRET, rate=0, now=False):
+    """
+    Servidor de prueba: envía los registros del fichero 'detail' 'path' como Accounting-Request
+    a 'destino' (host, puerto), a 'rate' registros por segundo (0 = sin pausa), y espera sus
+    Accounting-Response. Las peticiones sin respuesta se retransmiten cada RETRY_INTERVAL
+    segundos, como hace un NAS. Con 'now' el Event-Timestamp es la hora del envío.
+    Retorna (enviados, confirmados).
+    """
+    from pyrad.dictionary import Dictionary
+    from pyrad.packet import AcctPacket, PacketError
+    dictionary = Dictionary(DICTIONARY)
+    with open(path) as f:
+        records = parse_detail(f.read())
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(destino)
+    # Cada identificador (8 bits) solo puede estar en una petición pendiente
+    libres = queue.Queue()
+    for ident in range(256):
+        libres.put(ident)
+    # id -> [petición, paquete, instante del último envío, retransmisiones]
+    pendientes = {}
+    confirmados = [0]
+    lock = threading.Lock()
+    terminado = threading.Event()
+
+    def recibir():
+        while True:
+            try:
+                raw = sock.recv(4096)
+                reply = AcctPacket(packet=raw, secret=secret, dict=dictionary)
+            except PacketError:
+                continue
+            except OSError:
+                return
+            with lock:
+                entry = pendientes.pop(reply.id, None)
+            if entry is not None:
+                confirmados[0] += entry[0].VerifyReply(reply, raw)
+                libres.put(reply.id)
+
+    def retransmitir():
+        while not terminado.wait(RETRY_INTERVAL / 10):
+            limite = time.monotonic() - RETRY_INTERVAL
+            with lock:
+                vencidos = [(ident, entry) for ident, entry in pendientes.items() if entry[2] <= limite]
+                for ident, entry in vencidos:
+                    if entry[3] >= MAX_RETRANSMISSIONS:
+                        del pendientes[ident]
+                        libres.put(ident)
+                    else:
+                        entry[2], entry[3] = time.monotonic(), entry[3] + 1
+                        sock.send(entry[1])
+
+    threading.Thread(target=recibir, daemon=True).start()
+    threading.Thread(target=retransmitir, daemon=True).start()
+    inicio = time.monotonic()
+    for i, attrs in enumerate(records):
+        if rate:
+            time.sleep(max(0.0, inicio + i / rate - time.monotonic()))
+        ident = libres.get()
+        request = AcctPacket(id=ident, secret=secret, dict=dictionary)
+        if now:
+            attrs = {**attrs, "Event-Timestamp": str(int(time.time()))}
+        elif "Timestamp" in attrs and not attrs.get("Event-Timestamp", "").isdigit():
+            attrs = {**attrs, "Event-Timestamp": attrs["Timestamp"]}
+        for name, value in attrs.items():
+            if name in dictionary.attributes:
+                value = _attribute_value(dictionary, name, value)
+                if value is not None:
+                    request[name] = value
+        raw = request.RequestPacket()
+        with lock:
+            pendientes[ident] = [request, raw, time.monotonic(), 0]
+        sock.send(raw)
+
+    # Hasta que se confirman o se agotan las retransmisiones de todas
+    while pendientes:
+        time.sleep(0.01)
+    terminado.set()
+    sock.close()
+    return len(records), confirmados[0]
+
+
+def start_consumer(manager, port=None, detail=None, secret=ACCT_SECRET, window=COALESCE_WINDOW,
+                   max_batch=MAX_BATCH, from_start=False, report_interval=None):
+    """
+    Arranca en segundo plano la cola de cierres y sus fuentes (UDP y/o fichero 'detail').
+    Retorna la LogoutQueue.
+    """
+    logouts = LogoutQueue(manager, window, max_batch).start(report_interval)
+    if port is not None:
+        server = AccountingServer(logouts, port, secret).start()
+        log(f"[*] Recibiendo RADIUS Accounting en el puerto UDP {server.port}")
+    if detail is not None:
+        DetailTail(detail, from_start).start(logouts)
+        log(f"[*] Siguiendo el fichero de accounting {detail}")
+    return logouts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cierra las sesiones SDN a partir del Accounting de RADIUS.")
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument('--escuchar', type=int, metavar='PUERTO', help=f"Recibir Accounting-Request por UDP en este puerto (el estándar es {ACCT_PORT}).")
+    origen.add_argument('--detalle', help="Seguir el fichero 'detail' en el que FreeRADIUS escribe el accounting.")
+    origen.add_argument('--reproducir', metavar='FICHERO', help="Servidor de prueba: enviar los registros de este fichero 'detail' a --destino.")
+    parser.add_argument('--destino', default=f"127.0.0.1:{ACCT_PORT}", help="Consumidor al que enviar los registros con --reproducir (ip:puerto).")
+    parser.add_argument('--tasa', type=float, default=0, help="Registros por segundo con --reproducir (0 = sin pausa).")
+    parser.add_argument('--hora-actual', action='store_true', help="Con --reproducir, fechar los eventos con la hora del envío.")
+    parser.add_argument('--secreto', default=ACCT_SECRET.decode(), help="Secreto compartido con el NAS.")
+    parser.add_argument('--ventana-ms', type=float, default=COALESCE_WINDOW * 1000, help="Milisegundos que se acumulan cierres antes de borrar un lote.")
+    parser.add_argument('--max-lote', type=int, default=MAX_BATCH, help="MACs como máximo por lote.")
+    parser.add_argument('--desde-inicio', action='store_true', help="Procesar también los registros ya escritos en el fichero 'detail'.")
+    parser.add_argument('--informe', type=float, default=5.0, help="Segundos entre informes.")
+    args = parser.parse_args()
+
+    if args.reproducir:
+        host, port = args.destino.rsplit(':', 1)
+        inicio = time.monotonic()
+        enviados, confirmados = replay(args.reproducir, (host, int(port)), args.secreto.encode(), args.tasa, args.hora_actual)
+        log(f"[✓] {enviados} registros enviados, {confirmados} confirmados en {time.monotonic() - inicio:.2f} s.")
+        sys.exit(0 if confirmados == enviados else 1)
+
+    # Importación diferida: el servidor de prueba no necesita el gestor ni el controlador
+    from sdn_manager import SdnConnectionManager
+    logouts = start_consumer(SdnConnectionManager(), args.escuchar, args.detalle, args.secreto.encode(),
+                             args.ventana_ms / 1000, args.max_lote, args.desde_inicio, args.informe)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logouts.stop()
+        log("\n[*] Consumidor de accounting detenido.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Detección de anomalías de tráfico (R3) con los contadores de Floodlight, como complemento
+# de Snort: sondea cada --intervalo segundos las estadísticas de puertos de todos los switches
+# y cada --intervalo-flujos las de los flujos 'conn-*' y 'qtn-*', calcula las tasas y las
+# compara con la media y la varianza móviles exponenciales (EWMA) de cada puerto y de cada
+# host. Los hosts cuyo tráfico se dispara se ponen en cuarentena con los flujos 'qtn-*' de
+# default_flows.py, con el mismo lote que usa snort_monitor.py.
+#
+#   python3 bandwidth_monitor.py --intervalo 1 --umbral-z 6 --min-mbps 10
+#   python3 bandwidth_monitor.py --dry-run --informe 10
+#   python3 bandwidth_monitor.py --uso /var/lib/sdn_usage    # guarda además el tráfico de cada sesión
+#
+# Contadores, tasas y estadísticos viven en arrays de NumPy indexados por (dpid, puerto),
+# por cookie de flujo y por MAC: cada sondeo son unas pocas operaciones vectoriales sobre
+# todos los puertos a la vez, de modo que miles de puertos por segundo cuestan milisegundos.
+#
+# Con --uso, el tráfico de subida, de bajada y descartado de cada host en cada sondeo de
+# flujos se acumula y se guarda en el histórico de usage_store.py.
+
+import sys
+import time
+import argparse
+from collections import deque, Counter
+
+import numpy as np
+import requests
+
+from default_flows import BASE_URL, CONTROLLER_MAC, RADIUS_SERVER_IP, STATIC_FLOW_URL, REQUEST_TIMEOUT, runtime
+from controllers import LINKS_PATH, LIST_FLOWS_PATH, PORT_STATS_PATH, FLOW_STATS_PATH
+from flow_pusher import FlowPusher
+from metrics import span
+from snort_monitor import QuarantineBatcher
+from log_tail import percentile
+from topology import TopologyGraph
+from usage_store import UsageStore, UsageRecorder, USAGE_PATH, DEFAULT_INTERVAL as DEFAULT_USAGE_INTERVAL
+
+# --- CONFIGURACIÓN ---
+# Segundos entre sondeos de los puertos y de los flujos
+DEFAULT_INTERVAL = 1.0
+DEFAULT_FLOW_INTERVAL = 5.0
+# Peso de cada muestra nueva en la media y la varianza móviles
+DEFAULT_ALPHA = 0.1
+# Desviaciones sobre la media a partir de las cuales una tasa es anómala
+DEFAULT_Z = 6.0
+# Tasa mínima (Mbit/s) para considerar anómalo un puerto o un host, aunque su z sea alta
+DEFAULT_MIN_MBPS = 10.0
+# Muestras de una clave antes de poder marcarla como anómala
+DEFAULT_WARMUP = 10
+# Segundos tras los que se vuelven a listar los flujos estáticos para resolver las cookies
+NAMES_MAX_AGE = 30
+# Segundos entre dos avisos de la misma anomalía que no se pone en cuarentena
+REPEAT_WARNING = 60
+
+# Identificador de aplicación del Static Flow Pusher en las cookies de Floodlight
+STATIC_FLOW_APP_ID = 10
+
+# Tipos de flujo según su nombre
+FLOW_OTHER, FLOW_CONN_FWD, FLOW_QTN_DROP, FLOW_CONN_REV = 0, 1, 2, 3
+# Columna de usage_store.TRAFFIC (bytes; la de paquetes es la siguiente + 3) de cada tipo de flujo
+USAGE_COLUMN = {FLOW_CONN_FWD: 0, FLOW_CONN_REV: 1, FLOW_QTN_DROP: 2}
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def static_flow_cookie(name):
+    """
+    Cookie con la que Floodlight instala un flujo del Static Flow Pusher: el identificador de
+    aplicación en los 12 bits altos y un hash del nombre en los 32 bajos (como
+    StaticFlowEntries.computeEntryCookie). Permite saber a qué flujo corresponde cada
+    entrada de /wm/core/switch/all/flow/json, que no lleva el nombre.
+    """
+    flow_hash = 2311
+    for c in name:
+        flow_hash = (flow_hash * 211 + ord(c)) & 0xFFFFFFFF
+    return (STATIC_FLOW_APP_ID << 52) | flow_hash
+
+
+def _counter(value):
+    """
+    Contador o cookie de una respuesta de Floodlight: entero, cadena decimal o hexadecimal.
+    """
+    if isinstance(value, str):
+        return int(value, 16) if value.startswith("0x") else int(value)
+    return int(value or 0)
+
+
+def parse_port_stats(body):
+    """
+    Retorna (lista de (dpid, puerto), array de bytes recibidos) de /wm/core/switch/all/port/json.
+    Admite el formato de Floodlight 1.x ({dpid: {"port_reply": [{"port": [...]}]}}) y el
+    anterior ({dpid: [{"portNumber": ..., "receiveBytes": ...}]}).
+    """
+    keys, rx = [], []
+    for dpid, reply in body.items():
+        if isinstance(reply, dict):
+            ports = [p for r in reply.get("port_reply", []) for p in r.get("port", [])]
+        else:
+            ports = reply or []
+        for p in ports:
+            keys.append((dpid, str(p.get("port_number", p.get("portNumber")))))
+            rx.append(_counter(p.get("receive_bytes", p.get("receiveBytes"))))
+    return keys, np.array(rx, dtype=np.float64)
+
+
+def parse_flow_stats(body, packets=False):
+    """
+    Retorna (lista de cookies, array de bytes) de /wm/core/switch/all/flow/json, en el
+    formato de Floodlight 1.x ({dpid: {"flows": [...]}}) o en el anterior ({dpid: [...]}).
+    Con 'packets' añade un tercer elemento: el array de paquetes.
+    """
+    cookies, counts, packet_counts = [], [], []
+    for reply in body.values():
+        flows = reply.get("flows", []) if isinstance(reply, dict) else (reply or [])
+        for f in flows:
+            cookies.append(_counter(f.get("cookie")) & 0xFFFFFFFFFFFFFFFF)
+            counts.append(_counter(f.get("byte_count", f.get("byteCount"))))
+            if packets:
+                packet_counts.append(_counter(f.get("packet_count", f.get("packetCount"))))
+    if packets:
+        return cookies, np.array(counts, dtype=np.float64), np.array(packet_counts, dtype=np.float64)
+    return cookies, np.array(counts, dtype=np.float64)
+
+
+class CounterTable:
+    """
+    Contadores acumulados de un conjunto de claves que puede crecer, en arrays de NumPy.
+    update() recibe la lectura de un sondeo y retorna la posición de cada clave y su tasa
+    por segundo desde la lectura anterior (NaN si no la había o si el contador retrocedió,
+    p. ej. porque el switch se reinició o el flujo se reinstaló).
+    """
+    def __init__(self, capacity=1024):
+        # clave -> posición en los arrays
+        self.index = {}
+        self.keys = []
+        self.values = np.zeros(capacity)
+        self.times = np.full(capacity, np.nan)
+        # Las respuestas suelen traer las claves en el mismo orden: se reutilizan las posiciones
+        self._last_keys = None
+        self._last_positions = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def positions(self, keys):
+        if keys == self._last_keys:
+            return self._last_positions
+        positions = np.fromiter((self._position(k) for k in keys), dtype=np.intp, count=len(keys))
+        if len(self.keys) > len(self.values):
+            extra = max(len(self.keys), 2 * len(self.values)) - len(self.values)
+            self.values = np.concatenate([self.values, np.zeros(extra)])
+            self.times = np.concatenate([self.times, np.full(extra, np.nan)])
+        self._last_keys, self._last_positions = keys, positions
+        return positions
+
+    def _position(self, key):
+        position = self.index.get(key)
+        if position is None:
+            position = self.index[key] = len(self.keys)
+            self.keys.append(key)
+        return position
+
+    def advance(self, keys, values, now):
+        """
+        Como update(), pero retorna (posiciones, incrementos desde la lectura anterior,
+        segundos transcurridos); el incremento es NaN en los mismos casos que la tasa.
+        """
+        positions = self.positions(keys)
+        elapsed = now - self.times[positions]
+        delta = values - self.values[positions]
+        delta[~((elapsed > 0) & (delta >= 0))] = np.nan
+        self.values[positions] = values
+        self.times[positions] = now
+        return positions, delta, elapsed
+
+    def update(self, keys, values, now):
+        positions, delta, elapsed = self.advance(keys, values, now)
+        valid = ~np.isnan(delta)
+        rates = np.full(len(positions), np.nan)
+        rates[valid] = delta[valid] / elapsed[valid]
+        return positions, rates
+
+
+class EwmaDetector:
+    """
+    Media y varianza móviles exponenciales de la tasa de cada posición.
+
+    Una tasa es anómala si supera la media en más de 'z' desviaciones típicas y además
+    'min_rate' (bytes/s), una vez acumuladas 'warmup' muestras. Las muestras anómalas no
+    actualizan los estadísticos, para que un ataque sostenido no pase a ser lo normal.
+    """
+    def __init__(self, alpha=DEFAULT_ALPHA, z=DEFAULT_Z, min_rate=DEFAULT_MIN_MBPS * 1e6 / 8, warmup=DEFAULT_WARMUP):
+        self.alpha = alpha
+        self.z = z
+        self.min_rate = min_rate
+        self.warmup = warmup
+        self.mean = np.zeros(0)
+        self.var = np.zeros(0)
+        self.count = np.zeros(0, dtype=np.int64)
+
+    def _reserve(self, size):
+        if size > len(self.mean):
+            extra = max(size, 2 * len(self.mean)) - len(self.mean)
+            self.mean = np.concatenate([self.mean, np.zeros(extra)])
+            self.var = np.concatenate([self.var, np.zeros(extra)])
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+
+    def update(self, positions, rates):
+        """
+        Retorna (posiciones, tasas, z) de las muestras anómalas. Las tasas NaN se ignoran.
+        """
+        valid = ~np.isnan(rates)
+        positions, rates = positions[valid], rates[valid]
+        if not len(positions):
+            return positions, rates, rates
+        self._reserve(int(positions.max()) + 1)
+        mean = self.mean[positions]
+        # Suelo de la desviación: un puerto casi constante no salta por cualquier variación
+        scale = np.maximum(np.sqrt(self.var[positions]), 0.05 * mean) + 1.0
+        zscore = (rates - mean) / scale
+        anomalous = (self.count[positions] >= self.warmup) & (zscore > self.z) & (rates > self.min_rate)
+
+        normal = positions[~anomalous]
+        sample = rates[~anomalous]
+        first = self.count[normal] == 0
+        diff = sample - self.mean[normal]
+        increment = self.alpha * diff
+        self.mean[normal] = np.where(first, sample, self.mean[normal] + increment)
+        self.var[normal] = np.where(first, 0.0, (1 - self.alpha) * (self.var[normal] + diff * increment))
+        self.count[normal] += 1
+        return positions[anomalous], rates[anomalous], zscore[anomalous]
+
+
+class BandwidthMonitor:
+    """
+    Sondea las estadísticas de puertos y flujos, detecta los picos con EwmaDetector y
+    entrega a 'batcher' (QuarantineBatcher) los hosts responsables:
+      - un puerto de host (no de enlace entre switches) cuyo tráfico recibido se dispara,
+        si solo hay un host conectado a él;
+      - un host cuyo tráfico de ida (máximo de sus flujos 'conn-*-fwd-*') se dispara.
+    Con 'batcher' None solo se informa (--dry-run). Con 'usage' (usage_store.UsageRecorder)
+    cada sondeo de flujos le entrega además el tráfico de cada host.
+    """
+    def __init__(self, batcher, cache, topology, detector_args=None, base_url=BASE_URL, timeout=REQUEST_TIMEOUT,
+                 cluster=None, session=None, usage=None):
+        self.batcher = batcher
+        self.cache = cache
+        self.topology = topology
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cluster = cluster
+        self.session = session or requests.Session()
+        self.ports = CounterTable()
+        self.port_detector = EwmaDetector(**(detector_args or {}))
+        self.flows = CounterTable()
+        # Por posición de flujo: tipo (FLOW_*) y posición de la MAC en self.macs (-1 si no es de un host)
+        self.flow_kind = np.zeros(0, dtype=np.int8)
+        self.flow_mac = np.zeros(0, dtype=np.intp)
+        self.macs = CounterTable()
+        self.host_detector = EwmaDetector(**(detector_args or {}))
+        self.usage = usage
+        # Paquetes de cada flujo, con las mismas claves que self.flows (solo con 'usage')
+        self.flow_packets = CounterTable()
+        # (posición de la MAC, tipo, switch) de cada flujo de un host, para contar su tráfico
+        # una sola vez aunque lo vean todos los switches de la ruta
+        self.hops = CounterTable()
+        self.flow_hop = np.zeros(0, dtype=np.intp)
+        self.hop_mac = np.zeros(0, dtype=np.intp)
+        self.hop_column = np.zeros(0, dtype=np.intp)
+        # cookie -> nombre de flujo
+        self.names = {}
+        self._names_at = None
+        # Tráfico descartado por las cuarentenas en el último sondeo de flujos (bytes/s)
+        self.quarantine_drop = 0.0
+        self._warned = {}
+        # Duración de los últimos sondeos de puertos (descarga + cálculo) y solo del cálculo
+        self.poll_times = deque(maxlen=1000)
+        self.compute_times = deque(maxlen=1000)
+        self.stats = Counter()
+
+    def _get_all(self, path):
+        """
+        Descarga 'path' de todas las instancias de Floodlight y fusiona las respuestas
+        (diccionarios por DPID). Retorna None si no respondió ninguna.
+        """
+        with span("bandwidth.fetch", url=path) as s:
+            if self.cluster is not None:
+                results = [data for _, data in self.cluster.get_each(path)]
+                s.set(instancias=len(results))
+            else:
+                try:
+                    response = self.session.get(self.base_url + path, timeout=self.timeout)
+                    s.set_response(response)
+                    response.raise_for_status()
+                    results = [response.json()]
+                except (requests.RequestException, ValueError) as e:
+                    log(f"[!] Error al consultar {path}: {e}")
+                    return None
+        if not results:
+            log(f"[!] Error al consultar {path}: ninguna instancia de Floodlight respondió.")
+            return None
+        merged = {}
+        for body in results:
+            merged.update(body)
+        return merged
+
+    def poll_ports(self):
+        """
+        Un sondeo de los puertos. Retorna el número de puertos leídos, o None si falló.
+        """
+        start = time.perf_counter()
+        body = self._get_all(PORT_STATS_PATH)
+        if body is None:
+            return None
+        now = time.monotonic()
+        computed = time.perf_counter()
+        with span("bandwidth.ports") as s:
+            keys, rx = parse_port_stats(body)
+            positions, rates = self.ports.update(keys, rx, now)
+            anomalies = self.port_detector.update(positions, rates)
+            s.set(puertos=len(keys), anomalias=len(anomalies[0]))
+        self.compute_times.append(time.perf_counter() - computed)
+        self.poll_times.append(time.perf_counter() - start)
+        if len(anomalies[0]):
+            self._port_anomalies(*anomalies, now)
+        return len(keys)
+
+    def _port_anomalies(self, positions, rates, zscores, now):
+        hosts = self.cache.hosts_by_port()
+        if not hosts and self.cache.refresh():
+            hosts = self.cache.hosts_by_port()
+        links = self.topology.switch_ports()
+        for position, rate, zscore in zip(positions, rates, zscores):
+            dpid, port = self.ports.keys[position]
+            self.stats["anomalias_puerto"] += 1
+            macs = hosts.get((dpid, port), [])
+            if (dpid, port) in links:
+                self._warn((dpid, port), now, f"[!] Pico de tráfico en el enlace {dpid}/{port}: "
+                                              f"{rate * 8 / 1e6:.1f} Mbit/s (z={zscore:.1f}).")
+            elif len(macs) == 1:
+                self._offender(macs[0], rate, zscore, f"puerto {dpid}/{port}", now)
+            else:
+                self._warn((dpid, port), now, f"[!] Pico de tráfico en el puerto {dpid}/{port} "
+                                              f"({len(macs)} hosts conectados): {rate * 8 / 1e6:.1f} Mbit/s (z={zscore:.1f}).")
+
+    def _refresh_names(self, cookies):
+        """
+        Vuelve a listar los flujos estáticos para resolver las cookies si la lista es antigua
+        o aparecen cookies del Static Flow Pusher desconocidas. Retorna True si la relistó.
+        """
+        now = time.monotonic()
+        if self._names_at is not None:
+            age = now - self._names_at
+            if age < NAMES_MAX_AGE / 10:
+                return False
+            if age < NAMES_MAX_AGE and all(c in self.names for c in cookies if c >> 52 == STATIC_FLOW_APP_ID):
+                return False
+        body = self._get_all(LIST_FLOWS_PATH.format(dpid="all"))
+        if body is None:
+            return False
+        self._names_at = now
+        self.names = {static_flow_cookie(name): name for flows_list in body.values()
+                      for flow_dict in flows_list for name in flow_dict}
+        return True
+
+    def _classify(self):
+        size = len(self.flows.values)
+        self.flow_kind = np.zeros(size, dtype=np.int8)
+        self.flow_mac = np.full(size, -1, dtype=np.intp)
+        self.flow_hop = np.full(size, -1, dtype=np.intp)
+        for position, cookie in enumerate(self.flows.keys):
+            name = self.names.get(cookie)
+            if name is None:
+                continue
+            parts = name.split('-')
+            if parts[0] == "conn" and "fwd" in parts:
+                kind = FLOW_CONN_FWD
+            elif parts[0] == "conn" and "rev" in parts:
+                kind = FLOW_CONN_REV
+            elif parts[0] == "qtn" and name.endswith("-drop-all"):
+                kind = FLOW_QTN_DROP
+            else:
+                continue
+            key = parts[1]
+            self.flow_kind[position] = kind
+            self.flow_mac[position] = mac = self.macs._position(':'.join(key[i:i+2] for i in range(0, 12, 2)))
+            # El último campo del nombre es el switch (en 'drop-all', solo hay uno)
+            self.flow_hop[position] = self.hops._position((mac, kind, parts[-1]))
+        self.hop_mac = np.array([mac for mac, _, _ in self.hops.keys], dtype=np.intp)
+        self.hop_column = np.array([USAGE_COLUMN[kind] for _, kind, _ in self.hops.keys], dtype=np.intp)
+
+    def poll_flows(self):
+        """
+        Un sondeo de los flujos. Retorna el número de flujos leídos, o None si falló.
+        """
+        body = self._get_all(FLOW_STATS_PATH)
+        if body is None:
+            return None
+        now = time.monotonic()
+        if self.usage is not None:
+            cookies, counts, packets = parse_flow_stats(body, packets=True)
+        else:
+            cookies, counts = parse_flow_stats(body)
+        known = len(self.flows)
+        positions, delta, elapsed = self.flows.advance(cookies, counts, now)
+        rates = np.full(len(positions), np.nan)
+        valid = ~np.isnan(delta)
+        rates[valid] = delta[valid] / elapsed[valid]
+        if self._refresh_names(cookies) or len(self.flows) > known:
+            self._classify()
+        if self.usage is not None:
+            _, packet_delta, _ = self.flow_packets.advance(cookies, packets, now)
+            self._record_usage(positions, delta, packet_delta)
+
+        with span("bandwidth.flows") as s:
+            kind = self.flow_kind[positions]
+            mac = self.flow_mac[positions]
+            valid = ~np.isnan(rates)
+            self.quarantine_drop = float(rates[valid & (kind == FLOW_QTN_DROP)].sum())
+            # Tráfico de ida de cada host: el máximo de sus flujos 'fwd' (cada salto lo cuenta una vez)
+            forward = valid & (kind == FLOW_CONN_FWD)
+            host_rates = np.full(len(self.macs), np.nan)
+            np.fmax.at(host_rates, mac[forward], rates[forward])
+            host_positions = np.unique(mac[forward])
+            anomalies = self.host_detector.update(host_positions, host_rates[host_positions])
+            s.set(flujos=len(cookies), hosts=len(host_positions), anomalias=len(anomalies[0]))
+
+        for position, rate, zscore in zip(*anomalies):
+            self.stats["anomalias_host"] += 1
+            self._offender(self.macs.keys[position], rate, zscore, "flujos de sesión", now)
+        return len(cookies)
+
+    def _record_usage(self, positions, delta, packet_delta):
+        """
+        Entrega a self.usage los bytes y paquetes de subida, bajada y descartados de cada
+        host desde el sondeo anterior. En cada switch se suman los flujos del host; de
+        todos sus switches se toma el que más cuenta (el de borde, por el que pasa todo su
+        tráfico), para no contar una vez por salto.
+        """
+        with span("bandwidth.usage") as s:
+            hop = self.flow_hop[positions]
+            counted = (hop >= 0) & ~np.isnan(delta)
+            hop, values = hop[counted], np.column_stack([delta[counted], np.nan_to_num(packet_delta[counted])])
+            per_hop = np.zeros((len(self.hops), 2))
+            np.add.at(per_hop, hop, values)
+            traffic = np.zeros((len(self.macs), 6))
+            used = np.unique(hop)
+            for offset in (0, 1):
+                np.maximum.at(traffic, (self.hop_mac[used], self.hop_column[used] + 3 * offset), per_hop[used, offset])
+            self.usage.add(self.macs.keys, traffic, time.time())
+            s.set(flujos=int(counted.sum()), hosts=len(np.unique(self.hop_mac[used])))
+
+    def _offender(self, mac, rate, zscore, origen, now):
+        if self.batcher is None:
+            self._warn(mac, now, f"[!] {mac}: {rate * 8 / 1e6:.1f} Mbit/s (z={zscore:.1f}) en {origen}.")
+        elif self.batcher.submit_mac(mac, now):
+            log(f"[!] {mac}: {rate * 8 / 1e6:.1f} Mbit/s (z={zscore:.1f}) en {origen}; se pone en cuarentena.")
+
+    def _warn(self, key, now, message):
+        if now - self._warned.get(key, -REPEAT_WARNING) >= REPEAT_WARNING:
+            self._warned[key] = now
+            log(message)
+
+    def report(self):
+        bloqueados = self.batcher.stats["bloqueados"] if self.batcher is not None else 0
+        log(f"[*] {len(self.ports)} puertos, {len(self.macs)} hosts con flujos; sondeo p50 "
+            f"{percentile(self.poll_times, 50) * 1000:.1f} ms (cálculo {percentile(self.compute_times, 50) * 1000:.1f} ms), "
+            f"p99 {percentile(self.poll_times, 99) * 1000:.1f} ms; "
+            f"{self.stats['anomalias_puerto']} anomalías de puerto, {self.stats['anomalias_host']} de host, "
+            f"{bloqueados} hosts en cuarentena; descartado por cuarentenas {self.quarantine_drop * 8 / 1e6:.1f} Mbit/s"
+            + (f"; {self.usage.rows} filas en el histórico de tráfico" if self.usage is not None else ""))
+
+    def run(self, interval=DEFAULT_INTERVAL, flow_interval=DEFAULT_FLOW_INTERVAL, report_interval=10.0):
+        next_ports = next_flows = last_report = time.monotonic()
+        while True:
+            now = time.monotonic()
+            try:
+                if now >= next_ports:
+                    next_ports = max(next_ports + interval, now)
+                    self.poll_ports()
+                if flow_interval and now >= next_flows:
+                    next_flows = max(next_flows + flow_interval, now)
+                    self.poll_flows()
+            except Exception as e:
+                log(f"[!] Error en el sondeo de estadísticas: {e}")
+            if now - last_report >= report_interval:
+                self.report()
+                last_report = now
+            time.sleep(max(0.0, min(next_ports, next_flows if flow_interval else next_ports) - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cuarentena automática a partir de los contadores de tráfico de Floodlight.")
+    parser.add_argument('--intervalo', type=float, default=DEFAULT_INTERVAL, help="Segundos entre sondeos de los puertos.")
+    parser.add_argument('--intervalo-flujos', type=float, default=DEFAULT_FLOW_INTERVAL, help="Segundos entre sondeos de los flujos (0 = no sondearlos).")
+    parser.add_argument('--umbral-z', type=float, default=DEFAULT_Z, help="Desviaciones sobre la media a partir de las cuales una tasa es anómala.")
+    parser.add_argument('--min-mbps', type=float, default=DEFAULT_MIN_MBPS, help="Tasa mínima en Mbit/s para considerar anómalo un puerto o un host.")
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help="Peso de cada muestra en la media móvil.")
+    parser.add_argument('--calentamiento', type=int, default=DEFAULT_WARMUP, help="Muestras antes de poder marcar una anomalía.")
+    parser.add_argument('--cuarentena', help="Base SQLite donde se registran los hosts en cuarentena (la que usa el reconciliador con --hosts).")
+    parser.add_argument('--lote-ms', type=float, default=200, help="Intervalo entre lotes de cuarentena.")
+    parser.add_argument('--workers', type=int, default=32, help="Peticiones simultáneas al controlador por lote.")
+    parser.add_argument('--excluir', nargs='*', default=[], help="MACs que nunca se ponen en cuarentena.")
+    parser.add_argument('--dry-run', action='store_true', help="Solo informar de las anomalías, sin cuarentenas.")
+    parser.add_argument('--informe', type=float, default=10.0, help="Segundos entre informes.")
+    parser.add_argument('--uso', nargs='?', const=USAGE_PATH, metavar='DIR',
+                        help=f"Guardar el tráfico de cada sesión en este directorio (por defecto {USAGE_PATH}); ver usage_store.py.")
+    parser.add_argument('--intervalo-uso', type=float, default=DEFAULT_USAGE_INTERVAL,
+                        help="Segundos de tráfico acumulados en cada fila del histórico.")
+    args = parser.parse_args()
+
+    from sdn_manager import DEFAULT_POLICY, SdnConnectionManager
+    from policy import PolicyTable
+    # Los servidores de la política reciben picos legítimos (y son las víctimas de un DDoS)
+    servidores = [mac for mac, _ in PolicyTable(default=DEFAULT_POLICY).hosts()]
+    cluster, device_cache, _, _ = runtime()
+    batcher = None
+    if not args.dry_run:
+        pusher = FlowPusher(STATIC_FLOW_URL, timeout=REQUEST_TIMEOUT, max_workers=args.workers, logger=log, verbose=False,
+                            cluster=cluster)
+        manager = SdnConnectionManager(device_cache=device_cache, flow_pusher=pusher, cluster=cluster,
+                                       comprobar_flujos=None, instantanea="")
+        batcher = QuarantineBatcher(device_cache, pusher, args.lote_ms / 1000, registry_path=args.cuarentena,
+                                    protected=[CONTROLLER_MAC, RADIUS_SERVER_IP] + servidores + args.excluir,
+                                    source="bandwidth", manager=manager).start()
+    topology = TopologyGraph(BASE_URL + LINKS_PATH, timeout=REQUEST_TIMEOUT, logger=log, cluster=cluster)
+    detector_args = {"alpha": args.alpha, "z": args.umbral_z, "min_rate": args.min_mbps * 1e6 / 8, "warmup": args.calentamiento}
+    usage = None
+    if args.uso:
+        from flow_registry import FlowRegistry
+        usage = UsageRecorder(UsageStore(args.uso), FlowRegistry(), args.intervalo_uso)
+        log(f"[*] Histórico de tráfico por sesión en {args.uso}, una fila por host cada {args.intervalo_uso} s")
+    monitor = BandwidthMonitor(batcher, device_cache, topology, detector_args, cluster=cluster, usage=usage)
+    log(f"[*] Sondeando las estadísticas de Floodlight cada {args.intervalo} s (umbral z={args.umbral_z}, "
+        f"mínimo {args.min_mbps} Mbit/s)")
+    try:
+        monitor.run(args.intervalo, args.intervalo_flujos, args.informe)
+    except KeyboardInterrupt:
+        if batcher is not None:
+            batcher.stop()
+        if usage is not None:
+            usage.flush()
+        log("\n[*] Monitor de tráfico detenido.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import span
+
+# --- CONFIGURACIÓN ---
+# Instancias de Floodlight que se reparten los switches del campus, separadas por comas
+# ("10.20.12.13:8080,10.20.12.14:8080"). Vacío = una sola instancia, la de FLOODLIGHT_IP/FLOODLIGHT_PORT.
+CONTROLLERS = os.environ.get("FLOODLIGHT_CONTROLLERS", "")
+# Segundos tras los que se vuelve a preguntar a cada instancia qué switches controla
+OWNERSHIP_MAX_AGE = 30
+# Segundos que una instancia caída se deja de usar antes de volver a intentarlo
+DOWN_RETRY_INTERVAL = 10
+# Conexiones keep-alive por instancia
+POOL_SIZE = 8
+
+# --- Rutas de la API REST de Floodlight ---
+SWITCHES_PATH = "/wm/core/controller/switches/json"
+DEVICE_PATH = "/wm/device/"
+LINKS_PATH = "/wm/topology/links/json"
+ROUTE_PATH = "/wm/topology/route"
+STATIC_FLOW_PATH = "/wm/staticflowpusher/json"
+LIST_FLOWS_PATH = "/wm/staticflowpusher/list/{dpid}/json"
+PORT_STATS_PATH = "/wm/core/switch/all/port/json"
+FLOW_STATS_PATH = "/wm/core/switch/all/flow/json"
+SUMMARY_PATH = "/wm/core/controller/summary/json"
+UPTIME_PATH = "/wm/core/system/uptime/json"
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def parse_controllers(value):
+    """
+    Convierte "ip:puerto,ip:puerto" en una lista de URLs base.
+    """
+    urls = []
+    for item in value.replace(' ', '').split(','):
+        if item:
+            urls.append(item.rstrip('/') if item.startswith("http") else f"http://{item}")
+    return urls
+
+
+class Controller:
+    """
+    Una instancia de Floodlight: URL base, sesión HTTP propia (su pool de conexiones)
+    y estado de salud.
+    """
+    def __init__(self, base_url, pool_size=POOL_SIZE):
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Instante del último fallo de conexión, o None si responde
+        self.down_since = None
+
+    def url(self, path):
+        return self.base_url + path
+
+    def __repr__(self):
+        return self.base_url
+
+
+class ControllerCluster:
+    """
+    Conjunto de instancias de Floodlight que se reparten los switches.
+
+    Sabe qué instancia controla cada DPID (lo pregunta a todas cada 'max_age' segundos),
+    para que las operaciones sobre flujos vayan a la instancia correcta, y permite
+    consultar a todas en paralelo para fusionar dispositivos, enlaces y listas de flujos.
+    Una instancia que no responde se deja de usar durante 'retry_interval' segundos y
+    se vuelve a averiguar el reparto, por si sus switches han pasado a otra.
+    """
+    def __init__(self, base_urls, timeout=10, max_age=OWNERSHIP_MAX_AGE, retry_interval=DOWN_RETRY_INTERVAL,
+                 pool_size=POOL_SIZE, logger=log):
+        self.controllers = [Controller(url, pool_size) for url in base_urls]
+        self.timeout = timeout
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self.log = logger
+        # dpid -> [Controller] que lo controlan
+        self._owners = {}
+        # nombre de flujo -> dpid, para enviar los borrados (que solo llevan el nombre)
+        self._flow_switch = {}
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        # Solo un hilo pregunta el reparto a la vez
+        self._refresh_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=len(self.controllers), thread_name_prefix="controller")
+
+    def __len__(self):
+        return len(self.controllers)
+
+    def available(self):
+        """
+        Instancias que responden o cuyo fallo es lo bastante antiguo como para reintentar.
+        """
+        now = time.monotonic()
+        return [c for c in self.controllers if c.down_since is None or now - c.down_since >= self.retry_interval]
+
+    def mark_down(self, controller, error):
+        if controller.down_since is None:
+            self.log(f"  [!] Floodlight {controller} no responde ({error}); se usarán las demás instancias.")
+        controller.down_since = time.monotonic()
+        # Sus switches pueden haberse conectado a otra instancia
+        self._last_refresh = None
+
+    def mark_up(self, controller):
+        if controller.down_since is not None:
+            self.log(f"  [*] Floodlight {controller} vuelve a responder.")
+            controller.down_since = None
+            self._last_refresh = None
+
+    def get_each(self, path):
+        """
+        GET de 'path' en todas las instancias disponibles, en paralelo.
+        Retorna la lista de (instancia, JSON) de las que respondieron.
+        """
+        def fetch(controller):
+            try:
+                response = controller.session.get(controller.url(path), timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.mark_down(controller, e)
+                return None
+            except (requests.RequestException, ValueError) as e:
+                self.log(f"  [!] Error al consultar {controller.url(path)}: {e}")
+                return None
+            self.mark_up(controller)
+            return controller, data
+        return [r for r in self.executor.map(fetch, self.available()) if r is not None]
+
+    def refresh_owners(self):
+        """
+        Pregunta a cada instancia qué switches controla. Retorna True si respondió alguna.
+        """
+        with span("controllers.switches") as s:
+            results = self.get_each(SWITCHES_PATH)
+            owners = {}
+            for controller, switches in results:
+                for switch in switches:
+                    owners.setdefault(switch['switchDPID'].lower(), []).append(controller)
+            s.set(instancias=len(results), switches=len(owners))
+        with self._lock:
+            self._owners = owners
+            self._last_refresh = time.monotonic()
+        self.log(f"  [*] Reparto de switches: {len(owners)} switches en {len(results)} de {len(self.controllers)} instancias.")
+        return bool(results)
+
+    def _owners_stale(self):
+        return self._last_refresh is None or time.monotonic() - self._last_refresh >= self.max_age
+
+    def owners(self, dpid):
+        """
+        Instancias que controlan el switch 'dpid' según el último reparto conocido. Si ha
+        caducado, un solo hilo lo vuelve a preguntar y los demás siguen con el actual;
+        solo esperan si todavía no hay ninguno.
+        """
+        if self._owners_stale() and self._refresh_lock.acquire(blocking=not self._owners):
+            try:
+                if self._owners_stale():
+                    self.refresh_owners()
+            finally:
+                self._refresh_lock.release()
+        return self._owners.get(str(dpid).lower(), [])
+
+    def targets(self, dpid=None, owners_only=False):
+        """
+        Instancias a las que enviar una operación sobre el switch 'dpid', por orden de
+        preferencia: las disponibles que lo controlan. Sin 'dpid', o si ninguna instancia
+        disponible lo controla (p. ej. la suya está caída), todas las disponibles, salvo
+        con 'owners_only': las escrituras de flujos no deben ir a una instancia que no
+        controla el switch, porque la aceptaría sin que el flujo llegue a él.
+        """
+        available = self.available()
+        if dpid is not None:
+            owners = [c for c in self.owners(dpid) if c in available]
+            if owners or owners_only:
+                return owners
+        return available
+
+    def remember_flows(self, flows_by_name):
+        """
+        Anota el switch de cada flujo (nombre -> dpid) para dirigir después su borrado.
+        """
+        with self._lock:
+            self._flow_switch.update(flows_by_name)
+
+    def forget_flow(self, name):
+        with self._lock:
+            return self._flow_switch.pop(name, None)
+
+    def switch_of(self, name):
+        return self._flow_switch.get(name)
+
+
+_default_cluster = None
+
+
+def default_cluster(timeout=10, logger=log):
+    """
+    Cluster compartido configurado con FLOODLIGHT_CONTROLLERS, o None si no se definió.
+    """
+    global _default_cluster
+    if _default_cluster is None and CONTROLLERS:
+        _default_cluster = ControllerCluster(parse_controllers(CONTROLLERS), timeout=timeout, logger=logger)
+    return _default_cluster
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import requests
-import json
-import sys
+import os
+import time
+import sqlite3
 import argparse
+import threading
+from collections import namedtuple
+
+import requests
+
+from device_cache import DeviceCache
+from flow_pusher import FlowPusher, summarize
+from flow_index import FlowChecker, CHECK_WARN
+from controllers import LIST_FLOWS_PATH, default_cluster
 
 # --- CONFIGURACIÓN ---
-# IP y puerto del controlador Floodlight
-FLOODLIGHT_IP = "10.20.12.13"  # IP del controlador Floodlight,
-FLOODLIGHT_PORT = 8080
+# IP y puerto del controlador Floodlight (con varias instancias, FLOODLIGHT_CONTROLLERS: ver controllers.py)
+FLOODLIGHT_IP = os.environ.get("FLOODLIGHT_IP", "10.20.12.13") # IP del controlador Floodlight
+FLOODLIGHT_PORT = int(os.environ.get("FLOODLIGHT_PORT", 8080))
 
 # IP del servidor freeRADIUS
 RADIUS_SERVER_IP = "192.168.200.200"
@@ -23,81 +32,97 @@ HOSTS_A_BLOQUEAR = {
     "fa:16:3e:b5:9d:a0": "H2"
 }
 
+# hard_timeout (segundos) de los flujos de cuarentena; 0 = permanentes hasta que se borren
+QUARANTINE_HARD_TIMEOUT = int(os.environ.get("SDN_QUARANTINE_TIMEOUT", 0))
+
+# Comprobación de solapamientos antes de instalar las cuarentenas (ver flow_index.py). Con
+# cualquier valor de SDN_FLOW_CHECK solo se avisa: una cuarentena incompleta es mejor que ninguna.
+FLOW_CHECK = os.environ.get("SDN_FLOW_CHECK", "")
+
 # URLs de la API de Floodlight
 BASE_URL = f"http://{FLOODLIGHT_IP}:{FLOODLIGHT_PORT}"
 DEVICE_API_URL = f"{BASE_URL}/wm/device/"
 STATIC_FLOW_URL = f"{BASE_URL}/wm/staticflowpusher/json"
 REQUEST_TIMEOUT = 10
 
+# Objetos compartidos por las funciones del script:
+# - cluster: instancias de Floodlight y reparto de switches (None = un solo controlador)
+# - device_cache: índice MAC -> (dpid, puerto) compartido por todas las búsquedas
+# - flow_pusher: motor compartido de envío de flujos (keep-alive + envío concurrente)
+# - flow_checker: índice de los flujos instalados para avisar de solapamientos (None = sin comprobar)
+Runtime = namedtuple('Runtime', ['cluster', 'device_cache', 'flow_pusher', 'flow_checker'])
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def runtime():
+    """
+    Retorna el Runtime del script, creándolo la primera vez que se pide y no al importar
+    el módulo: quien lo importa solo por HOSTS_A_BLOQUEAR o build_quarantine_flows no
+    abre sesiones HTTP ni pools de hilos.
+    """
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            cluster = default_cluster(REQUEST_TIMEOUT, print)
+            _runtime = Runtime(
+                cluster,
+                DeviceCache(DEVICE_API_URL, timeout=REQUEST_TIMEOUT, cluster=cluster),
+                FlowPusher(STATIC_FLOW_URL, timeout=REQUEST_TIMEOUT, logger=print, cluster=cluster),
+                FlowChecker(list_static_flows, CHECK_WARN, logger=print) if FLOW_CHECK else None)
+        return _runtime
+
 def get_attachment_point(host_mac):
     """
     Consulta la API de Floodlight para encontrar el punto de conexión (DPID y puerto)
     de un host específico basado en su dirección MAC.
+    La tabla de dispositivos se descarga una vez y se reutiliza para los demás hosts.
     """
     print(f"[*] Buscando punto de conexión para el host con MAC: {host_mac}...")
+    dpid, port = runtime().device_cache.get_attachment_point(host_mac)
+    if dpid and port:
+        print(f"  [+] ¡Encontrado! Host conectado a Switch DPID: {dpid} en el puerto {port}")
+        return dpid, port
+
+    print(f"  [-] Advertencia: No se encontró el punto de conexión para {host_mac}.")
+    return None, None
+
+def list_static_flows():
+    """
+    Descarga la lista de flujos estáticos de todos los switches (DPID -> flujos), o None.
+    """
+    path = LIST_FLOWS_PATH.format(dpid="all")
+    cluster = runtime().cluster
+    if cluster is not None:
+        merged = {}
+        for _, flows_by_dpid in cluster.get_each(path):
+            for switch, flows_list in flows_by_dpid.items():
+                merged.setdefault(switch, []).extend(flows_list)
+        return merged or None
     try:
-        response = requests.get(DEVICE_API_URL, timeout=REQUEST_TIMEOUT)
+        response = runtime().flow_pusher.session.get(BASE_URL + path, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        
-        parsed_json = response.json()
-        devices = parsed_json.get('devices', []) if isinstance(parsed_json, dict) else parsed_json
-        
-        for device in devices:
-            if host_mac.upper() in [mac.upper() for mac in device.get('mac', [])]:
-                ap_list = device.get('attachmentPoint', [])
-                if ap_list:
-                    ap = ap_list[0]
-                    dpid = ap.get('switchDPID')
-                    port = str(ap.get('port'))
-                    if dpid and port:
-                        print(f"  [+] ¡Encontrado! Host conectado a Switch DPID: {dpid} en el puerto {port}")
-                        return dpid, port
-        
-        print(f"  [-] Advertencia: No se encontró el punto de conexión para {host_mac}.")
-        return None, None
-    except requests.RequestException as e:
-        print(f"  [!] Error al conectar con Floodlight: {e}", file=sys.stderr)
-        return None, None
+        return response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"[!] Error: No se pudo obtener la lista de flujos de Floodlight: {e}")
+        return None
 
 def install_flow(flow_data):
     """
     Envía una regla de flujo para ser instalada.
     """
-    print(f"    - Instalando flujo '{flow_data['name']}' en el switch {flow_data['switch']}...")
-    try:
-        response = requests.post(STATIC_FLOW_URL, json=flow_data, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        status = response.json().get('status', 'Sin estado devuelto')
-        if "Flow rule pushed" not in status:
-             print(f"      [!] Advertencia: Floodlight respondió: {status}")
-        else:
-             print(f"      ... Estado: {status}")
-        return True
-    except requests.RequestException as e:
-        print(f"      [!] Error al instalar el flujo: {e.response.text if e.response else 'No response'}", file=sys.stderr)
-        return False
+    return runtime().flow_pusher.install(flow_data).ok
 
 def delete_flow(flow_name):
     """
     Envía una petición para borrar un flujo por su nombre.
     """
-    print(f"    - Borrando flujo '{flow_name}'...")
-    payload = {'name': flow_name}
-    try:
-        response = requests.delete(STATIC_FLOW_URL, data=json.dumps(payload), headers={'Content-Type': 'application/json'}, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        status = response.json().get('status', 'Sin estado devuelto')
-        print(f"      ... Estado: {status}")
-        return True
-    except requests.RequestException as e:
-        print(f"      [!] Error al borrar el flujo: {e.response.text if e.response else 'No response'}", file=sys.stderr)
-        return False
+    return runtime().flow_pusher.delete(flow_name).ok
 
-def setup_quarantine_for_host(host_mac, dpid, port):
+def build_quarantine_flows(host_mac, dpid, port, hard_timeout=None):
     """
-    Define e instala las reglas de flujo de cuarentena para un puerto de host específico.
+    Define las reglas de flujo de cuarentena para un puerto de host específico.
+    Con 'hard_timeout' (por defecto QUARANTINE_HARD_TIMEOUT) las reglas caducan solas.
     """
-    print(f"\n[*] Configurando flujos de cuarentena para {HOSTS_A_BLOQUEAR.get(host_mac, host_mac)} en {dpid} puerto {port}")
     mac_sanitized = host_mac.replace(':', '')
 
     # Regla 1: Permitir tráfico del host hacia el servidor RADIUS (UDP/1812)
@@ -136,32 +161,151 @@ def setup_quarantine_for_host(host_mac, dpid, port):
         "eth_src": host_mac,
         "actions": "" # Acción de descarte
     }
-    
-    install_flow(flow_allow_radius)
-    install_flow(flow_allow_arp)
-    install_flow(flow_drop_all)
+    flows = [flow_allow_radius, flow_allow_arp, flow_drop_all]
+    hard_timeout = QUARANTINE_HARD_TIMEOUT if hard_timeout is None else hard_timeout
+    if hard_timeout:
+        for flow in flows:
+            flow["hard_timeout"] = str(hard_timeout)
+    return flows
 
-def clear_quarantine_for_host(host_mac):
+def quarantine_flow_names(host_mac):
     """
-    Borra las reglas de flujo de cuarentena para un host.
+    Nombres de las reglas de cuarentena de un host.
     """
-    print(f"\n[*] Borrando flujos de cuarentena para {HOSTS_A_BLOQUEAR.get(host_mac, host_mac)}")
     mac_sanitized = host_mac.replace(':', '')
-    flow_names = [
+    return [
         f"qtn-{mac_sanitized}-allow-radius",
         f"qtn-{mac_sanitized}-allow-arp",
         f"qtn-{mac_sanitized}-drop-all"
     ]
-    for name in flow_names:
-        delete_flow(name)
+
+def setup_quarantine_for_host(host_mac, dpid, port):
+    """
+    Define e instala las reglas de flujo de cuarentena para un puerto de host específico.
+    """
+    print(f"\n[*] Configurando flujos de cuarentena para {HOSTS_A_BLOQUEAR.get(host_mac, host_mac)} en {dpid} puerto {port}")
+    flows = build_quarantine_flows(host_mac, dpid, port)
+    _, _, flow_pusher, flow_checker = runtime()
+    if flow_checker is not None:
+        flow_checker.check(flows)
+    results = flow_pusher.install_many(flows)
+    if flow_checker is not None:
+        flow_checker.installed([f for f, r in zip(flows, results) if r.ok])
+    return all(r.ok for r in results)
+
+def clear_quarantine_for_host(host_mac):
+    """
+    Borra las reglas de flujo de cuarentena para un host.
+    """
+    print(f"\n[*] Borrando flujos de cuarentena para {HOSTS_A_BLOQUEAR.get(host_mac, host_mac)}")
+    _, _, flow_pusher, flow_checker = runtime()
+    results = flow_pusher.delete_many(quarantine_flow_names(host_mac))
+    if flow_checker is not None:
+        flow_checker.deleted([r.name for r in results if r.ok])
+    return all(r.ok for r in results)
+
+def load_hosts(path):
+    """
+    Carga la lista de hosts a poner en cuarentena desde un fichero de texto (una línea
+    '<mac> [nombre]' por host, separadas por espacios o comas) o desde una base de datos
+    SQLite (.db/.sqlite) con una tabla 'cuarentena (mac, nombre)'.
+    Retorna un diccionario mac -> nombre, como HOSTS_A_BLOQUEAR.
+    """
+    hosts = {}
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        conn = sqlite3.connect(path)
+        try:
+            for mac, nombre in conn.execute("SELECT mac, nombre FROM cuarentena"):
+                hosts[mac] = nombre or mac
+        finally:
+            conn.close()
+        return hosts
+
+    with open(path) as f:
+        for linea in f:
+            linea = linea.split('#', 1)[0].replace(',', ' ').split()
+            if linea:
+                hosts[linea[0]] = linea[1] if len(linea) > 1 else linea[0]
+    return hosts
+
+def save_hosts(path, hosts):
+    """
+    Añade hosts (mac -> nombre) a la tabla 'cuarentena' de una base SQLite, creándola si
+    no existe, para que load_hosts() y el reconciliador los conserven.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cuarentena (mac TEXT PRIMARY KEY, nombre TEXT)")
+            conn.executemany("INSERT OR REPLACE INTO cuarentena (mac, nombre) VALUES (?, ?)", hosts.items())
+    finally:
+        conn.close()
+
+def print_throughput(accion, hosts, flows, results, elapsed):
+    """
+    Imprime el resumen de un envío masivo: hosts/s y flujos/s.
+    """
+    correctos, fallidos = summarize(results)
+    elapsed = max(elapsed, 1e-9)
+    print(f"\n[*] {accion}: {hosts} hosts, {flows} flujos ({correctos} correctos, {fallidos} fallidos) en {elapsed:.2f} s")
+    print(f"[*] Rendimiento: {hosts / elapsed:.1f} hosts/s, {flows / elapsed:.1f} flujos/s")
+
+def bulk_install(hosts, pusher):
+    """
+    Pone en cuarentena muchos hosts: resuelve todos los puntos de conexión con una única
+    descarga de la tabla de dispositivos y envía todos los flujos 'qtn-*' en paralelo.
+    """
+    start = time.monotonic()
+    _, device_cache, _, flow_checker = runtime()
+    attachment_points = device_cache.lookup_many(list(hosts))
+    flows = []
+    for mac, name in hosts.items():
+        if mac in attachment_points:
+            dpid, port = attachment_points[mac]
+            flows += build_quarantine_flows(mac, dpid, port)
+        else:
+            print(f"[!] No se pudo configurar cuarentena para {name} ({mac}) porque no se encontró en la red.")
+    print(f"[*] {len(attachment_points)} de {len(hosts)} hosts localizados. Enviando {len(flows)} flujos...")
+    if flow_checker is not None:
+        flow_checker.check(flows)
+    results = pusher.install_many(flows)
+    if flow_checker is not None:
+        flow_checker.installed([f for f, r in zip(flows, results) if r.ok])
+    print_throughput("Instalación", len(attachment_points), len(flows), results, time.monotonic() - start)
+
+def bulk_delete(hosts, pusher):
+    """
+    Borra en paralelo los flujos de cuarentena de muchos hosts.
+    """
+    start = time.monotonic()
+    names = [name for mac in hosts for name in quarantine_flow_names(mac)]
+    print(f"[*] Borrando {len(names)} flujos de cuarentena de {len(hosts)} hosts...")
+    results = pusher.delete_many(names)
+    flow_checker = runtime().flow_checker
+    if flow_checker is not None:
+        flow_checker.deleted([r.name for r in results if r.ok])
+    print_throughput("Borrado", len(hosts), len(names), results, time.monotonic() - start)
 
 def main():
     parser = argparse.ArgumentParser(description="Instala o borra flujos de cuarentena en una red SDN con Floodlight.")
     parser.add_argument('action', choices=['install', 'delete'], help="La acción a realizar: 'install' para crear los flujos, 'delete' para borrarlos.")
+    parser.add_argument('--hosts', help="Modo masivo: fichero de texto o base SQLite con los hosts a procesar en lugar de HOSTS_A_BLOQUEAR.")
+    parser.add_argument('--workers', type=int, default=32, help="Peticiones simultáneas en modo masivo (por defecto 32).")
     
     args = parser.parse_args()
 
-    if args.action == 'install':
+    if args.hosts:
+        hosts = load_hosts(args.hosts)
+        print(f"--- Modo masivo: {len(hosts)} hosts cargados desde {args.hosts} ---")
+        pusher = FlowPusher(STATIC_FLOW_URL, timeout=REQUEST_TIMEOUT, max_workers=args.workers,
+                            logger=print, verbose=False, cluster=runtime().cluster)
+        if args.action == 'install':
+            bulk_install(hosts, pusher)
+        else:
+            bulk_delete(hosts, pusher)
+        pusher.close()
+
+    elif args.action == 'install':
         print("--- Iniciando Instalación de Flujos de Cuarentena ---")
         for mac, name in HOSTS_A_BLOQUEAR.items():
             dpid, port = get_attachment_point(mac)
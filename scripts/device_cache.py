@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import time
+import codecs
+import threading
+import requests
+
+from metrics import span
+from controllers import DEVICE_PATH
+
+# --- CONFIGURACIÓN DE LA CACHÉ ---
+# Segundos que una entrada MAC -> (dpid, puerto) se considera válida
+DEFAULT_TTL = 30
+# Intervalo mínimo entre dos descargas completas de /wm/device/.
+# Evita que una ráfaga de fallos de caché se convierta en una ráfaga de descargas.
+MIN_REFRESH_INTERVAL = 2
+# Bytes leídos de cada vez al recorrer la respuesta de /wm/device/ sin cargarla entera
+STREAM_CHUNK = 64 * 1024
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def normalize_mac(mac):
+    """
+    Normaliza una MAC a minúsculas para usarla como clave del índice.
+    """
+    return mac.strip().lower()
+
+
+def iter_json_array(chunks):
+    """
+    Recorre de forma incremental el primer array JSON de una respuesta (la lista de
+    /wm/device/ o el 'devices' de {"devices": [...]}) y produce sus elementos uno a uno,
+    sin construir nunca la lista completa. 'chunks' es un iterable de bytes.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = None
+    for chunk in chunks:
+        buf += utf8.decode(chunk)
+        if pos is None:
+            start = buf.find('[')
+            if start < 0:
+                continue
+            pos = start + 1
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == ']':
+                return
+            try:
+                element, pos_end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Elemento incompleto: hace falta el siguiente bloque
+                break
+            yield element
+            pos = pos_end
+        buf, pos = buf[pos:], 0
+    raise ValueError("respuesta JSON truncada o sin lista de dispositivos")
+
+
+class DeviceCache:
+    """
+    Índice MAC -> (DPID, puerto) construido a partir de /wm/device/ de Floodlight.
+
+    Todas las búsquedas de un proceso comparten el mismo índice. Solo se consulta
+    al controlador cuando la MAC no está en el índice o su entrada ha caducado, y
+    cada descarga actualiza el índice completo (no solo la MAC pedida), de modo que
+    las siguientes búsquedas se resuelven en memoria.
+
+    Una MAC suelta se busca con el filtro '?mac=' de Floodlight. Si el controlador no lo
+    admite y devuelve la tabla entera, la respuesta se recorre de forma incremental y la
+    descarga se corta en cuanto aparece la MAC. Ninguna descarga se carga entera en memoria.
+
+    Con 'cluster' (ver controllers.py) se consulta a todas las instancias de Floodlight y se
+    fusionan sus tablas; si un host aparece en varias, se toma el visto más recientemente.
+    """
+    def __init__(self, device_url, timeout=10, ttl=DEFAULT_TTL,
+                 min_refresh_interval=MIN_REFRESH_INTERVAL, session=None, logger=log, cluster=None):
+        self.device_url = device_url
+        self.cluster = cluster
+        self.timeout = timeout
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.session = session or requests
+        self.log = logger
+        # mac -> (dpid, port, instante de la última confirmación)
+        self._index = {}
+        # ipv4 -> mac, según la última descarga
+        self._ip_index = {}
+        # mac -> última vez que el controlador vio tráfico del host (segundos desde epoch)
+        self._last_seen = {}
+        self._last_refresh = 0.0
+        # mac -> instante de la última búsqueda sin resultado
+        self._missing = {}
+        # None mientras no se sepa si el controlador admite '?mac='
+        self.filter_supported = None
+        # Instantánea de la que se leen bajo demanda las MACs que aún no están en el índice
+        self._snapshot = None
+        # Marca de tiempo (monotonic) que reciben sus entradas, e instante real en que se descargaron
+        self._snapshot_ts = None
+        self._snapshot_at = None
+        # MACs invalidadas que no deben volver a leerse de la instantánea
+        self._dropped = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "queries": 0, "scanned": 0}
+
+    def _is_fresh(self, entry, now):
+        return entry is not None and now - entry[2] < self.ttl
+
+    def _entry(self, mac):
+        """
+        Entrada del índice de una MAC; si no está, la busca en la instantánea cargada.
+        """
+        entry = self._index.get(mac)
+        snapshot = self._snapshot
+        if entry is None and mac is not None and snapshot is not None and mac not in self._dropped:
+            found = snapshot.device(mac)
+            if found is not None:
+                dpid, port, last_seen = found
+                entry = self._index.setdefault(mac, (dpid, port, self._snapshot_ts))
+                if last_seen:
+                    self._last_seen.setdefault(mac, last_seen)
+        return entry
+
+    def _mac_for_ip(self, ip):
+        mac = self._ip_index.get(ip)
+        snapshot = self._snapshot
+        if mac is None and snapshot is not None:
+            mac = snapshot.mac_for_ip(ip)
+        return mac
+
+    def get_attachment_point(self, host_mac):
+        """
+        Retorna una tupla (dpid, port) para la MAC dada o (None, None) si no se encuentra.
+        """
+        mac = normalize_mac(host_mac)
+        now = time.monotonic()
+        entry = self._entry(mac)
+        if self._is_fresh(entry, now):
+            self.stats["hits"] += 1
+            return entry[0], entry[1]
+
+        self.stats["misses"] += 1
+        with self._lock:
+            # Otro hilo pudo haber refrescado mientras esperábamos el lock
+            entry = self._index.get(mac)
+            now = time.monotonic()
+            if self._is_fresh(entry, now):
+                return entry[0], entry[1]
+            # Si la última descarga completa o la última búsqueda de esta MAC son muy
+            # recientes, su resultado sigue siendo la mejor información disponible:
+            # un fallo aquí no vuelve a ir al controlador.
+            if (now - self._last_refresh < self.min_refresh_interval
+                    or now - self._missing.get(mac, float("-inf")) < self.min_refresh_interval):
+                entry = self._index.get(mac)
+                return (entry[0], entry[1]) if entry is not None else (None, None)
+            return self._query_locked(mac)
+
+    def _all_devices(self, query, s):
+        """
+        Dispositivos de todas las instancias de Floodlight, una tras otra. Una instancia
+        que no responde se salta; falla solo si no responde ninguna.
+        """
+        if self.cluster is None:
+            yield from self._stream_devices(self.device_url + query, s, self.session)
+            return
+        answered = 0
+        for controller in self.cluster.available():
+            try:
+                yield from self._stream_devices(controller.url(DEVICE_PATH) + query, s, controller.session)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.cluster.mark_down(controller, e)
+                continue
+            answered += 1
+        if not answered:
+            raise requests.ConnectionError("ninguna instancia de Floodlight respondió")
+
+    def _stream_devices(self, url, s, session):
+        """
+        Petición GET en modo streaming; produce los dispositivos uno a uno.
+        """
+        with session.get(url, timeout=self.timeout, stream=True) as response:
+            s.set(status=response.status_code)
+            response.raise_for_status()
+            received = 0
+            chunks = response.iter_content(STREAM_CHUNK)
+
+            def counted():
+                nonlocal received
+                for chunk in chunks:
+                    received += len(chunk)
+                    yield chunk
+            try:
+                yield from iter_json_array(counted())
+            finally:
+                s.set(bytes=received)
+
+    def _query_locked(self, mac):
+        """
+        Busca una sola MAC en el controlador. Retorna (dpid, port) o (None, None).
+        """
+        self.stats["queries"] += 1
+        filtered = self.filter_supported is not False
+        query = f"?mac={mac}" if filtered else ""
+        now = time.monotonic()
+        found = False
+        foreign = False
+        scanned = 0
+        with span("device.query", filtered=filtered) as s:
+            devices = self._all_devices(query, s)
+            try:
+                for device in devices:
+                    scanned += 1
+                    # Solo se indexa el host buscado: indexar cada host recorrido costaría más
+                    # que el propio recorrido (de eso ya se encarga la descarga completa)
+                    if any(normalize_mac(m) == mac for m in device.get('mac', [])):
+                        found = mac in self._index_device(device, now)[0]
+                        break
+                    foreign = True
+            except requests.HTTPError as e:
+                if filtered and e.response is not None and 400 <= e.response.status_code < 500:
+                    self.log(f"  [!] Floodlight rechaza el filtro '?mac=' ({e}); se recorrerá la tabla completa.")
+                    self.filter_supported = False
+                    return self._query_locked(mac)
+                self.log(f"  [!] Error al conectar con Floodlight para obtener dispositivos: {e}")
+                return None, None
+            except (requests.RequestException, ValueError) as e:
+                self.log(f"  [!] Error al conectar con Floodlight para obtener dispositivos: {e}")
+                return None, None
+            finally:
+                # Corta la descarga si la MAC apareció antes del final
+                devices.close()
+                self.stats["scanned"] += scanned
+            s.set(found=found, scanned=scanned)
+
+        if filtered and foreign and self.filter_supported is None:
+            # La respuesta trae otros hosts: el controlador ignora el filtro
+            self.log("  [*] Floodlight no filtra /wm/device/ por MAC: se recorrerá la tabla de forma incremental.")
+            self.filter_supported = False
+        elif filtered and found and not foreign:
+            self.filter_supported = True
+
+        entry = self._index.get(mac) if found else None
+        if entry is None:
+            self._missing[mac] = now
+            return None, None
+        self._missing.pop(mac, None)
+        return entry[0], entry[1]
+
+    def lookup_many(self, host_macs):
+        """
+        Resuelve muchas MACs con como mucho una descarga de la tabla de dispositivos.
+        Retorna un diccionario mac -> (dpid, port) solo con las MACs encontradas.
+        Como en get_attachment_point, no se vuelve al controlador si la última descarga o la
+        última búsqueda sin resultado de la MAC son muy recientes, y las MACs que ya faltaban
+        se buscan una a una con '?mac=' en lugar de descargar otra vez la tabla entera.
+        """
+        with self._lock:
+            now = time.monotonic()
+            macs = [normalize_mac(m) for m in host_macs]
+            stale = [m for m in dict.fromkeys(macs) if not self._is_fresh(self._entry(m), now)
+                     and now - self._missing.get(m, float("-inf")) >= self.min_refresh_interval]
+            if stale and now - self._last_refresh >= self.min_refresh_interval:
+                if any(m not in self._missing for m in stale):
+                    if not self._refresh_locked():
+                        return {}
+                    for mac in stale:
+                        if mac not in self._index:
+                            self._missing[mac] = now
+                else:
+                    for mac in stale:
+                        self._query_locked(mac)
+            found = {}
+            for original, mac in zip(host_macs, macs):
+                entry = self._index.get(mac)
+                if entry is not None:
+                    found[original] = (entry[0], entry[1])
+            return found
+
+    def lookup_ips(self, ips):
+        """
+        Resuelve muchas IPv4 a (mac, dpid, port) con como mucho una descarga.
+        Retorna un diccionario ip -> (mac, dpid, port) solo con las IPs encontradas.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if any(not self._is_fresh(self._entry(self._mac_for_ip(ip)), now) for ip in ips):
+                if now - self._last_refresh >= self.min_refresh_interval:
+                    self._refresh_locked()
+            found = {}
+            for ip in ips:
+                mac = self._mac_for_ip(ip)
+                entry = self._entry(mac)
+                if entry is not None:
+                    found[ip] = (mac, entry[0], entry[1])
+            return found
+
+    def peek(self, host_mac):
+        """
+        Retorna (dpid, port) de la MAC según el índice, sin consultar al controlador aunque
+        la entrada haya caducado, o (None, None) si no está.
+        """
+        entry = self._entry(normalize_mac(host_mac))
+        return (entry[0], entry[1]) if entry is not None else (None, None)
+
+    def hosts_by_port(self):
+        """
+        Retorna (dpid, puerto) -> [MACs] según el índice, sin consultar al controlador.
+        """
+        self._materialize()
+        hosts = {}
+        for mac, (dpid, port, _) in list(self._index.items()):
+            hosts.setdefault((dpid, port), []).append(mac)
+        return hosts
+
+    def contains(self, host_mac):
+        """
+        True si la MAC aparece en la última descarga de la tabla de dispositivos.
+        """
+        return self._entry(normalize_mac(host_mac)) is not None
+
+    def last_seen(self, host_mac):
+        """
+        Última vez (segundos desde epoch) que Floodlight vio al host, o None si no se sabe.
+        """
+        mac = normalize_mac(host_mac)
+        self._entry(mac)
+        return self._last_seen.get(mac)
+
+    def load_snapshot(self, snapshot, age):
+        """
+        Parte de una instantánea (state_snapshot.StateSnapshot) en lugar de un índice vacío.
+        Sus entradas se leen del fichero mapeado a medida que se piden y cuentan como
+        descargadas hace 'age' segundos: 0 si el controlador las ha confirmado, su antigüedad
+        real o infinito si ya no valen (p. ej. el controlador se reinició). Cuando caducan, la
+        primera búsqueda de cada MAC la vuelve a consultar al controlador, y la primera
+        descarga completa sustituye a la instantánea.
+        """
+        with self._lock:
+            self._snapshot = snapshot
+            self._snapshot_at = snapshot.devices_at
+            self._snapshot_ts = time.monotonic() - age
+            self._dropped.clear()
+
+    def _materialize(self):
+        """
+        Pasa al índice todas las entradas de la instantánea que aún no se habían leído.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return
+        for mac, dpid, port, last_seen in snapshot.devices():
+            if mac not in self._index and mac not in self._dropped:
+                self._index[mac] = (dpid, port, self._snapshot_ts)
+                if last_seen:
+                    self._last_seen.setdefault(mac, last_seen)
+        for ip, mac in snapshot.ips().items():
+            self._ip_index.setdefault(ip, mac)
+        self._snapshot = None
+
+    def export(self):
+        """
+        Contenido del índice para guardarlo en una instantánea: (tuplas (mac, dpid, puerto,
+        lastSeen), ipv4 -> mac, instante de la confirmación más antigua en segundos desde
+        epoch). Las entradas que vienen de otra instantánea conservan el instante en que se
+        descargaron, no el de la carga, para que guardar de nuevo no las rejuvenezca.
+        """
+        with self._lock:
+            self._materialize()
+            now, wall = time.monotonic(), time.time()
+            oldest = wall
+            devices = []
+            for mac, (dpid, port, ts) in self._index.items():
+                oldest = min(oldest, self._snapshot_at if ts == self._snapshot_ts else wall - (now - ts))
+                devices.append((mac, dpid, port, self._last_seen.get(mac)))
+            return devices, dict(self._ip_index), oldest
+
+    def refresh(self):
+        """
+        Fuerza una descarga de la tabla de dispositivos. Retorna True si tuvo éxito.
+        """
+        with self._lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self):
+        with span("device.refresh") as s:
+            try:
+                self._apply_snapshot(self._all_devices("", s), time.monotonic())
+            except (requests.RequestException, ValueError) as e:
+                self.log(f"  [!] Error al conectar con Floodlight para obtener dispositivos: {e}")
+                return False
+        return True
+
+    def _index_device(self, device, now):
+        """
+        Integra un dispositivo de /wm/device/ en el índice.
+        Retorna (MACs indexadas, cuántas cambiaron de punto de conexión).
+        """
+        ap_list = device.get('attachmentPoint', [])
+        if not ap_list:
+            return [], 0
+        ap = ap_list[0]
+        dpid = ap.get('switchDPID')
+        port = ap.get('port')
+        if not dpid or port is None:
+            return [], 0
+        port = str(port)
+        macs = []
+        changed = 0
+        for raw_mac in device.get('mac', []):
+            mac = normalize_mac(raw_mac)
+            macs.append(mac)
+            for ip in device.get('ipv4', []):
+                self._ip_index[ip] = mac
+            if device.get('lastSeen'):
+                self._last_seen[mac] = device['lastSeen'] / 1000.0
+            old = self._index.get(mac)
+            if old is None or old[0] != dpid or old[1] != port:
+                changed += 1
+            self._index[mac] = (dpid, port, now)
+        return macs, changed
+
+    def _apply_snapshot(self, devices, now):
+        """
+        Integra una descarga de /wm/device/ en el índice de forma incremental:
+        las entradas sin cambios solo renuevan su marca de tiempo, las que cambiaron
+        se sustituyen y las que han caducado y ya no aparecen se eliminan.
+        'devices' puede ser un generador: el índice se poda solo si se recorre entero.
+        """
+        seen = set()
+        changed = 0
+        for device in devices:
+            if self.cluster is not None and self._older_duplicate(device, seen):
+                continue
+            macs, device_changed = self._index_device(device, now)
+            seen.update(macs)
+            changed += device_changed
+
+        for mac in [m for m, e in self._index.items() if m not in seen and not self._is_fresh(e, now)]:
+            del self._index[mac]
+        for ip in [ip for ip, mac in self._ip_index.items() if mac not in self._index]:
+            del self._ip_index[ip]
+        for mac in [m for m in self._last_seen if m not in self._index]:
+            del self._last_seen[mac]
+        self._missing.clear()
+        self._snapshot = None
+        self._dropped.clear()
+
+        self._last_refresh = now
+        self.stats["refreshes"] += 1
+        self.log(f"  [*] Tabla de dispositivos actualizada: {len(self._index)} MACs indexadas, {changed} cambios.")
+
+    def _older_duplicate(self, device, seen):
+        """
+        True si el dispositivo ya apareció en esta descarga (en otra instancia) visto más tarde.
+        """
+        last_seen = device.get('lastSeen', 0) / 1000.0
+        for raw_mac in device.get('mac', []):
+            mac = normalize_mac(raw_mac)
+            if mac in seen and self._last_seen.get(mac, 0) > last_seen:
+                return True
+        return False
+
+    def invalidate(self, host_mac=None):
+        """
+        Descarta la entrada de una MAC (o todo el índice si no se indica ninguna).
+        """
+        with self._lock:
+            if host_mac is None:
+                self._index.clear()
+                self._ip_index.clear()
+                self._last_seen.clear()
+                self._missing.clear()
+                self._snapshot = None
+                self._last_refresh = 0.0
+            else:
+                self._index.pop(normalize_mac(host_mac), None)
+                self._missing.pop(normalize_mac(host_mac), None)
+                if self._snapshot is not None:
+                    self._dropped.add(normalize_mac(host_mac))
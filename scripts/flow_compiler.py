@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import argparse
+import threading
+
+# Modos de generación de flujos
+MODE_PER_USER = "por_usuario"   # 4 flujos por salto y usuario (comportamiento original)
+MODE_COMPILED = "compilado"     # reglas por MAC solo en el borde, reglas compartidas en tránsito
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def _sanitize(value):
+    return str(value).replace(':', '').replace('.', '')
+
+
+def _hops(route):
+    """
+    Convierte una ruta de /wm/topology/route en una lista de (dpid, puerto_entrada, puerto_salida).
+    """
+    return [(route[i]['switch'], str(route[i]['port']['portNumber']), str(route[i+1]['port']['portNumber']))
+            for i in range(0, len(route), 2)]
+
+
+# Valor de ip_proto y prefijo de los campos de puerto de cada protocolo
+_IP_PROTO = {"tcp": "0x06", "udp": "0x11"}
+
+
+def _forward_flows(mac_origen, service_mac, service_ip, reglas, dpid_actual, puerto_salida):
+    """
+    Flujos por usuario de un salto de la ruta directa (origen -> servidor): uno por
+    cada (protocolo, puerto) de 'reglas' y uno ARP.
+    El nombre lleva el DPID del switch y no la posición del salto, de modo que si la ruta
+    cambia, los flujos de los switches que siguen en ella conservan su nombre.
+    """
+    prefijo = f"conn-{mac_origen.replace(':', '')}-{_sanitize(service_ip)}"
+    sw = _sanitize(dpid_actual)
+    flujos = []
+    for protocolo, puerto in reglas:
+        flujos.append({
+            "switch": dpid_actual,
+            "name": f"{prefijo}-fwd-{protocolo}{puerto}-{sw}",
+            "priority": "32768", "active": "true",
+            "eth_type": "0x0800", "ip_proto": _IP_PROTO[protocolo],
+            "eth_src": mac_origen, "eth_dst": service_mac,
+            "ipv4_dst": service_ip, f"{protocolo}_dst": str(puerto),
+            "actions": f"output={puerto_salida}"
+        })
+    # Flujo ARP
+    flujos.append({
+        "switch": dpid_actual,
+        "name": f"{prefijo}-fwd-arp-{sw}",
+        "priority": "32767", "active": "true",
+        "eth_type": "0x0806",
+        "eth_src": mac_origen, "eth_dst": service_mac,
+        "actions": f"output={puerto_salida}"
+    })
+    return flujos
+
+
+def _reverse_flows(mac_origen, service_mac, service_ip, reglas, dpid_actual, puerto_salida):
+    """
+    Flujos por usuario de un salto de la ruta inversa (servidor -> origen): uno por
+    cada (protocolo, puerto) de 'reglas' y uno ARP.
+    """
+    prefijo = f"conn-{mac_origen.replace(':', '')}-{_sanitize(service_ip)}"
+    sw = _sanitize(dpid_actual)
+    flujos = []
+    for protocolo, puerto in reglas:
+        flujos.append({
+            "switch": dpid_actual,
+            "name": f"{prefijo}-rev-{protocolo}{puerto}-{sw}",
+            "priority": "32768", "active": "true",
+            "eth_type": "0x0800", "ip_proto": _IP_PROTO[protocolo],
+            "eth_src": service_mac, "eth_dst": mac_origen,
+            "ipv4_src": service_ip, f"{protocolo}_src": str(puerto),
+            "actions": f"output={puerto_salida}"
+        })
+    # Flujo ARP
+    flujos.append({
+        "switch": dpid_actual,
+        "name": f"{prefijo}-rev-arp-{sw}",
+        "priority": "32767", "active": "true",
+        "eth_type": "0x0806",
+        "eth_src": service_mac, "eth_dst": mac_origen,
+        "actions": f"output={puerto_salida}"
+    })
+    return flujos
+
+
+def build_user_flows(mac_origen, service_mac, service_ip, reglas, ruta_directa, ruta_inversa):
+    """
+    Genera los flujos por usuario hacia un servidor en todos los saltos, en ambas
+    direcciones. 'reglas' es la lista de (protocolo, puerto) permitidos en ese servidor.
+    """
+    flujos = []
+    for dpid_actual, _, puerto_salida in _hops(ruta_directa):
+        flujos += _forward_flows(mac_origen, service_mac, service_ip, reglas, dpid_actual, puerto_salida)
+    for dpid_actual, _, puerto_salida in _hops(ruta_inversa):
+        flujos += _reverse_flows(mac_origen, service_mac, service_ip, reglas, dpid_actual, puerto_salida)
+    return flujos
+
+
+def compile_user_flows(mac_origen, service_mac, service_ip, reglas, ruta_directa, ruta_inversa):
+    """
+    Genera los flujos de un usuario hacia un servidor en modo compilado.
+    Retorna (flujos_usuario, flujos_compartidos).
+
+    - Switch de borde del usuario: las mismas reglas por MAC que el modo por usuario, que son
+      las que aplican el control de acceso según el rol.
+    - Switches de tránsito, sentido directo: reglas por servicio (IP + protocolo + puerto, y
+      ARP hacia el servidor) restringidas al puerto de entrada del enlace, compartidas por
+      todos los usuarios que llegan por ese enlace.
+    - Switches de tránsito, sentido inverso: el puerto de salida depende de dónde está cada
+      usuario, así que queda una única regla por MAC de destino y servidor.
+    """
+    prefijo = f"conn-{mac_origen.replace(':', '')}-{_sanitize(service_ip)}"
+    directa, inversa = _hops(ruta_directa), _hops(ruta_inversa)
+
+    # Borde: primer salto de la ruta directa y último de la inversa
+    dpid_borde, _, salida_directa = directa[0]
+    _, _, salida_inversa = inversa[-1]
+    flujos_usuario = (_forward_flows(mac_origen, service_mac, service_ip, reglas, dpid_borde, salida_directa)
+                      + _reverse_flows(mac_origen, service_mac, service_ip, reglas, dpid_borde, salida_inversa))
+
+    flujos_compartidos = []
+    for dpid_actual, puerto_entrada, puerto_salida in directa[1:]:
+        sw = _sanitize(dpid_actual)
+        for protocolo, puerto in reglas:
+            flujos_compartidos.append({
+                "switch": dpid_actual,
+                "name": f"svc-{_sanitize(service_ip)}-{puerto}-{protocolo}-{sw}-{puerto_entrada}",
+                "priority": "32768", "active": "true",
+                "in_port": puerto_entrada,
+                "eth_type": "0x0800", "ip_proto": _IP_PROTO[protocolo],
+                "eth_dst": service_mac, "ipv4_dst": service_ip, f"{protocolo}_dst": str(puerto),
+                "actions": f"output={puerto_salida}"
+            })
+        flujos_compartidos.append({
+            "switch": dpid_actual,
+            "name": f"svc-{_sanitize(service_mac)}-arp-{sw}-{puerto_entrada}",
+            "priority": "32767", "active": "true",
+            "in_port": puerto_entrada,
+            "eth_type": "0x0806", "eth_dst": service_mac,
+            "actions": f"output={puerto_salida}"
+        })
+
+    for dpid_actual, _, puerto_salida in inversa[:-1]:
+        flujos_usuario.append({
+            "switch": dpid_actual,
+            "name": f"{prefijo}-rev-dst-{_sanitize(dpid_actual)}",
+            "priority": "32768", "active": "true",
+            "eth_src": service_mac, "eth_dst": mac_origen,
+            "actions": f"output={puerto_salida}"
+        })
+    return flujos_usuario, flujos_compartidos
+
+
+def with_timeouts(flows, idle_timeout=0, hard_timeout=0):
+    """
+    Añade a los flujos de sesión sus timeouts (0 = sin timeout). Los flujos ARP solo
+    reciben el hard_timeout: el tráfico ARP es esporádico y un idle_timeout los haría
+    caducar antes que el resto de la sesión.
+    """
+    for flow in flows:
+        if idle_timeout and flow.get("eth_type") != "0x0806":
+            flow["idle_timeout"] = str(idle_timeout)
+        if hard_timeout:
+            flow["hard_timeout"] = str(hard_timeout)
+    return flows
+
+
+class SharedFlowTable:
+    """
+    Contador de referencias de los flujos compartidos de tránsito.
+    Un flujo compartido se instala con su primera referencia y se borra con la última.
+    """
+    def __init__(self):
+        # nombre del flujo -> conjunto de MACs que lo usan
+        self._refs = {}
+        # MAC -> conjunto de nombres de flujos compartidos que usa
+        self._by_owner = {}
+        self._lock = threading.Lock()
+
+    def load(self, owners):
+        """
+        Reconstruye las referencias a partir de dueño -> nombres de flujos compartidos
+        (p. ej. las guardadas en el registro de flujos al arrancar).
+        """
+        with self._lock:
+            self._by_owner = {owner: set(names) for owner, names in owners.items()}
+            self._refs = {}
+            for owner, names in self._by_owner.items():
+                for name in names:
+                    self._refs.setdefault(name, set()).add(owner)
+
+    def acquire(self, owner, flows):
+        """
+        Registra que 'owner' usa 'flows'. Retorna (flujos_a_instalar, nombres_a_borrar):
+        los compartidos que aún no existían y los que 'owner' dejó de usar sin otro dueño.
+        """
+        with self._lock:
+            nuevos = {f["name"] for f in flows}
+            to_delete = self._release_names(owner, self._by_owner.get(owner, set()) - nuevos)
+            to_install = []
+            for flow in flows:
+                refs = self._refs.setdefault(flow["name"], set())
+                if not refs:
+                    to_install.append(flow)
+                refs.add(owner)
+            self._by_owner[owner] = nuevos
+            return to_install, to_delete
+
+    def release(self, owner):
+        """
+        Libera todas las referencias de 'owner'. Retorna los nombres que quedaron sin dueño.
+        """
+        with self._lock:
+            return self._release_names(owner, self._by_owner.pop(owner, set()))
+
+    def _release_names(self, owner, names):
+        huerfanos = []
+        for name in names:
+            refs = self._refs.get(name)
+            if refs is None:
+                continue
+            refs.discard(owner)
+            if not refs:
+                del self._refs[name]
+                huerfanos.append(name)
+        return huerfanos
+
+    def __len__(self):
+        return len(self._refs)
+
+
+def count_flows(sesiones):
+    """
+    Cuenta los flujos de una población de usuarios en ambos modos.
+    'sesiones' es una lista de (mac, service_mac, service_ip, reglas, ruta_directa, ruta_inversa).
+    Retorna (flujos_por_usuario, flujos_compilados).
+    """
+    por_usuario = 0
+    compilados = 0
+    compartidos = set()
+    for mac, service_mac, service_ip, reglas, directa, inversa in sesiones:
+        por_usuario += len(build_user_flows(mac, service_mac, service_ip, reglas, directa, inversa))
+        propios, comunes = compile_user_flows(mac, service_mac, service_ip, reglas, directa, inversa)
+        compilados += len(propios)
+        compartidos.update(f["name"] for f in comunes)
+    return por_usuario, compilados + len(compartidos)
+
+
+def main():
+    """
+    Informe de tamaño de tablas: resuelve la ruta de cada usuario de un fichero
+    '<rol> <mac>' contra la red real y compara el número de flujos en ambos modos.
+    """
+    parser = argparse.ArgumentParser(description="Compara el número de flujos por usuario y compilados para una población de usuarios.")
+    parser.add_argument('usuarios', help="Fichero con una línea '<rol> <mac>' por usuario.")
+    args = parser.parse_args()
+
+    from sdn_manager import SdnConnectionManager
+    from policy import group_by_host
+    manager = SdnConnectionManager()
+
+    sesiones = []
+    with open(args.usuarios) as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) != 2 or not manager.policy.rules(partes[0]):
+                continue
+            rol, mac = partes
+            dpid, puerto = manager._get_attachment_point(mac)
+            if not dpid:
+                continue
+            for (service_mac, service_ip), reglas in group_by_host(manager.policy.rules(rol)):
+                dpid_destino, puerto_destino_ap = manager._get_attachment_point(service_mac)
+                if not dpid_destino:
+                    log(f"[!] No se encontró el servidor {service_ip} en la red.")
+                    continue
+                directa, inversa = manager._get_routes(dpid, puerto, dpid_destino, puerto_destino_ap)
+                if directa and inversa:
+                    sesiones.append((mac, service_mac, service_ip, reglas, directa, inversa))
+
+    por_usuario, compilados = count_flows(sesiones)
+    print(f"Sesiones (usuario, servidor) con ruta: {len(sesiones)}")
+    print(f"Flujos en modo '{MODE_PER_USER}': {por_usuario}")
+    print(f"Flujos en modo '{MODE_COMPILED}': {compilados}")
+    if por_usuario:
+        print(f"Reducción: {100 * (1 - compilados / por_usuario):.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import span
+from controllers import STATIC_FLOW_PATH
+
+# --- CONFIGURACIÓN DEL MOTOR DE ENVÍO ---
+# Peticiones simultáneas máximas hacia el Static Flow Pusher
+DEFAULT_MAX_WORKERS = 8
+# Reintentos ante errores transitorios (conexión, timeout, HTTP 5xx/429)
+DEFAULT_RETRIES = 2
+# Espera base entre reintentos; se duplica en cada intento
+RETRY_BACKOFF = 0.2
+
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+# Resultado de una operación sobre un flujo
+FlowResult = namedtuple('FlowResult', ['name', 'switch', 'ok', 'status', 'attempts'])
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def _error_text(e):
+    return e.response.text if e.response is not None else str(e)
+
+
+class FlowPusher:
+    """
+    Motor compartido para instalar y borrar flujos en el Static Flow Pusher de Floodlight.
+
+    Usa una sesión HTTP con un pool de conexiones keep-alive y un pool de hilos acotado,
+    de modo que todos los flujos de un login se envían en paralelo. Cada operación
+    retorna un FlowResult con el éxito o fallo de ese flujo concreto.
+
+    Con 'cluster' (ver controllers.py) cada flujo se envía a la instancia de Floodlight
+    que controla su switch, con la sesión de esa instancia; si no responde, a otra que
+    también lo controle, y si no hay ninguna la operación falla. Un HTTP 429/5xx se
+    reintenta en la misma instancia sin darla por caída. Los borrados de flujos cuyo switch no se conoce se envían a
+    todas las instancias.
+    """
+    def __init__(self, static_flow_url, timeout=10, max_workers=DEFAULT_MAX_WORKERS,
+                 retries=DEFAULT_RETRIES, session=None, logger=log, verbose=True, cluster=None):
+        self.static_flow_url = static_flow_url
+        self.cluster = cluster
+        self.timeout = timeout
+        self.retries = retries
+        self.log = logger
+        # Con verbose=False solo se registran errores y advertencias (envíos masivos)
+        self.verbose = verbose
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="flow-push")
+
+    def _targets(self, switch):
+        """
+        Lista de (url, sesión, instancia) a la que enviar una operación, por orden de preferencia.
+        """
+        if self.cluster is None:
+            return [(self.static_flow_url, self.session, None)]
+        controllers = self.cluster.targets(switch, owners_only=switch is not None)
+        return [(c.url(STATIC_FLOW_PATH), c.session, c) for c in controllers]
+
+    def _request(self, method, name, switch, targets=None, **kwargs):
+        """
+        Ejecuta una petición con reintentos ante errores transitorios.
+        Cada petición queda medida como un tramo 'flow.post' o 'flow.delete'.
+        """
+        with span(f"flow.{method.lower()}", flow=name, switch=switch) as s:
+            result = self._request_with_retries(s, method, name, switch, targets or self._targets(switch), **kwargs)
+            s.set(ok=result.ok, attempts=result.attempts)
+            return result
+
+    def _request_with_retries(self, s, method, name, switch, targets, **kwargs):
+        if not targets:
+            return FlowResult(name, switch, False, "Ninguna instancia de Floodlight disponible controla el switch", 0)
+        attempts = 0
+        while True:
+            attempts += 1
+            url, session, controller = targets[0]
+            try:
+                response = session.request(method, url, timeout=self.timeout, **kwargs)
+                s.set_response(response)
+                if response.status_code in TRANSIENT_STATUS and attempts <= self.retries:
+                    # La instancia responde pero está saturada: se reintenta en ella misma
+                    time.sleep(RETRY_BACKOFF * 2 ** (attempts - 1))
+                    continue
+                response.raise_for_status()
+                try:
+                    status = response.json().get('status', 'Sin estado devuelto')
+                except ValueError:
+                    status = 'Sin estado devuelto'
+                return FlowResult(name, switch, True, status, attempts)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if controller is not None:
+                    # Se prueba sin esperar con otra instancia que controle el switch o, si no
+                    # queda ninguna, con el nuevo reparto (que ya no incluye a esta). Nunca con
+                    # una que no lo controle: aceptaría el flujo sin que llegue al switch.
+                    self.cluster.mark_down(controller, e)
+                    remaining = targets[1:]
+                    if not remaining and switch is not None:
+                        remaining = [t for t in self._targets(switch) if t[2] is not controller]
+                    if remaining:
+                        targets = remaining
+                        continue
+                if attempts > self.retries:
+                    return FlowResult(name, switch, False, _error_text(e), attempts)
+                time.sleep(RETRY_BACKOFF * 2 ** (attempts - 1))
+            except requests.RequestException as e:
+                return FlowResult(name, switch, False, _error_text(e), attempts)
+
+    def install(self, flow_data):
+        """
+        Envía una única regla de flujo a Floodlight para ser instalada.
+        """
+        result = self._request('POST', flow_data['name'], flow_data.get('switch'), json=flow_data)
+        if result.ok and self.cluster is not None:
+            self.cluster.remember_flows({result.name: result.switch})
+        if not result.ok:
+            self.log(f"      [!] Error al instalar el flujo '{result.name}': {result.status}")
+        elif "Flow rule pushed" not in result.status:
+            self.log(f"      [!] Advertencia: Floodlight respondió para '{result.name}': {result.status}")
+        elif self.verbose:
+            self.log(f"    - Flujo '{result.name}' instalado en el switch {result.switch}: {result.status}")
+        return result
+
+    def delete(self, flow_name):
+        """
+        Envía una petición para borrar un flujo por su nombre.
+        """
+        kwargs = {"data": json.dumps({'name': flow_name}), "headers": {'Content-Type': 'application/json'}}
+        switch = self.cluster.forget_flow(flow_name) if self.cluster is not None else None
+        if self.cluster is not None and switch is None:
+            # Switch desconocido: se borra en todas las instancias
+            results = [self._request('DELETE', flow_name, None, targets=[t], **kwargs) for t in self._targets(None)]
+            result = next((r for r in results if r.ok), results[0] if results else
+                          FlowResult(flow_name, None, False, "Ninguna instancia de Floodlight disponible", 0))
+        else:
+            result = self._request('DELETE', flow_name, switch, **kwargs)
+        if not result.ok:
+            self.log(f"      [!] Error al borrar el flujo '{flow_name}': {result.status}")
+        elif self.verbose:
+            self.log(f"    - Flujo '{flow_name}' borrado: {result.status}")
+        return result
+
+    def install_many(self, flows):
+        """
+        Instala un conjunto de flujos en paralelo. Retorna la lista de FlowResult en el mismo orden.
+        """
+        return list(self.executor.map(self.install, flows))
+
+    def delete_many(self, flow_names):
+        """
+        Borra un conjunto de flujos en paralelo. Retorna la lista de FlowResult en el mismo orden.
+        """
+        return list(self.executor.map(self.delete, flow_names))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+
+def summarize(results):
+    """
+    Retorna (correctos, fallidos) de una lista de FlowResult.
+    """
+    ok = sum(1 for r in results if r.ok)
+    return ok, len(results) - ok
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# --- CONFIGURACIÓN ---
+# Fichero SQLite del registro (se puede cambiar con la variable de entorno SDN_FLOW_REGISTRY)
+REGISTRY_PATH = os.environ.get("SDN_FLOW_REGISTRY", "/tmp/sdn_flows.db")
+
+
+class FlowRegistry:
+    """
+    Registro persistente de los flujos instalados por crear_conexion, indexado por MAC,
+    rol y DPID. Permite que el logout borre exactamente los flujos de un usuario sin
+    descargar la lista completa de flujos del controlador.
+
+    Se guarda en SQLite para que el demonio y los scripts ejecutados sin demonio
+    compartan el mismo registro.
+    """
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS flows (
+                name TEXT PRIMARY KEY,
+                mac TEXT NOT NULL,
+                role TEXT,
+                dpid TEXT NOT NULL,
+                installed REAL NOT NULL,
+                body TEXT
+            );
+            CREATE INDEX IF NOT EXISTS flows_mac ON flows (mac);
+            CREATE INDEX IF NOT EXISTS flows_role ON flows (role);
+            CREATE INDEX IF NOT EXISTS flows_dpid ON flows (dpid);
+            CREATE TABLE IF NOT EXISTS hosts (
+                mac TEXT PRIMARY KEY,
+                dpid TEXT NOT NULL,
+                port TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS shared (
+                name TEXT NOT NULL,
+                mac TEXT NOT NULL,
+                PRIMARY KEY (name, mac)
+            );
+            CREATE INDEX IF NOT EXISTS shared_mac ON shared (mac);
+        """)
+        # Registros creados antes de que se guardara el contenido de cada flujo
+        if "body" not in {row[1] for row in self._conn.execute("PRAGMA table_info(flows)")}:
+            self._conn.execute("ALTER TABLE flows ADD COLUMN body TEXT")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(mac):
+        return mac.replace(':', '').lower()
+
+    @staticmethod
+    def _mac(key):
+        return ':'.join(key[i:i+2] for i in range(0, len(key), 2))
+
+    def register(self, mac, role, flows, attachment_point=None, installed=None):
+        """
+        Registra los flujos (diccionarios con 'name' y 'switch') instalados para una MAC y,
+        si se indica, el punto de conexión (dpid, puerto) desde el que se calcularon.
+        'installed' es el instante del login (por defecto ahora); quien reinstala flujos de
+        una sesión ya existente pasa el original para no alargar su duración.
+        """
+        now = time.time() if installed is None else installed
+        rows = [(f["name"], self._key(mac), role, f["switch"], now, json.dumps(f, sort_keys=True)) for f in flows]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO flows VALUES (?, ?, ?, ?, ?, ?)", rows)
+            if attachment_point is not None:
+                self._conn.execute("INSERT OR REPLACE INTO hosts VALUES (?, ?, ?)",
+                                   (self._key(mac), attachment_point[0], str(attachment_point[1])))
+            self._conn.commit()
+
+    def flows_for_mac(self, mac):
+        """
+        Retorna la lista de (nombre, dpid) registrados para una MAC.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT name, dpid FROM flows WHERE mac = ?", (self._key(mac),)).fetchall()
+
+    def last_login(self, mac):
+        """
+        Retorna el instante (epoch) en que se registraron los últimos flujos de una MAC,
+        o None si no tiene sesión.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT MAX(installed) FROM flows WHERE mac = ?", (self._key(mac),)).fetchone()[0]
+
+    def flow_bodies(self, mac):
+        """
+        Retorna nombre -> flujo (diccionario tal como se envió) de los flujos de una MAC.
+        Los registrados sin contenido aparecen con None.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT name, body FROM flows WHERE mac = ?", (self._key(mac),)).fetchall()
+        return {name: json.loads(body) if body else None for name, body in rows}
+
+    def attachment_points(self):
+        """
+        Retorna mac -> (dpid, puerto) de las sesiones activas cuyo punto de conexión se conoce.
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT h.mac, h.dpid, h.port FROM hosts h
+                WHERE EXISTS (SELECT 1 FROM flows f WHERE f.mac = h.mac)
+            """).fetchall()
+        return {self._mac(mac): (dpid, port) for mac, dpid, port in rows}
+
+    def flows_for_role(self, role):
+        with self._lock:
+            return self._conn.execute("SELECT name, dpid FROM flows WHERE role = ?", (role,)).fetchall()
+
+    def flows_for_dpid(self, dpid):
+        with self._lock:
+            return self._conn.execute("SELECT name, mac FROM flows WHERE dpid = ?", (dpid,)).fetchall()
+
+    def sessions(self):
+        """
+        Retorna la lista de (mac, rol) con flujos registrados, es decir, las sesiones activas.
+        La MAC se retorna con el formato habitual 'aa:bb:cc:dd:ee:ff'.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT mac, role FROM flows").fetchall()
+        return [(self._mac(mac), role) for mac, role in rows]
+
+    def session_flows(self):
+        """
+        Retorna mac -> (rol, instante del último login, [nombres de flujos]) de las sesiones
+        registradas, con la MAC en el formato habitual 'aa:bb:cc:dd:ee:ff'.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT mac, role, installed, name FROM flows").fetchall()
+        sessions = {}
+        for mac, role, installed, name in rows:
+            mac = self._mac(mac)
+            _, last, names = sessions.get(mac, (role, 0.0, []))
+            names.append(name)
+            sessions[mac] = (role, max(last, installed), names)
+        return sessions
+
+    def register_shared(self, mac, names):
+        """
+        Registra los flujos de tránsito compartidos (modo compilado) que usa una MAC,
+        sustituyendo los que usaba antes.
+        """
+        key = self._key(mac)
+        with self._lock:
+            self._conn.execute("DELETE FROM shared WHERE mac = ?", (key,))
+            self._conn.executemany("INSERT OR IGNORE INTO shared VALUES (?, ?)", [(n, key) for n in names])
+            self._conn.commit()
+
+    def shared_flows(self):
+        """
+        Retorna mac -> conjunto de nombres de flujos compartidos que usa, con la MAC en el
+        formato habitual 'aa:bb:cc:dd:ee:ff'.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT mac, name FROM shared").fetchall()
+        owners = {}
+        for mac, name in rows:
+            owners.setdefault(self._mac(mac), set()).add(name)
+        return owners
+
+    def forget_shared(self, macs):
+        with self._lock:
+            self._conn.executemany("DELETE FROM shared WHERE mac = ?", [(self._key(m),) for m in macs])
+            self._conn.commit()
+
+    def forget(self, names):
+        """
+        Elimina del registro los flujos indicados por nombre.
+        """
+        with self._lock:
+            self._conn.executemany("DELETE FROM flows WHERE name = ?", [(n,) for n in names])
+            self._conn.commit()
+
+    def forget_mac(self, mac):
+        with self._lock:
+            self._conn.execute("DELETE FROM flows WHERE mac = ?", (self._key(mac),))
+            self._conn.execute("DELETE FROM hosts WHERE mac = ?", (self._key(mac),))
+            self._conn.execute("DELETE FROM shared WHERE mac = ?", (self._key(mac),))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import argparse
+from collections import Counter
+
+from sdn_manager import SdnConnectionManager
+
+# --- CONFIGURACIÓN ---
+# Flujos borrados por lote y pausa entre lotes, para no saturar al controlador
+SWEEP_BATCH = 200
+SWEEP_PAUSE = 0.1
+# Segundos tras un login durante los que su sesión no se considera caducada
+# (sus flujos pueden estar registrados pero aún no instalados)
+GRACE_PERIOD = 60
+
+# Prefijos de los flujos que gestiona este proyecto
+MANAGED_PREFIXES = ("conn-", "qtn-", "svc-")
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def _mac_key(flow_name):
+    """
+    MAC sin ':' y en minúsculas de un flujo 'conn-<mac>-...' (el nombre conserva la MAC
+    tal como llegó en el login).
+    """
+    return flow_name.split('-', 2)[1].lower()
+
+
+def occupancy(flows_by_dpid):
+    """
+    Ocupación de la tabla de flujos estáticos: dpid -> (total, gestionados por el proyecto).
+    """
+    result = {}
+    for dpid, flows_list in flows_by_dpid.items():
+        names = [name for flow_dict in flows_list for name in flow_dict]
+        result[dpid] = (len(names), sum(1 for n in names if n.startswith(MANAGED_PREFIXES)))
+    return result
+
+
+def expired_sessions(sessions, present, policy, device_cache=None, now=None):
+    """
+    Sesiones caducadas. 'sessions' es mac -> (rol, instante del login, nombres) del registro
+    y 'present' el conjunto de nombres que siguen en el Static Flow Pusher.
+    Retorna mac -> motivo:
+      - 'hard_timeout': la sesión superó la duración máxima de su rol.
+      - 'idle_timeout': falta algún flujo de tráfico de la sesión (el switch lo retiró por
+        inactividad, y con él Floodlight lo quitó de su almacén).
+      - 'host_ausente': el controlador ya no ve al host (solo si se pasa 'device_cache', ya
+        actualizada).
+    La inactividad de un host presente no se deduce del 'lastSeen' de Floodlight: con los
+    flujos de la sesión instalados su tráfico no llega al controlador, así que 'lastSeen'
+    deja de avanzar aunque el host siga usando la red. De eso se encarga el idle_timeout
+    de los propios flujos.
+    """
+    now = time.time() if now is None else now
+    expired = {}
+    for mac, (rol, installed, names) in sessions.items():
+        if now - installed < GRACE_PERIOD:
+            continue
+        # Las sesiones adoptadas de flujos huérfanos no tienen rol: timeouts por defecto
+        idle, hard = policy.timeouts(rol or "")
+        if hard and now - installed >= hard:
+            expired[mac] = "hard_timeout"
+        elif idle and any(n not in present and "-arp-" not in n for n in names):
+            expired[mac] = "idle_timeout"
+        elif device_cache is not None and not device_cache.contains(mac):
+            expired[mac] = "host_ausente"
+    return expired
+
+
+class FlowSweeper:
+    """
+    Recolector de flujos de sesión caducados.
+
+    Compara el almacén de flujos estáticos de Floodlight con las sesiones del registro y
+    borra, por lotes de 'batch' flujos, los de las sesiones caducadas (ver expired_sessions).
+    Los 'conn-*' que no pertenecen a ninguna sesión registrada (p. ej. porque el registro
+    se perdió con un reinicio) se adoptan en el registro como sesiones sin rol, que caducan
+    como las demás; solo se borran si 'delete_orphans' es True, es decir, cuando se sabe
+    que el registro está completo. Informa de la ocupación de la tabla de cada switch antes
+    y después de cada pasada.
+    """
+    def __init__(self, manager, batch=SWEEP_BATCH, pause=SWEEP_PAUSE, delete_orphans=False):
+        self.manager = manager
+        self.batch = batch
+        self.pause = pause
+        self.delete_orphans = delete_orphans
+
+    def _delete_in_batches(self, names):
+        deleted = []
+        for i in range(0, len(names), self.batch):
+            results = self.manager.flow_pusher.delete_many(names[i:i + self.batch])
+            deleted += [r.name for r in results if r.ok]
+            if i + self.batch < len(names):
+                time.sleep(self.pause)
+        return deleted
+
+    def sweep(self, dry_run=False):
+        """
+        Ejecuta una pasada. Retorna un diccionario con los contadores, o None si no se pudo
+        obtener la lista de flujos.
+        """
+        start = time.monotonic()
+        before = self.manager._list_flows()
+        if before is None:
+            log("[!] Barrido cancelado: no se pudo obtener la lista de flujos.")
+            return None
+        present = {name: dpid for dpid, flows_list in before.items() for flow_dict in flows_list for name in flow_dict}
+
+        sessions = self.manager.flow_registry.session_flows()
+        self.manager.device_cache.refresh()
+        expired = expired_sessions(sessions, present, self.manager.policy, self.manager.device_cache)
+
+        to_delete = []
+        for mac in expired:
+            to_delete += [n for n in sessions[mac][2] if n in present]
+        registered = {mac.replace(':', '').lower() for mac in sessions}
+        orphans = [n for n in present if n.startswith("conn-") and _mac_key(n) not in registered]
+        if self.delete_orphans:
+            to_delete += orphans
+
+        motivos = Counter(expired.values())
+        log(f"[*] Barrido: {len(sessions)} sesiones, {len(expired)} caducadas "
+            f"({', '.join(f'{m}: {n}' for m, n in motivos.items()) or 'ninguna'}), "
+            f"{len(orphans)} flujos huérfanos ({'a borrar' if self.delete_orphans else 'adoptados al registro'}) "
+            f"-> {len(to_delete)} flujos a borrar.")
+
+        after = before
+        if not dry_run:
+            if not self.delete_orphans:
+                adopted = {}
+                for name in orphans:
+                    adopted.setdefault(_mac_key(name), []).append({"name": name, "switch": present[name]})
+                for mac, flows in adopted.items():
+                    self.manager.flow_registry.register(mac, None, flows)
+            # Flujos de tránsito compartidos (modo compilado) que solo usaban estas sesiones
+            for huerfanos in self.manager._release_shared(list(expired)).values():
+                to_delete += [n for n in huerfanos if n in present]
+            self._delete_in_batches(to_delete)
+            for mac in expired:
+                self.manager.flow_registry.forget_mac(mac)
+            after = self.manager._list_flows() or before
+
+        self.report(occupancy(before), occupancy(after))
+        stats = {
+            "sesiones": len(sessions), "caducadas": len(expired), "motivos": dict(motivos),
+            "huerfanos": len(orphans), "a_borrar": len(to_delete),
+            "segundos": round(time.monotonic() - start, 3),
+        }
+        log(f"[✓] Barrido completado en {stats['segundos']} s.")
+        return stats
+
+    def report(self, before, after):
+        log(f"    {'switch':<24} {'antes':>8} {'después':>8} {'gestionados':>12}")
+        for dpid in sorted(set(before) | set(after)):
+            total_before, managed_before = before.get(dpid, (0, 0))
+            total_after, managed_after = after.get(dpid, (0, 0))
+            log(f"    {dpid:<24} {total_before:>8} {total_after:>8} {managed_before:>5} -> {managed_after:<5}")
+
+    def run_forever(self, interval, dry_run=False):
+        """
+        Barre periódicamente cada 'interval' segundos.
+        """
+        while True:
+            try:
+                self.sweep(dry_run)
+            except Exception as e:
+                log(f"[!] Error en el barrido de flujos: {e}")
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Borra los flujos de sesión caducados del controlador.")
+    parser.add_argument('--intervalo', type=float, help="Barrer periódicamente cada N segundos en lugar de una sola vez.")
+    parser.add_argument('--lote', type=int, default=SWEEP_BATCH, help=f"Flujos borrados por lote (por defecto {SWEEP_BATCH}).")
+    parser.add_argument('--borrar-huerfanos', action='store_true',
+                        help="Borrar los flujos 'conn-*' sin sesión en el registro en lugar de adoptarlos; solo si el registro está completo.")
+    parser.add_argument('--dry-run', action='store_true', help="Solo calcular y mostrar lo que se borraría.")
+    args = parser.parse_args()
+
+    sweeper = FlowSweeper(SdnConnectionManager(), batch=args.lote, delete_orphans=args.borrar_huerfanos)
+    if args.intervalo:
+        try:
+            sweeper.run_forever(args.intervalo, args.dry_run)
+        except KeyboardInterrupt:
+            log("\n[*] Barrido periódico detenido.")
+    else:
+        if sweeper.sweep(args.dry_run) is None:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
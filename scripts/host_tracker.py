@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import argparse
+from collections import Counter
+
+from sdn_manager import SdnConnectionManager
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def _same_point(a, b):
+    return a[0].lower() == b[0].lower() and str(a[1]) == str(b[1])
+
+
+class HostMoveHandler:
+    """
+    Detecta los hosts con sesión activa que han cambiado de punto de conexión (otro AP u
+    otro puerto) y reprograma sus flujos con SdnConnectionManager.actualizar_conexion, que
+    solo envía los de los switches cuyo puerto de salida cambió.
+
+    La API REST de Floodlight no notifica los movimientos de los dispositivos, así que se
+    comparan periódicamente los puntos de conexión del registro de sesiones con una
+    descarga de la tabla de dispositivos.
+    """
+    def __init__(self, manager):
+        self.manager = manager
+
+    def detect(self):
+        """
+        Retorna mac -> (punto de conexión anterior, actual) de los hosts que se han movido,
+        o None si no se pudo descargar la tabla de dispositivos.
+        """
+        if not self.manager.device_cache.refresh():
+            return None
+        moves = {}
+        for mac, anterior in self.manager.flow_registry.attachment_points().items():
+            actual = self.manager.device_cache.peek(mac)
+            # Un host que no aparece no se ha movido: de él se encarga flow_sweeper.py
+            if actual[0] is not None and not _same_point(anterior, actual):
+                moves[mac] = (anterior, actual)
+        return moves
+
+    def handle(self, dry_run=False):
+        """
+        Ejecuta una pasada. Retorna un diccionario con los contadores, o None si no se pudo
+        obtener la tabla de dispositivos.
+        """
+        start = time.monotonic()
+        moves = self.detect()
+        if moves is None:
+            log("[!] Detección de movimientos cancelada: no se pudo obtener la tabla de dispositivos.")
+            return None
+        for mac, ((dpid_antes, puerto_antes), (dpid_ahora, puerto_ahora)) in moves.items():
+            log(f"[*] {mac} se movió de {dpid_antes}/{puerto_antes} a {dpid_ahora}/{puerto_ahora}.")
+
+        totales = Counter()
+        if not dry_run and moves:
+            roles = dict(self.manager.flow_registry.sessions())
+            for mac in moves:
+                stats = self.manager.actualizar_conexion(roles[mac], mac) if roles.get(mac) else None
+                if stats is None:
+                    totales["errores"] += 1
+                    continue
+                totales.update(stats)
+
+        stats = {"movidos": len(moves), **totales, "segundos": round(time.monotonic() - start, 3)}
+        log(f"[✓] Movimientos: {len(moves)} hosts, {totales['enviados']} flujos enviados, "
+            f"{totales['borrados']} borrados, {totales['sin_cambios']} sin cambios ({stats['segundos']} s).")
+        return stats
+
+    def run_forever(self, interval, dry_run=False):
+        """
+        Comprueba los movimientos cada 'interval' segundos.
+        """
+        while True:
+            try:
+                self.handle(dry_run)
+            except Exception as e:
+                log(f"[!] Error al procesar movimientos de hosts: {e}")
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprograma los flujos de los hosts que cambian de punto de conexión.")
+    parser.add_argument('--intervalo', type=float, help="Comprobar periódicamente cada N segundos en lugar de una sola vez.")
+    parser.add_argument('--dry-run', action='store_true', help="Solo detectar y mostrar los movimientos.")
+    args = parser.parse_args()
+
+    handler = HostMoveHandler(SdnConnectionManager())
+    if args.intervalo:
+        try:
+            handler.run_forever(args.intervalo, args.dry_run)
+        except KeyboardInterrupt:
+            log("\n[*] Seguimiento de movimientos detenido.")
+    else:
+        if handler.handle(args.dry_run) is None:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
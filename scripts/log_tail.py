@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Utilidades comunes de los procesos que siguen un fichero de registro a medida que crece:
+# las alertas de Snort (snort_monitor.py) y el fichero 'detail' de accounting de FreeRADIUS
+# (accounting.py).
+
+import os
+import glob
+
+# --- CONFIGURACIÓN ---
+# Bytes leídos como máximo en cada lectura del fichero
+READ_CHUNK = 4 * 1024 * 1024
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class FileTail:
+    """
+    Lectura incremental de un fichero que sigue creciendo, como 'tail -F'.
+    Si el fichero se rota (cambia el inodo, se trunca o aparece uno más nuevo con el mismo
+    prefijo, como hace Snort con snort.u2.<timestamp>), se continúa desde el principio del nuevo.
+
+    Las subclases implementan _parse(data), que retorna (bytes consumidos, lista de registros,
+    diccionario de datos aprendidos); los bytes sin consumir (un registro a medias) se
+    conservan para la siguiente lectura.
+    """
+    def __init__(self, path, from_start=False):
+        self.path = path
+        self._file = None
+        self._current = None
+        self._open(from_start)
+
+    def _newest(self):
+        if os.path.isfile(self.path):
+            return self.path
+        candidates = glob.glob(self.path + ".*")
+        return max(candidates, key=os.path.getmtime) if candidates else None
+
+    def _open(self, from_start):
+        current = self._newest()
+        if current is None:
+            return
+        if self._file is not None:
+            self._file.close()
+        self._file = open(current, "rb")
+        self._current = current
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._pending = b""
+        if not from_start:
+            self._file.seek(0, os.SEEK_END)
+
+    def _rotated(self):
+        try:
+            st = os.stat(self._current)
+        except FileNotFoundError:
+            return True
+        return (st.st_ino != self._inode or st.st_size < self._file.tell()
+                or self._newest() != self._current)
+
+    def read(self):
+        """
+        Retorna (lista de registros, diccionario de datos aprendidos) de lo escrito desde la
+        última lectura.
+        """
+        if self._file is None:
+            self._open(from_start=True)
+            if self._file is None:
+                return [], {}
+        data = self._file.read(READ_CHUNK)
+        if not data:
+            if self._rotated():
+                self._open(from_start=True)
+            return [], {}
+        data = self._pending + data
+        consumed = self._parse(data)
+        self._pending = data[consumed[0]:]
+        return consumed[1], consumed[2]
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURACIÓN ---
+# Fichero JSON lines donde se añade cada tramo medido (vacío = no se escribe)
+METRICS_FILE = os.environ.get("SDN_METRICS_FILE", "")
+# Límites de los buckets del histograma de latencias, en segundos
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Span:
+    """
+    Tramo medido. El código instrumentado puede añadir atributos con set(), por ejemplo
+    el código HTTP de la respuesta del controlador ('status') y su tamaño ('bytes').
+    """
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def set_response(self, response):
+        """
+        Anota el código HTTP y el tamaño del cuerpo de una respuesta de requests.
+        """
+        self.attrs["status"] = response.status_code
+        self.attrs["bytes"] = len(response.content or b"")
+
+
+class Metrics:
+    """
+    Histogramas de latencia por tramo y contadores de respuestas del controlador.
+    Cada tramo se exporta además como una línea JSON si hay un fichero configurado.
+    """
+    def __init__(self, path=METRICS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # nombre -> [contadores por bucket..., +Inf], suma, total
+        self._histograms = {}
+        # (nombre, status) -> número de respuestas
+        self._responses = {}
+        # nombre -> bytes recibidos/enviados
+        self._bytes = {}
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = Span(name, attrs)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            self.record(span, time.perf_counter() - start)
+
+    def record(self, span, duration):
+        with self._lock:
+            histogram = self._histograms.setdefault(span.name, [[0] * (len(BUCKETS) + 1), 0.0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    histogram[0][i] += 1
+            histogram[0][-1] += 1
+            histogram[1] += duration
+            histogram[2] += 1
+            if "status" in span.attrs:
+                key = (span.name, str(span.attrs["status"]))
+                self._responses[key] = self._responses.get(key, 0) + 1
+            if "bytes" in span.attrs:
+                self._bytes[span.name] = self._bytes.get(span.name, 0) + span.attrs["bytes"]
+            if self.path:
+                line = {"ts": round(time.time(), 6), "span": span.name,
+                        "duration_ms": round(duration * 1000, 3), **span.attrs}
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(line, default=str) + "\n")
+
+    def render_prometheus(self):
+        """
+        Texto en formato de exposición de Prometheus.
+        """
+        lines = ["# HELP sdn_span_duration_seconds Duración de cada fase medida.",
+                 "# TYPE sdn_span_duration_seconds histogram"]
+        with self._lock:
+            for name, (buckets, total, count) in sorted(self._histograms.items()):
+                for bound, value in zip(BUCKETS, buckets):
+                    lines.append(f'sdn_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {value}')
+                lines.append(f'sdn_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {buckets[-1]}')
+                lines.append(f'sdn_span_duration_seconds_sum{{span="{name}"}} {total:.6f}')
+                lines.append(f'sdn_span_duration_seconds_count{{span="{name}"}} {count}')
+            lines += ["# HELP sdn_controller_responses_total Respuestas del controlador por código HTTP.",
+                      "# TYPE sdn_controller_responses_total counter"]
+            for (name, status), value in sorted(self._responses.items()):
+                lines.append(f'sdn_controller_responses_total{{span="{name}",status="{status}"}} {value}')
+            lines += ["# HELP sdn_controller_payload_bytes_total Bytes de cuerpo intercambiados con el controlador.",
+                      "# TYPE sdn_controller_payload_bytes_total counter"]
+            for name, value in sorted(self._bytes.items()):
+                lines.append(f'sdn_controller_payload_bytes_total{{span="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# Registro compartido por todos los módulos del proceso
+METRICS = Metrics()
+
+
+def span(name, **attrs):
+    """
+    Atajo para METRICS.span().
+    """
+    return METRICS.span(name, **attrs)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = METRICS.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """
+    Sirve /metrics en segundo plano para que Prometheus lo consulte.
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import namedtuple
+
+# --- CONFIGURACIÓN ---
+# Base SQLite con la política de acceso (se puede cambiar con la variable de entorno SDN_POLICY_DB).
+# Hace las veces de la base MySQL de usuarios y políticas descrita en el README.
+POLICY_PATH = os.environ.get("SDN_POLICY_DB", "/tmp/sdn_policy.db")
+# Segundos entre dos comprobaciones de si la base ha cambiado
+CHECK_INTERVAL = 1.0
+# Timeouts (segundos) de los flujos de sesión de los roles sin fila en la tabla 'roles'.
+# idle: sin tráfico durante ese tiempo; hard: duración máxima de la sesión. 0 = permanente.
+DEFAULT_IDLE_TIMEOUT = int(os.environ.get("SDN_IDLE_TIMEOUT", 1800))
+DEFAULT_HARD_TIMEOUT = int(os.environ.get("SDN_HARD_TIMEOUT", 43200))
+
+PROTOCOLS = ("tcp", "udp")
+
+# Un servicio permitido a un rol: servidor (nombre, MAC, IP), protocolo y puerto
+ServiceRule = namedtuple("ServiceRule", ["servicio", "mac", "ip", "protocolo", "puerto"])
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS servicios (
+        nombre TEXT PRIMARY KEY,
+        mac TEXT NOT NULL,
+        ip TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS politicas (
+        rol TEXT NOT NULL,
+        servicio TEXT NOT NULL REFERENCES servicios (nombre),
+        protocolo TEXT NOT NULL DEFAULT 'tcp',
+        puertos TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS politicas_rol ON politicas (rol);
+    CREATE TABLE IF NOT EXISTS roles (
+        rol TEXT PRIMARY KEY,
+        idle_timeout INTEGER,
+        hard_timeout INTEGER
+    );
+"""
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def normalize_role(rol):
+    """
+    Clave de un rol: admite tanto 'estudiante' como el 'ROLE=estudiante' que envía freeRADIUS.
+    """
+    rol = rol.strip()
+    if rol.upper().startswith("ROLE="):
+        rol = rol[len("ROLE="):]
+    return rol.lower()
+
+
+def parse_ports(puertos):
+    """
+    Convierte '8081', '8081,8443' o '9000-9002' en una lista de puertos.
+    """
+    ports = []
+    for parte in str(puertos).replace(' ', '').split(','):
+        if not parte:
+            continue
+        if '-' in parte:
+            inicio, fin = parte.split('-', 1)
+            ports += range(int(inicio), int(fin) + 1)
+        else:
+            ports.append(int(parte))
+    return ports
+
+
+def compile_rows(rows):
+    """
+    Compila filas (rol, servicio, mac, ip, protocolo, puertos) en un diccionario
+    rol -> tupla de ServiceRule, sin duplicados y en el orden de la tabla.
+    """
+    compiled = {}
+    for rol, servicio, mac, ip, protocolo, puertos in rows:
+        protocolo = protocolo.lower()
+        if protocolo not in PROTOCOLS:
+            log(f"  [!] Política ignorada: protocolo '{protocolo}' no soportado ({rol} -> {servicio}).")
+            continue
+        rules = compiled.setdefault(normalize_role(rol), [])
+        for port in parse_ports(puertos):
+            rule = ServiceRule(servicio, mac.lower(), ip, protocolo, port)
+            if rule not in rules:
+                rules.append(rule)
+    return {rol: tuple(rules) for rol, rules in compiled.items()}
+
+
+class PolicyTable:
+    """
+    Política de acceso rol -> servicios compilada en memoria.
+
+    Se carga de la base SQLite y se vuelve a compilar cuando la base cambia (se comprueba
+    como mucho una vez cada 'check_interval' segundos mirando el fichero, sin consultarla),
+    de modo que un login nunca espera a la base de datos. Si la base no existe se usa la
+    política 'default'.
+    """
+    def __init__(self, path=POLICY_PATH, default=None, check_interval=CHECK_INTERVAL, logger=log):
+        self.path = path
+        self.default = default or {}
+        self.check_interval = check_interval
+        self.log = logger
+        self._rules = {normalize_role(r): tuple(v) for r, v in self.default.items()}
+        # rol -> (idle_timeout, hard_timeout)
+        self._timeouts = {}
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _file_signature(self):
+        """
+        Fecha y tamaño de la base y de su WAL: cambian con cada escritura confirmada.
+        """
+        signature = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def reload(self):
+        """
+        Vuelve a compilar la política desde la base. Retorna True si se cargó de la base.
+        """
+        with self._lock:
+            signature = self._file_signature()
+            self._last_check = time.monotonic()
+            if signature == self._signature:
+                return True
+            if signature[0] is None:
+                self._rules = {normalize_role(r): tuple(v) for r, v in self.default.items()}
+                self._timeouts = {}
+                self._signature = signature
+                return False
+            try:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5)
+                try:
+                    rows = conn.execute("""
+                        SELECT p.rol, s.nombre, s.mac, s.ip, p.protocolo, p.puertos
+                        FROM politicas p JOIN servicios s ON s.nombre = p.servicio
+                        ORDER BY p.rowid
+                    """).fetchall()
+                    try:
+                        timeout_rows = conn.execute("SELECT rol, idle_timeout, hard_timeout FROM roles").fetchall()
+                    except sqlite3.OperationalError:
+                        # Base creada antes de que existiera la tabla de roles
+                        timeout_rows = []
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                # Se mantiene la última política válida
+                self.log(f"  [!] Error al leer la política de acceso de {self.path}: {e}")
+                return False
+            try:
+                rules = compile_rows(rows)
+                timeouts = {
+                    normalize_role(rol): (DEFAULT_IDLE_TIMEOUT if idle is None else int(idle),
+                                          DEFAULT_HARD_TIMEOUT if hard is None else int(hard))
+                    for rol, idle, hard in timeout_rows
+                }
+            except (ValueError, TypeError, AttributeError) as e:
+                # Valores mal formados (puertos, timeouts...): se mantiene la última política
+                # válida y no se vuelve a compilar hasta que la base cambie otra vez
+                self.log(f"  [!] Política de acceso de {self.path} mal formada, se mantiene la anterior: {e}")
+                self._signature = signature
+                return False
+            # Sustitución atómica: las búsquedas en curso ven la política anterior o la nueva
+            self._rules, self._timeouts = rules, timeouts
+            self._signature = signature
+            self.log(f"  [*] Política de acceso cargada: {len(self._rules)} roles, "
+                     f"{sum(len(r) for r in self._rules.values())} reglas.")
+            return True
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self.reload()
+
+    def rules(self, rol):
+        """
+        Retorna la tupla de ServiceRule de un rol (vacía si el rol no existe).
+        """
+        self._maybe_reload()
+        return self._rules.get(normalize_role(rol), ())
+
+    def timeouts(self, rol):
+        """
+        Retorna (idle_timeout, hard_timeout) en segundos para los flujos de sesión de un rol.
+        """
+        self._maybe_reload()
+        return self._timeouts.get(normalize_role(rol), (DEFAULT_IDLE_TIMEOUT, DEFAULT_HARD_TIMEOUT))
+
+    def roles(self):
+        self._maybe_reload()
+        return sorted(self._rules)
+
+    def hosts(self):
+        """
+        Retorna la lista de servidores (mac, ip) que aparecen en alguna regla.
+        """
+        self._maybe_reload()
+        seen = []
+        for rules in self._rules.values():
+            for rule in rules:
+                if (rule.mac, rule.ip) not in seen:
+                    seen.append((rule.mac, rule.ip))
+        return seen
+
+
+def group_by_host(rules):
+    """
+    Agrupa las reglas por servidor: lista de ((mac, ip), [(protocolo, puerto), ...]).
+    """
+    grupos = {}
+    for rule in rules:
+        grupos.setdefault((rule.mac, rule.ip), []).append((rule.protocolo, rule.puerto))
+    return list(grupos.items())
+
+
+def create_database(path, default):
+    """
+    Crea la base con el esquema y la rellena con la política 'default' si está vacía.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        if conn.execute("SELECT COUNT(*) FROM politicas").fetchone()[0] == 0:
+            with conn:
+                for rol, rules in default.items():
+                    conn.execute("INSERT OR IGNORE INTO roles VALUES (?, ?, ?)",
+                                 (normalize_role(rol), DEFAULT_IDLE_TIMEOUT, DEFAULT_HARD_TIMEOUT))
+                    for rule in rules:
+                        conn.execute("INSERT OR IGNORE INTO servicios VALUES (?, ?, ?)", (rule.servicio, rule.mac, rule.ip))
+                        conn.execute("INSERT INTO politicas VALUES (?, ?, ?, ?)",
+                                     (normalize_role(rol), rule.servicio, rule.protocolo, str(rule.puerto)))
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestión de la base de políticas de acceso por rol.")
+    parser.add_argument('accion', choices=['crear', 'mostrar'],
+                        help="'crear': crea la base con la política por defecto; 'mostrar': muestra la política compilada.")
+    parser.add_argument('--db', default=POLICY_PATH, help=f"Fichero SQLite (por defecto {POLICY_PATH}).")
+    args = parser.parse_args()
+
+    from sdn_manager import DEFAULT_POLICY
+    if args.accion == 'crear':
+        create_database(args.db, DEFAULT_POLICY)
+        print(f"[+] Base de políticas creada en {args.db}")
+        return
+
+    table = PolicyTable(args.db, DEFAULT_POLICY)
+    for rol in table.roles():
+        idle, hard = table.timeouts(rol)
+        print(f"{rol}: idle_timeout {idle} s, hard_timeout {hard} s")
+        for rule in table.rules(rol):
+            print(f"{rol:<16} {rule.servicio:<16} {rule.mac:<18} {rule.ip:<16} {rule.protocolo}/{rule.puerto}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+from sdn_manager import SdnConnectionManager, FLOW_MODE
+from flow_compiler import MODE_PER_USER, MODE_COMPILED
+from default_flows import HOSTS_A_BLOQUEAR, build_quarantine_flows, load_hosts
+# MANAGED_PREFIXES: prefijos de los flujos que gestiona este proyecto; el resto no se toca nunca
+from flow_sweeper import MANAGED_PREFIXES, expired_sessions
+# Forma canónica de un flujo, compartida con el índice de solapamientos
+from flow_index import canonical_flow
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def flow_digest(flow, dpid=None):
+    """
+    Huella SHA-1 de la forma canónica de un flujo.
+    """
+    canonical = json.dumps(canonical_flow(flow, dpid), sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def diff_flows(desired, actual, protected_prefixes=(), keep=()):
+    """
+    Compara el estado deseado con el real.
+    'desired' es nombre -> flujo (formato de envío); 'actual' es nombre -> (dpid, flujo listado).
+    Retorna (a_instalar, a_modificar, a_borrar); los dos primeros son listas de flujos y el
+    último una lista de nombres. Nunca se borran flujos con un prefijo de 'protected_prefixes'
+    (en minúsculas; los nombres conservan la MAC tal como llegó en el login) ni los
+    nombrados en 'keep'.
+    """
+    to_install, to_modify, to_delete = [], [], []
+    for name, flow in desired.items():
+        if name not in actual:
+            to_install.append(flow)
+        else:
+            dpid, listed = actual[name]
+            if flow_digest(flow) != flow_digest(listed, dpid):
+                to_modify.append(flow)
+    for name in actual:
+        if name not in desired and name not in keep and not name.lower().startswith(tuple(protected_prefixes)):
+            to_delete.append(name)
+    return to_install, to_modify, to_delete
+
+
+class Reconciler:
+    """
+    Lleva la red al estado deseado enviando solo las diferencias.
+
+    El estado deseado son los flujos de todas las sesiones activas (las del registro de
+    flujos) más los de cuarentena de los hosts indicados. El estado real es la lista del
+    Static Flow Pusher. Se instalan los flujos que faltan, se reenvían los que difieren
+    y se borran los gestionados por el proyecto que ya no corresponden a nada.
+
+    Si se indica 'hosts_path' (fichero o base SQLite de cuarentena), se vuelve a leer en
+    cada pasada, de modo que se conservan las cuarentenas añadidas mientras tanto.
+
+    Los flujos se calculan en el modo del gestor ('por_usuario' o 'compilado'). En modo
+    compilado, las referencias de los flujos de tránsito compartidos 'svc-*' se ajustan a
+    las sesiones de cada pasada, para que los logouts posteriores los borren cuando toca.
+    """
+    def __init__(self, manager, quarantine_hosts, hosts_path=None):
+        self.manager = manager
+        self.quarantine_hosts = quarantine_hosts
+        self.hosts_path = hosts_path
+
+    def _quarantine_hosts(self):
+        hosts = dict(self.quarantine_hosts)
+        if self.hosts_path and os.path.exists(self.hosts_path):
+            hosts.update(load_hosts(self.hosts_path))
+        return hosts
+
+    def desired_state(self, present=None):
+        """
+        Retorna (nombre -> flujo deseado, prefijos protegidos, sesiones caducadas, sesiones),
+        donde 'sesiones' es MAC -> (rol, instante del login, flujos propios, flujos de tránsito
+        compartidos) de cada sesión calculada. Una sesión cuyos flujos no se pueden calcular
+        (host desconectado, sin ruta, sin rol) conserva los que ya tenga instalados y aparece con
+        None en lugar de sus flujos. Si se pasa 'present' (nombres instalados), las sesiones
+        caducadas según flow_sweeper.expired_sessions no forman parte del estado deseado:
+        sus flujos se borran en lugar de reinstalarse.
+        """
+        desired = {}
+        protected = []
+        computed = {}
+        sessions = self.manager.flow_registry.session_flows()
+        expired = expired_sessions(sessions, present, self.manager.policy) if present is not None else {}
+        for mac, (rol, installed, _) in sessions.items():
+            if mac in expired:
+                continue
+            # Sin rol (sesión adoptada por flow_sweeper) no se sabe qué flujos le corresponden
+            propios, compartidos = self.manager.generar_flujos(rol, mac) if rol else (None, [])
+            computed[mac] = (rol, installed, propios, compartidos)
+            if propios is None:
+                protected.append(f"conn-{mac.replace(':', '')}-")
+                continue
+            for flow in propios + compartidos:
+                desired[flow["name"]] = flow
+
+        quarantine_hosts = self._quarantine_hosts()
+        attachment_points = self.manager.device_cache.lookup_many(list(quarantine_hosts))
+        for mac in quarantine_hosts:
+            if mac in attachment_points:
+                dpid, port = attachment_points[mac]
+                for flow in build_quarantine_flows(mac, dpid, port):
+                    desired[flow["name"]] = flow
+            else:
+                protected.append(f"qtn-{mac.replace(':', '')}-")
+        return desired, protected, expired, computed
+
+    def actual_state(self):
+        """
+        Retorna nombre -> (dpid, flujo listado) de los flujos gestionados, o None si falla el listado.
+        """
+        flows_by_dpid = self.manager._list_flows()
+        if flows_by_dpid is None:
+            return None
+        actual = {}
+        for dpid, flows_list in flows_by_dpid.items():
+            for flow_dict in flows_list:
+                for name, flow in flow_dict.items():
+                    if name.startswith(MANAGED_PREFIXES):
+                        actual[name] = (dpid, flow)
+        return actual
+
+    def reconcile(self, dry_run=False):
+        """
+        Ejecuta una pasada de reconciliación. Retorna un diccionario con los contadores.
+        """
+        start = time.monotonic()
+        actual = self.actual_state()
+        if actual is None:
+            log("[!] Reconciliación cancelada: no se pudo obtener el estado real.")
+            return None
+        desired, protected, expired, computed = self.desired_state(set(actual))
+        # Compartidos de las sesiones que no se pudieron calcular: se conservan
+        references = self.manager.flow_registry.shared_flows()
+        keep = {name for mac, (_, _, flows, _) in computed.items() if flows is None for name in references.get(mac, ())}
+
+        to_install, to_modify, to_delete = diff_flows(desired, actual, protected, keep)
+        log(f"[*] Reconciliación: {len(desired)} flujos deseados, {len(actual)} instalados -> "
+            f"{len(to_install)} a instalar, {len(to_modify)} a modificar, {len(to_delete)} a borrar.")
+
+        if not dry_run:
+            pusher = self.manager.flow_pusher
+            registry = self.manager.flow_registry
+            pushed = {r.name for r in pusher.install_many(to_install + to_modify) if r.ok}
+            deleted = [r.name for r in pusher.delete_many(to_delete) if r.ok]
+            registry.forget([n for n in deleted if n.startswith("conn-")])
+            for mac in expired:
+                registry.forget_mac(mac)
+            for mac, (rol, installed, propios, compartidos) in computed.items():
+                if propios is None:
+                    continue
+                # Los flujos instalados de la sesión (p. ej. los de los switches de una ruta
+                # nueva) quedan en el registro, con el instante del login original
+                attachment_point = self.manager.device_cache.peek(mac)
+                registry.register(mac, rol, [f for f in propios if f["name"].startswith("conn-")
+                                             and (f["name"] in pushed or f["name"] in actual)],
+                                  attachment_point=attachment_point if attachment_point[0] else None,
+                                  installed=installed)
+                if compartidos or mac in references:
+                    self.manager._acquire_shared(mac, compartidos)
+            self.manager._release_shared([mac for mac in references if mac not in computed])
+
+        stats = {
+            "deseados": len(desired), "instalados": len(actual),
+            "a_instalar": len(to_install), "a_modificar": len(to_modify), "a_borrar": len(to_delete),
+            "caducadas": len(expired),
+            "segundos": round(time.monotonic() - start, 3),
+        }
+        log(f"[✓] Reconciliación completada en {stats['segundos']} s.")
+        return stats
+
+    def run_forever(self, interval, dry_run=False):
+        """
+        Reconcilia periódicamente cada 'interval' segundos.
+        """
+        while True:
+            try:
+                self.reconcile(dry_run)
+            except Exception as e:
+                log(f"[!] Error en la reconciliación: {e}")
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcilia los flujos del controlador con el estado deseado (sesiones activas y cuarentenas).")
+    parser.add_argument('--hosts', help="Fichero de texto o base SQLite con los hosts en cuarentena (por defecto HOSTS_A_BLOQUEAR).")
+    parser.add_argument('--intervalo', type=float, help="Reconciliar periódicamente cada N segundos en lugar de una sola vez.")
+    parser.add_argument('--modo-flujos', choices=[MODE_PER_USER, MODE_COMPILED], default=FLOW_MODE,
+                        help=f"Modo de generación de flujos; el mismo que usa el demonio (por defecto {FLOW_MODE}).")
+    parser.add_argument('--dry-run', action='store_true', help="Solo calcular y mostrar las diferencias.")
+    args = parser.parse_args()
+
+    manager = SdnConnectionManager(modo_flujos=args.modo_flujos)
+    if args.hosts:
+        reconciler = Reconciler(manager, {}, hosts_path=args.hosts)
+    else:
+        reconciler = Reconciler(manager, HOSTS_A_BLOQUEAR)
+    if args.intervalo:
+        try:
+            reconciler.run_forever(args.intervalo, args.dry_run)
+        except KeyboardInterrupt:
+            log("\n[*] Reconciliación periódica detenida.")
+    else:
+        if reconciler.reconcile(args.dry_run) is None:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
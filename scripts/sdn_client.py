@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Cliente mínimo del demonio sdn_daemon.py. Solo usa la biblioteca estándar para que
+# los scripts que ejecuta freeRADIUS arranquen rápido: nada de 'requests' aquí.
+
+import os
+import socket
+
+# --- CONFIGURACIÓN ---
+# Socket Unix donde escucha el demonio (se puede cambiar con la variable de entorno SDN_MANAGER_SOCKET)
+SOCKET_PATH = os.environ.get("SDN_MANAGER_SOCKET", "/tmp/sdn_manager.sock")
+# Tiempo máximo de espera de la respuesta del demonio
+CLIENT_TIMEOUT = 30
+
+
+class DaemonNoDisponible(Exception):
+    """
+    El demonio no está escuchando en el socket; el llamador puede hacer el trabajo en proceso.
+    """
+
+
+def enviar_comando(comando, socket_path=SOCKET_PATH, timeout=CLIENT_TIMEOUT):
+    """
+    Envía una línea de comando al demonio y retorna su respuesta (sin salto de línea).
+    Lanza DaemonNoDisponible si no se puede conectar con el socket.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonNoDisponible(str(e))
+        sock.sendall(comando.encode() + b"\n")
+        respuesta = b""
+        while not respuesta.endswith(b"\n"):
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            respuesta += chunk
+        return respuesta.decode().strip()
+    finally:
+        sock.close()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import signal
+import argparse
+import threading
+import socketserver
+
+from sdn_client import SOCKET_PATH
+from sdn_manager import SdnConnectionManager, FLOW_MODE, FLOW_CHECK, SNAPSHOT_PATH, log
+from flow_compiler import MODE_PER_USER, MODE_COMPILED
+from flow_index import CHECK_WARN, CHECK_REJECT
+from reconciler import Reconciler
+from flow_sweeper import FlowSweeper
+from host_tracker import HostMoveHandler
+from accounting import start_consumer
+from metrics import start_http_server
+from default_flows import HOSTS_A_BLOQUEAR
+
+# Protocolo (una línea por petición, una línea por respuesta):
+#   <rol> <mac>    -> crea la conexión, p. ej. "ROLE=estudiante fa:16:3e:f5:25:93"
+#   borrar <mac>   -> borra los flujos 'conn-<mac>-' de la MAC
+#   ping           -> comprobación de vida
+# Respuestas: "OK [detalle]" o "ERROR <motivo>".
+
+# Segundos entre dos escrituras de la instantánea del estado (solo si hay algo nuevo)
+SNAPSHOT_INTERVAL = 60
+
+
+class ManagerRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Atiende una petición de procesar_datos.py o borrar_conexion.py.
+    """
+    def handle(self):
+        linea = self.rfile.readline().decode(errors='replace').strip()
+        try:
+            respuesta = self.server.despachar(linea)
+        except Exception as e:
+            log(f"[!] Error inesperado atendiendo '{linea}': {e}")
+            respuesta = f"ERROR {e}"
+        self.wfile.write(respuesta.encode() + b"\n")
+
+
+class SdnDaemon(socketserver.ThreadingUnixStreamServer):
+    """
+    Servidor residente que envuelve un único SdnConnectionManager, de modo que su caché
+    de dispositivos y sus conexiones HTTP con Floodlight se mantienen entre logins.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path=SOCKET_PATH, manager=None):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, ManagerRequestHandler)
+        # freeRADIUS suele ejecutarse con otro usuario del mismo grupo
+        os.chmod(socket_path, 0o660)
+        self.socket_path = socket_path
+        self.manager = manager or SdnConnectionManager()
+
+    def despachar(self, linea):
+        """
+        Interpreta una línea del protocolo y ejecuta la operación correspondiente.
+        """
+        partes = linea.split()
+        if partes == ["ping"]:
+            return "OK pong"
+        if len(partes) == 2 and partes[0] == "borrar":
+            borrados = self.manager.borrar_conexion(partes[1])
+            if borrados is None:
+                return "ERROR no se pudo obtener la lista de flujos"
+            return f"OK {borrados}"
+        if len(partes) == 2:
+            rol, mac = partes
+            if self.manager.crear_conexion(rol, mac):
+                return "OK"
+            return "ERROR no se pudo crear la conexión"
+        return f"ERROR comando no reconocido: '{linea}'"
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Demonio residente del gestor de conexiones SDN.")
+    parser.add_argument('--socket', default=SOCKET_PATH, help=f"Ruta del socket Unix (por defecto {SOCKET_PATH}).")
+    parser.add_argument('--modo-flujos', choices=[MODE_PER_USER, MODE_COMPILED], default=FLOW_MODE,
+                        help=f"Modo de generación de flujos (por defecto {FLOW_MODE}).")
+    parser.add_argument('--comprobar-flujos', choices=[CHECK_WARN, CHECK_REJECT], default=FLOW_CHECK or None,
+                        help="Comprobar antes de cada login si sus flujos se solapan con los instalados, y solo avisar o rechazar el login.")
+    parser.add_argument('--reconciliar', type=float, metavar='SEGUNDOS',
+                        help="Reconciliar en segundo plano los flujos con el estado deseado cada N segundos.")
+    parser.add_argument('--hosts', help="Fichero de texto o base SQLite de cuarentena que el reconciliador relee en cada pasada (además de HOSTS_A_BLOQUEAR).")
+    parser.add_argument('--barrer', type=float, metavar='SEGUNDOS',
+                        help="Borrar en segundo plano los flujos de sesión caducados cada N segundos.")
+    parser.add_argument('--borrar-huerfanos', action='store_true',
+                        help="Con --barrer, borrar los flujos 'conn-*' sin sesión en el registro en lugar de adoptarlos.")
+    parser.add_argument('--movilidad', type=float, metavar='SEGUNDOS',
+                        help="Comprobar cada N segundos si algún host cambió de punto de conexión y reprogramar sus flujos.")
+    parser.add_argument('--accounting', type=int, metavar='PUERTO',
+                        help="Recibir RADIUS Accounting por UDP en este puerto y cerrar las sesiones con cada Accounting-Stop.")
+    parser.add_argument('--accounting-detalle', metavar='FICHERO',
+                        help="Seguir el fichero 'detail' de accounting de FreeRADIUS y cerrar las sesiones con cada Accounting-Stop.")
+    parser.add_argument('--instantanea', default=SNAPSHOT_PATH, metavar='FICHERO',
+                        help=f"Instantánea del estado para arrancar en caliente (por defecto {SNAPSHOT_PATH or 'ninguna'}; '' la desactiva).")
+    parser.add_argument('--metrics-port', type=int, help="Servir las métricas en formato Prometheus en http://0.0.0.0:<puerto>/metrics.")
+    args = parser.parse_args()
+
+    server = SdnDaemon(args.socket, SdnConnectionManager(modo_flujos=args.modo_flujos, comprobar_flujos=args.comprobar_flujos,
+                                                         instantanea=args.instantanea))
+    # systemd detiene el servicio con SIGTERM: salir por el bloque finally para borrar el socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+        log(f"[*] Métricas disponibles en http://0.0.0.0:{args.metrics_port}/metrics")
+    # Con una instantánea válida, precalentar se resuelve casi entero en memoria
+    server.manager.cargar_estado()
+    server.manager.precalentar()
+    if args.instantanea:
+        server.manager.guardar_estado()
+        threading.Thread(target=server.manager.guardar_estado_periodicamente, args=(SNAPSHOT_INTERVAL,), daemon=True).start()
+    if args.reconciliar:
+        reconciler = Reconciler(server.manager, HOSTS_A_BLOQUEAR, hosts_path=args.hosts)
+        threading.Thread(target=reconciler.run_forever, args=(args.reconciliar,), daemon=True).start()
+    if args.barrer:
+        sweeper = FlowSweeper(server.manager, delete_orphans=args.borrar_huerfanos)
+        threading.Thread(target=sweeper.run_forever, args=(args.barrer,), daemon=True).start()
+    if args.movilidad:
+        handler = HostMoveHandler(server.manager)
+        threading.Thread(target=handler.run_forever, args=(args.movilidad,), daemon=True).start()
+    if args.accounting or args.accounting_detalle:
+        start_consumer(server.manager, args.accounting, args.accounting_detalle, report_interval=60)
+    log(f"[*] Demonio SDN escuchando en {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log("\n[*] Deteniendo el demonio SDN...")
+    finally:
+        server.manager.guardar_estado()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import requests
+
+from device_cache import DeviceCache
+from flow_pusher import FlowPusher, summarize
+from topology import TopologyGraph
+from flow_registry import FlowRegistry
+from metrics import span
+from controllers import ROUTE_PATH, LIST_FLOWS_PATH, default_cluster
+from policy import PolicyTable, ServiceRule, group_by_host
+from flow_compiler import (MODE_PER_USER, MODE_COMPILED, build_user_flows, compile_user_flows, with_timeouts,
+                           SharedFlowTable)
+from flow_index import FlowChecker, INDEX_MAX_AGE
+from state_snapshot import StateSnapshot, controller_epoch, same_run, write_snapshot
+
+# --- CONFIGURACIÓN GLOBAL ---
+FLOODLIGHT_IP = os.environ.get("FLOODLIGHT_IP", "10.20.12.13") # IP del controlador Floodlight, 127.0.0.1 en local, 192.168.200.200 en red sdn
+FLOODLIGHT_PORT = int(os.environ.get("FLOODLIGHT_PORT", 8080))
+REQUEST_TIMEOUT = 10
+
+# --- CONFIGURACIÓN DE LA POLÍTICA DE ACCESO ---
+# Servidor de destino (H3)
+H3_MAC = "fa:16:3e:30:99:e6"
+H3_IP = "10.0.0.3"
+
+# Mapeo de roles a los puertos de los servicios web en H3
+ROLE_TO_PORT_MAP = {
+    "ROLE=estudiante": 8081,
+    "ROLE=profesor": 8082,
+    "ROLE=admin": 8083
+}
+
+# Política usada mientras no exista la base de políticas (SDN_POLICY_DB, ver policy.py):
+# cada rol accede a su puerto TCP en H3
+DEFAULT_POLICY = {rol: [ServiceRule("h3", H3_MAC, H3_IP, "tcp", puerto)] for rol, puerto in ROLE_TO_PORT_MAP.items()}
+
+# Modo de generación de flujos: "por_usuario" (4 flujos por salto) o "compilado"
+# (reglas por MAC solo en el switch de borde y reglas de tránsito compartidas por servicio)
+FLOW_MODE = MODE_PER_USER
+
+# Comprobación de solapamientos de los flujos de cada login con los ya instalados (ver flow_index.py):
+# "" (desactivada), "avisar" o "rechazar". Se puede cambiar con la variable de entorno SDN_FLOW_CHECK.
+FLOW_CHECK = os.environ.get("SDN_FLOW_CHECK", "")
+
+# Instantánea del estado (dispositivos, enlaces y flujos del índice de solapamientos) para
+# arrancar en caliente (ver state_snapshot.py). "" la desactiva.
+SNAPSHOT_PATH = os.environ.get("SDN_SNAPSHOT", "/tmp/sdn_state.snap")
+# Antigüedad máxima (segundos) de una instantánea para dar por buenos sus dispositivos y enlaces
+# sin volver a consultarlos, si el controlador no ha cambiado desde que se guardó
+SNAPSHOT_MAX_AGE = 120
+# Segundos durante los que se reutiliza el estado del controlador consultado al cargar
+EPOCH_REUSE = 10
+
+# Con varias instancias de Floodlight se definen todas en FLOODLIGHT_CONTROLLERS (ver controllers.py)
+# y FLOODLIGHT_IP/FLOODLIGHT_PORT no se usan.
+
+# --- URLs de la API de Floodlight ---
+BASE_URL = f"http://{FLOODLIGHT_IP}:{FLOODLIGHT_PORT}"
+DEVICE_API_URL = f"{BASE_URL}/wm/device/"
+ROUTE_API_URL = f"{BASE_URL}/wm/topology/route"
+LINKS_API_URL = f"{BASE_URL}/wm/topology/links/json"
+STATIC_FLOW_URL = f"{BASE_URL}/wm/staticflowpusher/json"
+LIST_SWITCH_FLOWS_URL = f"{BASE_URL}/wm/staticflowpusher/list/{{dpid}}/json"
+
+
+class SdnConnectionManager:
+    """
+    Gestiona la creación y el borrado de conexiones dinámicas en la red SDN.
+    Una misma instancia puede atender muchas peticiones (ver sdn_daemon.py):
+    la sesión HTTP y la caché de dispositivos se reutilizan entre ellas.
+    """
+    def __init__(self, device_cache=None, flow_pusher=None, topology=None, modo_flujos=FLOW_MODE,
+                 flow_registry=None, policy=None, cluster=None, comprobar_flujos=FLOW_CHECK, instantanea=SNAPSHOT_PATH):
+        self.modo_flujos = modo_flujos
+        # Instancias de Floodlight y reparto de switches (None = un solo controlador)
+        self.cluster = cluster or default_cluster(REQUEST_TIMEOUT, log)
+        # Política de acceso rol -> servicios, compilada en memoria y recargada si cambia la base
+        self.policy = policy or PolicyTable(default=DEFAULT_POLICY)
+        # Registro persistente de los flujos instalados por MAC, rol y DPID
+        self.flow_registry = flow_registry or FlowRegistry()
+        # Referencias de los flujos de tránsito compartidos (solo en modo compilado), guardadas
+        # también en el registro para no perderlas al reiniciar ni entre procesos sin demonio
+        self.shared_flows = SharedFlowTable()
+        self.shared_flows.load({self._shared_owner(mac): names
+                                for mac, names in self.flow_registry.shared_flows().items()})
+        # Sesión HTTP con keep-alive hacia Floodlight
+        self.session = requests.Session()
+        # Envío concurrente de flujos sobre la misma sesión (pool de conexiones)
+        self.flow_pusher = flow_pusher or FlowPusher(
+            STATIC_FLOW_URL, timeout=REQUEST_TIMEOUT, session=self.session, logger=log, cluster=self.cluster)
+        # Índice MAC -> (dpid, puerto) compartido por todas las búsquedas del gestor
+        self.device_cache = device_cache or DeviceCache(
+            DEVICE_API_URL, timeout=REQUEST_TIMEOUT, session=self.session, logger=log, cluster=self.cluster)
+        # Grafo de la topología con árboles de caminos mínimos hacia cada servidor
+        self.topology = topology or TopologyGraph(
+            LINKS_API_URL, timeout=REQUEST_TIMEOUT, session=self.session, logger=log, cluster=self.cluster)
+        # Índice de los flujos instalados para detectar solapamientos antes de enviar (None = sin comprobar)
+        self.flow_checker = FlowChecker(self._list_flows, comprobar_flujos, logger=log) if comprobar_flujos else None
+        # Fichero de la instantánea del estado ("" = sin instantánea)
+        self.instantanea = instantanea
+        self._snapshot = None
+        # Estado del controlador consultado al cargar: (ControllerEpoch, instante)
+        self._epoch = None
+        # Descargas hechas hasta la última carga o escritura de la instantánea
+        self._snapshot_marks = None
+
+    @staticmethod
+    def _shared_owner(mac):
+        return mac.replace(':', '').lower()
+
+    def _acquire_shared(self, mac, compartidos):
+        """
+        Registra los flujos compartidos que usa una MAC. Retorna (flujos_a_instalar, nombres_a_borrar).
+        """
+        nuevos, huerfanos = self.shared_flows.acquire(self._shared_owner(mac), compartidos)
+        self.flow_registry.register_shared(mac, [f["name"] for f in compartidos])
+        return nuevos, huerfanos
+
+    def _release_shared(self, macs):
+        """
+        Libera los flujos compartidos de varias MACs. Retorna mac -> nombres que quedaron sin dueño.
+        """
+        huerfanos = {mac: self.shared_flows.release(self._shared_owner(mac)) for mac in macs}
+        self.flow_registry.forget_shared(macs)
+        return huerfanos
+
+    def _get_attachment_point(self, host_mac):
+        """
+        Encuentra el punto de conexión (DPID del switch y puerto) para una MAC dada.
+        Retorna una tupla (dpid, port) o (None, None) si no se encuentra.
+        Solo consulta a Floodlight si la MAC no está en la caché o su entrada caducó.
+        """
+        log(f"[*] Buscando punto de conexión para la MAC: {host_mac}...")
+        dpid, port = self.device_cache.get_attachment_point(host_mac)
+        if dpid and port:
+            log(f"  [+] Encontrado en Switch DPID: {dpid}, Puerto: {port}")
+            return dpid, port
+
+        log(f"  [-] Advertencia: No se encontró el punto de conexión para {host_mac}.")
+        return None, None
+
+    def _get_route(self, src_dpid, src_port, dst_dpid, dst_port):
+        """
+        Obtiene la ruta entre dos puntos de la topología.
+        La ruta es una lista de diccionarios que representan los saltos.
+        """
+        path = f"/{src_dpid}/{src_port}/{dst_dpid}/{dst_port}/json"
+        log(f"[*] Solicitando ruta: {src_dpid}/{src_port} -> {dst_dpid}/{dst_port}")
+        if self.cluster is not None:
+            # Se pregunta primero a la instancia del switch de origen y, si no conoce un
+            # camino (el destino está en otro dominio), a las demás
+            candidatas = self.cluster.targets(src_dpid)
+            candidatas += [c for c in self.cluster.available() if c not in candidatas]
+            for controller in candidatas:
+                route = self._request_route(controller.url(ROUTE_PATH + path), controller.session)
+                if route:
+                    return route
+            return None
+        return self._request_route(ROUTE_API_URL + path, self.session)
+
+    def _request_route(self, url, session):
+        with span("route.api") as s:
+            try:
+                response = session.get(url, timeout=REQUEST_TIMEOUT)
+                s.set_response(response)
+                response.raise_for_status()
+                route = response.json()
+                # La API devuelve una lista de saltos. Un salto es un par (switch, enlace).
+                if route and len(route) > 0:
+                    log(f"  [+] Ruta encontrada con {len(route) // 2} saltos.")
+                    return route
+                else:
+                    log("  [-] No se encontró una ruta válida.")
+                    return None
+            except requests.RequestException as e:
+                log(f"  [!] Error al obtener la ruta de Floodlight: {e}")
+                return None
+
+    def _get_routes(self, src_dpid, src_port, dst_dpid, dst_port):
+        """
+        Obtiene la ruta directa y la inversa entre dos puntos de conexión.
+        Se resuelven con el grafo local de la topología; solo si este no conoce un camino
+        se consulta /wm/topology/route en ambas direcciones.
+        """
+        ruta_directa, ruta_inversa = self.topology.routes(src_dpid, src_port, dst_dpid, dst_port)
+        if ruta_directa and ruta_inversa:
+            log(f"[*] Ruta local {src_dpid}/{src_port} <-> {dst_dpid}/{dst_port}: {len(ruta_directa) // 2} saltos.")
+            return ruta_directa, ruta_inversa
+
+        log("  [-] La topología local no tiene un camino, consultando a Floodlight.")
+        return (self._get_route(src_dpid, src_port, dst_dpid, dst_port),
+                self._get_route(dst_dpid, dst_port, src_dpid, src_port))
+
+    def precalentar(self):
+        """
+        Carga la tabla de dispositivos y la topología, y calcula los árboles de caminos
+        hacia los servidores de la política, para que el primer login no pague ese coste.
+        """
+        servidores = self.device_cache.lookup_many([mac for mac, _ in self.policy.hosts()])
+        if servidores:
+            self.topology.precompute({dpid for dpid, _ in servidores.values()})
+
+    def _controller_epoch(self):
+        if self._epoch is not None and time.monotonic() - self._epoch[1] < EPOCH_REUSE:
+            return self._epoch[0]
+        epoch = controller_epoch(BASE_URL, self.session, REQUEST_TIMEOUT, self.cluster)
+        if epoch is not None:
+            self._epoch = (epoch, time.monotonic())
+        return epoch
+
+    def _state_marks(self):
+        """
+        Identifica las descargas hechas (tabla de dispositivos, enlaces, lista de flujos) para
+        no reescribir la instantánea si no hay nada nuevo.
+        """
+        return (self.device_cache.stats["refreshes"], self.topology.downloaded_at,
+                self.flow_checker.loaded_at if self.flow_checker is not None else None)
+
+    def cargar_estado(self):
+        """
+        Arranque en caliente: parte de la instantánea guardada en lugar de descargar el estado.
+        Se valida con el tiempo en marcha y el resumen del controlador (dos respuestas de
+        pocos bytes). Con la misma ejecución del controlador, los mismos switches, hosts y
+        enlaces, y menos de SNAPSHOT_MAX_AGE segundos, los dispositivos y enlaces se dan
+        por buenos. Si no, los enlaces se descargan y los dispositivos conservan su antigüedad
+        (o, si el controlador se reinició, cuentan como caducados) y se vuelven a consultar
+        uno a uno al pedirlos. Los flujos solo se usan si son de
+        la misma ejecución y más recientes que INDEX_MAX_AGE. Retorna True si se cargó.
+        """
+        if not self.instantanea:
+            return False
+        with span("snapshot.load") as s:
+            snapshot = StateSnapshot.open(self.instantanea)
+            if snapshot is None:
+                s.set(resultado="sin_instantanea")
+                return False
+            epoch = self._controller_epoch()
+            if epoch is None:
+                snapshot.close()
+                s.set(resultado="sin_controlador")
+                return False
+            now = time.time()
+            mismo = same_run(epoch, snapshot.epoch)
+            dispositivos = (mismo and now - snapshot.devices_at < SNAPSHOT_MAX_AGE
+                            and (epoch.switches, epoch.hosts) == (snapshot.epoch.switches, snapshot.epoch.hosts))
+            edad = 0.0 if dispositivos else max(0.0, now - snapshot.devices_at) if mismo else float("inf")
+            self.device_cache.load_snapshot(snapshot, edad)
+            enlaces = (mismo and snapshot.links_at and now - snapshot.links_at < SNAPSHOT_MAX_AGE
+                       and (epoch.switches, epoch.links) == (snapshot.epoch.switches, snapshot.epoch.links))
+            if enlaces:
+                self.topology.load_links(snapshot.links(), snapshot.links_at)
+            flujos = (self.flow_checker is not None and mismo and snapshot.flows_at
+                      and now - snapshot.flows_at < INDEX_MAX_AGE)
+            if flujos:
+                entries = snapshot.flows()
+                flujos = entries is not None
+                if flujos:
+                    self.flow_checker.seed(entries, snapshot.flows_at)
+            s.set(dispositivos=len(snapshot), confirmados=dispositivos, enlaces=bool(enlaces), flujos=bool(flujos))
+        # La instantánea sigue mapeada: el índice de dispositivos lee de ella bajo demanda
+        self._snapshot = snapshot
+        self._snapshot_marks = self._state_marks()
+        log(f"[*] Instantánea de hace {now - snapshot.created:.0f} s cargada: {len(snapshot)} dispositivos "
+            f"({'confirmados' if dispositivos else 'por revalidar'}), enlaces {'sí' if enlaces else 'no'}, "
+            f"flujos {'sí' if flujos else 'no'}.")
+        return True
+
+    def guardar_estado(self, forzar=False):
+        """
+        Guarda la instantánea del estado si se ha descargado algo desde la última carga o
+        escritura (o siempre, con 'forzar'). Retorna True si se escribió.
+        """
+        if not self.instantanea:
+            return False
+        marks = self._state_marks()
+        if not forzar and marks == self._snapshot_marks:
+            return False
+        with span("snapshot.save") as s:
+            epoch = self._controller_epoch()
+            if epoch is None:
+                return False
+            devices, ips, devices_at = self.device_cache.export()
+            links, links_at = self.topology.export_links()
+            flows, flows_at = self.flow_checker.export() if self.flow_checker is not None else (None, None)
+            try:
+                size = write_snapshot(self.instantanea, epoch, devices, devices_at, ips,
+                                      links, links_at or 0.0, flows, flows_at or 0.0)
+            except OSError as e:
+                log(f"  [!] No se pudo guardar la instantánea del estado en {self.instantanea}: {e}")
+                return False
+            s.set(dispositivos=len(devices), enlaces=len(links), bytes=size)
+        self._snapshot_marks = marks
+        return True
+
+    def guardar_estado_periodicamente(self, intervalo):
+        """
+        Guarda la instantánea cada 'intervalo' segundos si hay algo nuevo (ver sdn_daemon.py).
+        """
+        while True:
+            time.sleep(intervalo)
+            try:
+                self.guardar_estado()
+            except Exception as e:
+                log(f"[!] Error al guardar la instantánea del estado: {e}")
+
+    def generar_flujos(self, rol, mac_origen):
+        """
+        Calcula los flujos que necesita la conexión de una MAC con un rol, sin instalarlos.
+        Retorna (flujos_usuario, flujos_compartidos), o (None, None) si no se pueden calcular.
+        Los flujos compartidos solo existen en modo compilado.
+        """
+        # 1. Validar rol y obtener los servicios permitidos
+        reglas = self.policy.rules(rol)
+        if not reglas:
+            log(f"[!] Error: Rol '{rol}' no es válido o no tiene servicios asignados.")
+            return None, None
+
+        for regla in reglas:
+            log(f"[*] Rol: {rol} -> Acceso permitido a {regla.protocolo.upper()}/{regla.puerto} en {regla.ip} ({regla.servicio})")
+
+        # 2. Encontrar el punto de conexión del origen y de los servidores
+        servidores = group_by_host(reglas)
+        with span("login.attachment_points"):
+            (dpid_origen, puerto_origen) = self._get_attachment_point(mac_origen)
+            destinos = self.device_cache.lookup_many([service_mac for (service_mac, _), _ in servidores])
+
+        if not dpid_origen or not puerto_origen:
+            log("[!] Error fatal: No se pudo localizar el host de origen en la red.")
+            return None, None
+
+        flujos_usuario, flujos_compartidos = [], []
+        for (service_mac, service_ip), reglas_servidor in servidores:
+            if service_mac not in destinos:
+                log(f"[!] Error: No se encontró el servidor {service_ip} ({service_mac}) en la red.")
+                continue
+            dpid_destino, puerto_destino_ap = destinos[service_mac]
+
+            # 3. Obtener la ruta en ambas direcciones
+            with span("login.routes"):
+                ruta_directa, ruta_inversa = self._get_routes(dpid_origen, puerto_origen, dpid_destino, puerto_destino_ap)
+
+            if not ruta_directa or not ruta_inversa:
+                log(f"[!] Error: No se pudo calcular la ruta completa hacia {service_ip}.")
+                continue
+
+            # 4. Construir los flujos hacia este servidor
+            with span("login.build", modo=self.modo_flujos):
+                if self.modo_flujos == MODE_COMPILED:
+                    propios, compartidos = compile_user_flows(mac_origen, service_mac, service_ip, reglas_servidor,
+                                                              ruta_directa, ruta_inversa)
+                    flujos_usuario += propios
+                    flujos_compartidos += compartidos
+                else:
+                    flujos_usuario += build_user_flows(mac_origen, service_mac, service_ip, reglas_servidor,
+                                                       ruta_directa, ruta_inversa)
+
+        if not flujos_usuario:
+            log("[!] Error fatal: No se pudo calcular ninguna conexión hacia los servidores del rol.")
+            return None, None
+        # Los flujos de sesión caducan solos; los compartidos se gestionan por referencias
+        with_timeouts(flujos_usuario, *self.policy.timeouts(rol))
+        return flujos_usuario, flujos_compartidos
+
+    def crear_conexion(self, rol, mac_origen):
+        """
+        Orquesta la creación de una conexión completa basada en el rol y la MAC de origen.
+        Retorna True si se generaron e instalaron los flujos, False si no.
+        """
+        with span("login.total", rol=rol, mac=mac_origen) as s:
+            ok = self._crear_conexion(rol, mac_origen)
+            s.set(ok=ok)
+            return ok
+
+    def _crear_conexion(self, rol, mac_origen):
+        log("\n--- Iniciando Creación de Conexión Dinámica ---")
+
+        flujos_a_instalar, compartidos = self.generar_flujos(rol, mac_origen)
+        if flujos_a_instalar is None:
+            return False
+
+        # Flujos de un login anterior de esta MAC: se sustituyen o se borran
+        anteriores = [name for name, _ in self.flow_registry.flows_for_mac(mac_origen)]
+        if self.flow_checker is not None:
+            solapamientos = self.flow_checker.check(flujos_a_instalar + compartidos, ignore=anteriores)
+            if not self.flow_checker.accepts(solapamientos):
+                log("[!] Error: Los flujos de la conexión chocan con flujos ya instalados; no se instalan.")
+                return False
+
+        flujos_a_borrar = []
+        if compartidos:
+            compartidos_nuevos, flujos_a_borrar = self._acquire_shared(mac_origen, compartidos)
+            log(f"[*] Modo compilado: {len(compartidos)} flujos de tránsito compartidos, "
+                f"{len(compartidos_nuevos)} sin instalar todavía.")
+            flujos_a_instalar = flujos_a_instalar + compartidos_nuevos
+
+        # Flujos de un login anterior de esta MAC que ya no corresponden (cambio de rol o de política)
+        nuevos = {f["name"] for f in flujos_a_instalar}
+        obsoletos = [name for name in anteriores if name not in nuevos]
+        if obsoletos:
+            log(f"[*] {len(obsoletos)} flujos de una sesión anterior ya no corresponden y se borrarán.")
+            flujos_a_borrar = flujos_a_borrar + obsoletos
+
+        # 5. Registrar e instalar todos los flujos generados, junto con el punto de conexión
+        # desde el que se calcularon (recién resuelto, así que sigue en la caché)
+        self.flow_registry.register(mac_origen, rol, [f for f in flujos_a_instalar if f["name"].startswith("conn-")],
+                                    attachment_point=self.device_cache.peek(mac_origen))
+        log(f"[*] Se generaron {len(flujos_a_instalar)} flujos. Procediendo con la instalación...")
+        with span("login.push", flujos=len(flujos_a_instalar)):
+            resultados = self.flow_pusher.install_many(flujos_a_instalar)
+            if flujos_a_borrar:
+                self.flow_pusher.delete_many(flujos_a_borrar)
+                if obsoletos:
+                    self.flow_registry.forget(obsoletos)
+        self._track_flows(flujos_a_instalar, resultados, flujos_a_borrar)
+        correctos, fallidos = summarize(resultados)
+        
+        log(f"[✓] Proceso de creación de conexión finalizado: {correctos} flujos instalados, {fallidos} fallidos.")
+        return fallidos == 0
+
+    def actualizar_conexion(self, rol, mac_origen):
+        """
+        Vuelve a calcular los flujos de una sesión ya instalada (p. ej. porque el host cambió
+        de punto de conexión) y reprograma solo los que cambian: los flujos se nombran por
+        switch, así que se envían los de los switches nuevos o cuyo puerto de salida cambió
+        y se borran los de los switches que ya no están en la ruta.
+        Retorna un diccionario con los contadores, o None si no se pudieron calcular los flujos.
+        """
+        with span("move.total", rol=rol, mac=mac_origen) as s:
+            log(f"\n--- Actualizando la conexión de {mac_origen} ---")
+            nuevos, compartidos = self.generar_flujos(rol, mac_origen)
+            if nuevos is None:
+                s.set(ok=False)
+                return None
+
+            anteriores = self.flow_registry.flow_bodies(mac_origen)
+            cambiados = [f for f in nuevos if anteriores.get(f["name"]) != f]
+            nombres = {f["name"] for f in nuevos}
+            obsoletos = [name for name in anteriores if name not in nombres]
+            a_instalar, a_borrar = list(cambiados), list(obsoletos)
+            if compartidos:
+                compartidos_nuevos, huerfanos = self._acquire_shared(mac_origen, compartidos)
+                a_instalar += compartidos_nuevos
+                a_borrar += huerfanos
+
+            # Primero los flujos nuevos y después los borrados: la ruta nueva ya está
+            # completa cuando desaparece la antigua
+            resultados = self.flow_pusher.install_many(a_instalar)
+            if a_borrar:
+                self.flow_pusher.delete_many(a_borrar)
+            self.flow_registry.register(mac_origen, rol, cambiados, attachment_point=self.device_cache.peek(mac_origen))
+            if obsoletos:
+                self.flow_registry.forget(obsoletos)
+            self._track_flows(a_instalar, resultados, a_borrar)
+
+            correctos, fallidos = summarize(resultados)
+            stats = {"flujos": len(nuevos), "sin_cambios": len(nuevos) - len(cambiados),
+                     "enviados": correctos, "fallidos": fallidos, "borrados": len(a_borrar)}
+            s.set(ok=fallidos == 0, **stats)
+            log(f"[✓] Conexión actualizada: {stats['sin_cambios']} de {len(nuevos)} flujos sin cambios, "
+                f"{correctos} enviados, {fallidos} fallidos, {len(a_borrar)} borrados.")
+            return stats
+
+    def _track_flows(self, flujos=(), resultados=(), borrados=()):
+        """
+        Refleja en el índice de solapamientos los flujos instalados con éxito y los borrados,
+        sin esperar a la siguiente descarga de la lista.
+        """
+        if self.flow_checker is not None:
+            instalados = {r.name for r in resultados if r.ok}
+            self.flow_checker.installed([f for f in flujos if f["name"] in instalados])
+            self.flow_checker.deleted(borrados)
+
+    def _list_flows(self, dpid="all"):
+        """
+        Descarga la lista de flujos estáticos de un switch o de todos ('all').
+        Retorna el diccionario DPID -> flujos o None. Con varias instancias de Floodlight,
+        la de un switch se pide a la instancia que lo controla y la completa se fusiona.
+        """
+        path = LIST_FLOWS_PATH.format(dpid=dpid)
+        if self.cluster is None:
+            return self._request_flows(LIST_SWITCH_FLOWS_URL.format(dpid=dpid), self.session)
+        if dpid != "all":
+            for controller in self.cluster.targets(dpid):
+                flows_by_dpid = self._request_flows(controller.url(path), controller.session)
+                if flows_by_dpid is not None:
+                    return flows_by_dpid
+            return None
+        with span("flows.list", url=path) as s:
+            results = self.cluster.get_each(path)
+            s.set(instancias=len(results))
+        if not results:
+            log("[!] Error: No se pudo obtener la lista de flujos de ninguna instancia de Floodlight.")
+            return None
+        merged = {}
+        for _, flows_by_dpid in results:
+            for switch, flows_list in flows_by_dpid.items():
+                merged.setdefault(switch, []).extend(flows_list)
+        # Así los borrados posteriores van directos a la instancia de cada switch
+        self.cluster.remember_flows({name: switch for switch, flows_list in merged.items()
+                                     for flow_dict in flows_list for name in flow_dict})
+        return merged
+
+    def _request_flows(self, url, session):
+        with span("flows.list", url=url) as s:
+            try:
+                response = session.get(url, timeout=REQUEST_TIMEOUT)
+                s.set_response(response)
+                response.raise_for_status()
+                return response.json()
+            except requests.RequestException as e:
+                log(f"[!] Error: No se pudo obtener la lista de flujos de Floodlight: {e}")
+                return None
+
+    @staticmethod
+    def _matching_flows(flows_by_dpid, flow_name_prefix):
+        """
+        Nombres de los flujos que empiezan por el prefijo. 'flows_by_dpid' es un diccionario
+        donde la clave es el DPID y el valor una LISTA de diccionarios de un solo elemento
+        cuya clave es el nombre del flujo.
+        """
+        matches = []
+        for dpid, flows_list in flows_by_dpid.items():
+            for flow_dict in flows_list:
+                for flow_name in flow_dict.keys():
+                    if flow_name.startswith(flow_name_prefix):
+                        log(f"  [+] Coincidencia encontrada en switch {dpid}: '{flow_name}'")
+                        matches.append(flow_name)
+        return matches
+
+    def _find_flows_on_path(self, mac_origen, flow_name_prefix):
+        """
+        Busca los flujos de una MAC listando solo los switches de sus rutas hacia los servidores
+        de la política (/list/<dpid>/json). Si las rutas no se pueden calcular o no aparece nada,
+        recurre a /list/all/json. Retorna la lista de nombres o None si no se pudo listar.
+        """
+        dpids = set()
+        dpid_origen, puerto_origen = self.device_cache.get_attachment_point(mac_origen)
+        servidores = self.device_cache.lookup_many([mac for mac, _ in self.policy.hosts()])
+        if dpid_origen:
+            for dpid_destino, puerto_destino_ap in servidores.values():
+                ruta_directa, ruta_inversa = self.topology.routes(dpid_origen, puerto_origen, dpid_destino, puerto_destino_ap)
+                dpids.update(hop['switch'] for hop in (ruta_directa or []) + (ruta_inversa or []))
+
+        if dpids:
+            log(f"[*] Listando flujos de {len(dpids)} switches de la ruta del usuario.")
+            listados = self.flow_pusher.executor.map(
+                lambda dpid: self._list_flows(dpid), dpids)
+            matches = []
+            for flows_by_dpid in listados:
+                if flows_by_dpid:
+                    matches += self._matching_flows(flows_by_dpid, flow_name_prefix)
+            if matches:
+                return matches
+
+        log("[*] Listando todos los flujos estáticos del controlador.")
+        all_flows_by_dpid = self._list_flows()
+        if all_flows_by_dpid is None:
+            log("[!] Error fatal: No se pudo obtener la lista de flujos de Floodlight.")
+            return None
+        return self._matching_flows(all_flows_by_dpid, flow_name_prefix)
+
+    def borrar_conexion(self, mac_origen):
+        """
+        Borra todos los flujos de conexión 'conn-<mac>-' asociados a una MAC.
+        Retorna el número de flujos borrados, o None si no se pudo listar los flujos.
+        """
+        with span("logout.total", mac=mac_origen) as s:
+            borrados = self._borrar_conexion(mac_origen)
+            s.set(borrados=borrados)
+            return borrados
+
+    def _borrar_conexion(self, mac_origen):
+        mac_sanitized = mac_origen.replace(':', '')
+        flow_name_prefix = f"conn-{mac_sanitized}-"
+
+        log(f"--- Iniciando borrado de todas las conexiones para la MAC: {mac_origen} ---")
+
+        # 1. Consultar el registro local de flujos instalados
+        flows_to_delete = [name for name, _ in self.flow_registry.flows_for_mac(mac_origen)]
+        if flows_to_delete:
+            log(f"[*] Registro local: {len(flows_to_delete)} flujos registrados para la MAC.")
+        else:
+            # 2. Registro frío: buscar por prefijo en los switches de la ruta del usuario
+            log(f"[*] Sin flujos en el registro, buscando flujos que comiencen con: '{flow_name_prefix}'")
+            flows_to_delete = self._find_flows_on_path(mac_origen, flow_name_prefix)
+            if flows_to_delete is None:
+                return None
+
+        # Flujos de tránsito compartidos (modo compilado) que esta MAC era la última en usar
+        flows_to_delete += self._release_shared([mac_origen])[mac_origen]
+
+        if not flows_to_delete:
+            log("\n[*] No se encontraron flujos de conexión para la MAC especificada.")
+            return 0
+
+        # 3. Borrar todas las coincidencias en paralelo
+        resultados = self.flow_pusher.delete_many(flows_to_delete)
+        self.flow_registry.forget([r.name for r in resultados if r.ok])
+        self._track_flows(borrados=[r.name for r in resultados if r.ok])
+        borrados, fallidos = summarize(resultados)
+        log(f"\n[✓] Proceso de borrado completado. Se eliminaron {borrados} flujos ({fallidos} fallidos).")
+        return borrados
+
+    def borrar_conexiones(self, macs):
+        """
+        Borra en un solo lote los flujos de conexión de varias MACs (p. ej. todos los logouts
+        del final de una clase). Los nombres salen del registro local; los de las MACs sin
+        flujos registrados se buscan por el prefijo 'conn-<mac>-' con una única descarga de la
+        lista de flujos para todo el lote. Los borrados se envían agrupados por switch.
+        Retorna mac -> (borrados, fallidos), o None si no se pudo listar los flujos.
+        """
+        with span("logout.batch", macs=len(macs)) as s:
+            resultado = self._borrar_conexiones(macs)
+            if resultado is not None:
+                s.set(borrados=sum(b for b, _ in resultado.values()), fallidos=sum(f for _, f in resultado.values()))
+            return resultado
+
+    def _borrar_conexiones(self, macs):
+        # mac sin ':' -> MAC tal como se pidió
+        claves = {mac.replace(':', '').lower(): mac for mac in macs}
+        # nombre -> (mac, dpid o None)
+        flujos = {}
+        frias = set()
+        for clave, mac in claves.items():
+            registrados = self.flow_registry.flows_for_mac(mac)
+            flujos.update((name, (mac, dpid)) for name, dpid in registrados)
+            if not registrados:
+                frias.add(clave)
+
+        if frias:
+            log(f"[*] {len(frias)} MACs sin flujos en el registro: listando todos los flujos estáticos del controlador.")
+            all_flows_by_dpid = self._list_flows()
+            if all_flows_by_dpid is None:
+                return None
+            for dpid, flows_list in all_flows_by_dpid.items():
+                for flow_dict in flows_list:
+                    for name in flow_dict:
+                        partes = name.split('-', 2)
+                        if partes[0] == "conn" and len(partes) == 3 and partes[1] in frias:
+                            flujos[name] = (claves[partes[1]], dpid)
+
+        for mac, huerfanos in self._release_shared(list(claves.values())).items():
+            for name in huerfanos:
+                flujos.setdefault(name, (mac, None))
+
+        por_switch = {}
+        for name, (mac, dpid) in flujos.items():
+            por_switch.setdefault(dpid, []).append(name)
+        if self.cluster is not None:
+            self.cluster.remember_flows({name: dpid for name, (_, dpid) in flujos.items() if dpid is not None})
+
+        resultado = {mac: (0, 0) for mac in macs}
+        if not flujos:
+            return resultado
+        nombres = [name for dpid in sorted(por_switch, key=str) for name in por_switch[dpid]]
+        resultados = self.flow_pusher.delete_many(nombres)
+        self.flow_registry.forget([r.name for r in resultados if r.ok])
+        self._track_flows(borrados=[r.name for r in resultados if r.ok])
+        for r in resultados:
+            mac = flujos[r.name][0]
+            borrados, fallidos = resultado[mac]
+            resultado[mac] = (borrados + r.ok, fallidos + (not r.ok))
+        borrados, fallidos = summarize(resultados)
+        log(f"[✓] Borrado por lotes: {len(macs)} MACs, {borrados} flujos en {len(por_switch)} switches ({fallidos} fallidos).")
+        return resultado
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
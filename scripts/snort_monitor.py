@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Mitigación automática (R3): sigue la salida de alertas de Snort, agrega las alertas por
+# host de origen en una ventana deslizante y pone en cuarentena a los que superan el umbral.
+#
+#   python3 snort_monitor.py --fast /var/log/snort/alert --umbral 500 --ventana 10
+#   python3 snort_monitor.py --u2 /var/log/snort/snort.u2 --cuarentena /var/lib/sdn/cuarentena.db
+#
+# Las alertas se leen por bloques y se cuentan en bloque; los hosts que cruzan el umbral
+# se acumulan y se ponen en cuarentena en lotes cada --lote-ms, con una única descarga de
+# la tabla de dispositivos y un único envío concurrente por lote. Un host ya en cuarentena
+# no vuelve a generar peticiones, por muchas alertas que siga produciendo.
+
+import os
+import re
+import sys
+import time
+import struct
+import socket
+import argparse
+import threading
+from collections import deque, Counter
+
+from default_flows import (CONTROLLER_MAC, RADIUS_SERVER_IP, STATIC_FLOW_URL, REQUEST_TIMEOUT,
+                           build_quarantine_flows, quarantine_flow_names, runtime, load_hosts, save_hosts)
+from flow_pusher import FlowPusher
+from log_tail import FileTail, percentile
+from metrics import span
+
+# --- CONFIGURACIÓN ---
+# Alertas de un host en la ventana a partir de las cuales se pone en cuarentena
+DEFAULT_THRESHOLD = 1000
+# Segundos de la ventana deslizante
+DEFAULT_WINDOW = 10
+
+# alert_fast: "... [**] {TCP} 10.0.0.5:1234 -> 10.0.0.3:80"
+ALERT_FAST_RE = re.compile(r"\} (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(?::\d+)? -> ")
+
+# unified2: tipos de registro
+U2_PACKET = 2
+U2_IDS_EVENT = 7
+U2_IDS_EVENT_V2 = 104
+# Desplazamiento de ip_source en los eventos IPv4 (nueve campos de 32 bits antes)
+U2_EVENT_IP_SOURCE = 36
+# Cabecera de un registro de paquete: 7 campos de 32 bits, linktype en el sexto
+U2_PACKET_HEADER = 28
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+class AlertFastTail(FileTail):
+    """
+    Salida alert_fast de Snort: una línea por alerta, sin MAC.
+    """
+    def _parse(self, data):
+        end = data.rfind(b"\n") + 1
+        return end, ALERT_FAST_RE.findall(data[:end].decode("latin-1")), {}
+
+
+class Unified2Tail(FileTail):
+    """
+    Salida unified2 de Snort. Los eventos IPv4 aportan la IP de origen; los registros de
+    paquete, la MAC de origen de la trama Ethernet, que evita consultar al controlador.
+    """
+    def _parse(self, data):
+        ips, learned = [], {}
+        offset = 0
+        while len(data) - offset >= 8:
+            kind, length = struct.unpack_from(">II", data, offset)
+            if len(data) - offset - 8 < length:
+                break
+            body = offset + 8
+            if kind in (U2_IDS_EVENT, U2_IDS_EVENT_V2) and length >= U2_EVENT_IP_SOURCE + 4:
+                start = body + U2_EVENT_IP_SOURCE
+                ips.append(socket.inet_ntoa(data[start:start + 4]))
+            elif kind == U2_PACKET and length >= U2_PACKET_HEADER + 34:
+                linktype = struct.unpack_from(">I", data, body + 20)[0]
+                frame = body + U2_PACKET_HEADER
+                # Ethernet con IPv4: MAC de origen en 6..12, IP de origen en 26..30
+                if linktype == 1 and data[frame + 12:frame + 14] == b"\x08\x00":
+                    mac = ':'.join(f"{b:02x}" for b in data[frame + 6:frame + 12])
+                    learned[socket.inet_ntoa(data[frame + 26:frame + 30])] = mac
+            offset = body + length
+        return offset, ips, learned
+
+
+class SlidingWindow:
+    """
+    Contadores de alertas por host en los últimos 'seconds' segundos, en cubos de un segundo.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        # (segundo, Counter) del más antiguo al más reciente
+        self.buckets = deque()
+        self.totals = Counter()
+
+    def _expire(self, second):
+        while self.buckets and self.buckets[0][0] <= second - self.seconds:
+            _, old = self.buckets.popleft()
+            self.totals.subtract(old)
+            for key in old:
+                if self.totals[key] <= 0:
+                    del self.totals[key]
+
+    def add(self, keys, now):
+        """
+        Cuenta un bloque de alertas. Retorna los hosts del bloque con su total en la ventana.
+        """
+        second = int(now)
+        self._expire(second)
+        if not self.buckets or self.buckets[-1][0] != second:
+            self.buckets.append((second, Counter()))
+        counts = Counter(keys)
+        self.buckets[-1][1].update(counts)
+        self.totals.update(counts)
+        return {key: self.totals[key] for key in counts}
+
+
+class QuarantineBatcher:
+    """
+    Pone en cuarentena en lotes a los hosts detectados. Cada 'interval' segundos toma hasta
+    'max_hosts' hosts pendientes, los localiza con una sola consulta y envía sus flujos
+    'qtn-*' en paralelo. Los hosts ya en cuarentena o pendientes se ignoran. 'source' es el
+    detector que los entrega, y aparece en el registro de cuarentena y en las métricas.
+    Los flujos de sesión 'conn-*' (prioridad 32768) pasan por encima de los de cuarentena,
+    así que con 'manager' (SdnConnectionManager) el mismo lote cierra también las sesiones
+    de los hosts puestos en cuarentena.
+    """
+    def __init__(self, cache, pusher, interval=0.2, max_hosts=256, registry_path=None, protected=(), source="snort",
+                 manager=None):
+        self.cache = cache
+        self.source = source
+        self.pusher = pusher
+        self.manager = manager
+        self.interval = interval
+        self.max_hosts = max_hosts
+        self.registry_path = registry_path
+        self.protected = {p.lower() for p in protected}
+        # IP -> instante de detección
+        self.pending = {}
+        # IPs y MACs ya en cuarentena
+        self.blocked = set()
+        # IP -> MAC aprendidas de los paquetes de las alertas
+        self.learned = {}
+        # Latencias alerta -> bloqueo de los últimos hosts puestos en cuarentena
+        self.latencies = deque(maxlen=10000)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if registry_path and os.path.exists(registry_path):
+            self.blocked.update(m.lower() for m in load_hosts(registry_path))
+
+    def learn(self, learned):
+        with self._lock:
+            self.learned.update(learned)
+
+    def submit(self, ip, detected_at):
+        with self._lock:
+            if ip in self.blocked or ip in self.pending or ip in self.protected:
+                return False
+            mac = self.learned.get(ip)
+            if mac is not None and mac in self.blocked:
+                self.blocked.add(ip)
+                return False
+            self.pending[ip] = detected_at
+            return True
+
+    def submit_mac(self, mac, detected_at):
+        """
+        Como submit(), para un host identificado por su MAC en lugar de por su IP.
+        """
+        mac = mac.lower()
+        self.learn({mac: mac})
+        return self.submit(mac, detected_at)
+
+    def _locate(self, ips, learned):
+        """
+        Retorna ip -> (mac, dpid, port): las MACs aprendidas se resuelven por MAC y el
+        resto por IP, con como mucho una descarga de la tabla de dispositivos para cada grupo.
+        """
+        located = {}
+        if learned:
+            found = self.cache.lookup_many(list(set(learned.values())))
+            for ip, mac in learned.items():
+                if mac in found:
+                    located[ip] = (mac,) + found[mac]
+        unknown = [ip for ip in ips if ip not in learned]
+        if unknown:
+            located.update(self.cache.lookup_ips(unknown))
+        return located
+
+    def flush(self):
+        with self._lock:
+            batch = dict(list(self.pending.items())[:self.max_hosts])
+            learned = {ip: self.learned[ip] for ip in batch if ip in self.learned}
+        if not batch:
+            return
+
+        with span(f"{self.source}.quarantine_batch", hosts=len(batch)):
+            located = self._locate(batch, learned)
+            hosts = {}
+            for ip, (mac, dpid, port) in located.items():
+                if mac not in self.protected and mac not in self.blocked and mac not in hosts:
+                    hosts[mac] = (ip, dpid, port)
+            flows = [f for mac, (ip, dpid, port) in hosts.items() for f in build_quarantine_flows(mac, dpid, port)]
+            results = self.pusher.install_many(flows)
+            failed = {r.name for r in results if not r.ok}
+            quarantined = {mac for mac in hosts if not failed.intersection(quarantine_flow_names(mac))}
+            closed = self.manager.borrar_conexiones(sorted(quarantined)) if self.manager and quarantined else {}
+
+        now = time.monotonic()
+        with self._lock:
+            # Los hosts sin localizar o con fallos salen de la lista de pendientes: si
+            # siguen generando alertas, vuelven a entrar con el siguiente bloque.
+            for ip, detected_at in batch.items():
+                del self.pending[ip]
+                mac = located[ip][0] if ip in located else None
+                if mac is None:
+                    self.stats["sin_localizar"] += 1
+                elif mac in quarantined:
+                    self.latencies.append(now - detected_at)
+                    self.blocked.update((ip, mac))
+                elif mac in self.blocked:
+                    self.blocked.add(ip)
+                elif mac in hosts:
+                    self.stats["fallidos"] += 1
+            self.stats["bloqueados"] += len(quarantined)
+            if closed is not None:
+                self.stats["sesiones_cerradas"] += sum(1 for borrados, _ in closed.values() if borrados)
+
+        if quarantined:
+            log(f"[+] Cuarentena automática de {len(quarantined)} hosts: {', '.join(sorted(quarantined))}")
+            if closed is None:
+                log("[!] No se pudieron cerrar las sesiones de los hosts en cuarentena: sin lista de flujos.")
+            if self.registry_path:
+                save_hosts(self.registry_path, {mac: f"{self.source} {hosts[mac][0]}" for mac in quarantined})
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                log(f"[!] Error al aplicar cuarentenas: {e}")
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+class SnortMonitor:
+    """
+    Bucle principal: lee las alertas nuevas, las agrega y entrega al lote los hosts que
+    superan el umbral. Informa cada 'report_interval' segundos.
+    """
+    def __init__(self, tail, window, threshold, batcher, report_interval=5.0, poll_interval=0.05):
+        self.tail = tail
+        self.window = window
+        self.threshold = threshold
+        self.batcher = batcher
+        self.report_interval = report_interval
+        self.poll_interval = poll_interval
+        self.alerts = 0
+
+    def step(self):
+        """
+        Procesa lo que haya de nuevo en el fichero. Retorna el número de alertas leídas.
+        """
+        ips, learned = self.tail.read()
+        if learned:
+            self.batcher.learn(learned)
+        if not ips:
+            return 0
+        now = time.monotonic()
+        for ip, total in self.window.add(ips, now).items():
+            if total >= self.threshold:
+                self.batcher.submit(ip, now)
+        self.alerts += len(ips)
+        return len(ips)
+
+    def report(self, alerts, elapsed):
+        latencies = self.batcher.latencies
+        log(f"[*] {alerts / max(elapsed, 1e-9):.0f} alertas/s, {len(self.window.totals)} hosts en la ventana, "
+            f"{len(self.batcher.pending)} pendientes, {self.batcher.stats['bloqueados']} en cuarentena; "
+            f"alerta->bloqueo p50 {percentile(latencies, 50) * 1000:.0f} ms, p99 {percentile(latencies, 99) * 1000:.0f} ms")
+
+    def run(self):
+        last_report, last_alerts = time.monotonic(), 0
+        while True:
+            if not self.step():
+                time.sleep(self.poll_interval)
+            now = time.monotonic()
+            if now - last_report >= self.report_interval:
+                self.report(self.alerts - last_alerts, now - last_report)
+                last_report, last_alerts = now, self.alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cuarentena automática a partir de las alertas de Snort.")
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument('--fast', help="Fichero alert_fast de Snort.")
+    origen.add_argument('--u2', help="Fichero unified2 de Snort (o su prefijo, p. ej. /var/log/snort/snort.u2).")
+    parser.add_argument('--umbral', type=int, default=DEFAULT_THRESHOLD, help="Alertas de un host en la ventana para ponerlo en cuarentena.")
+    parser.add_argument('--ventana', type=int, default=DEFAULT_WINDOW, help="Segundos de la ventana deslizante.")
+    parser.add_argument('--lote-ms', type=float, default=200, help="Intervalo entre lotes de cuarentena.")
+    parser.add_argument('--max-lote', type=int, default=256, help="Hosts como máximo por lote.")
+    parser.add_argument('--cuarentena', help="Base SQLite donde se registran los hosts en cuarentena (la que usa el reconciliador con --hosts).")
+    parser.add_argument('--workers', type=int, default=32, help="Peticiones simultáneas al controlador por lote.")
+    parser.add_argument('--excluir', nargs='*', default=[], help="MACs o IPs que nunca se ponen en cuarentena.")
+    parser.add_argument('--desde-inicio', action='store_true', help="Procesar también las alertas ya escritas.")
+    parser.add_argument('--informe', type=float, default=5.0, help="Segundos entre informes.")
+    args = parser.parse_args()
+
+    tail = AlertFastTail(args.fast, args.desde_inicio) if args.fast else Unified2Tail(args.u2, args.desde_inicio)
+    protected = [CONTROLLER_MAC, RADIUS_SERVER_IP] + args.excluir
+    cluster, device_cache, _, _ = runtime()
+    pusher = FlowPusher(STATIC_FLOW_URL, timeout=REQUEST_TIMEOUT, max_workers=args.workers, logger=log, verbose=False,
+                        cluster=cluster)
+    from sdn_manager import SdnConnectionManager
+    manager = SdnConnectionManager(device_cache=device_cache, flow_pusher=pusher, cluster=cluster,
+                                   comprobar_flujos=None, instantanea="")
+    batcher = QuarantineBatcher(device_cache, pusher, args.lote_ms / 1000, args.max_lote,
+                                args.cuarentena, protected, manager=manager).start()
+    monitor = SnortMonitor(tail, SlidingWindow(args.ventana), args.umbral, batcher, args.informe)
+    log(f"[*] Siguiendo las alertas de {args.fast or args.u2} (umbral {args.umbral} alertas en {args.ventana} s)")
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        batcher.stop()
+        log("\n[*] Monitor de Snort detenido.")
+
+if __name__ == "__main__":
+    main()
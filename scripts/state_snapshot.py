@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Instantánea en disco del estado que el gestor reconstruye con llamadas REST al arrancar:
+# la tabla de dispositivos, los enlaces de la topología y, si se comprueban los solapamientos,
+# los flujos estáticos ya normalizados del índice de solapamientos (flow_index.py). Un proceso
+# nuevo la abre en milisegundos en lugar de descargar /wm/device/, /wm/topology/links/json y
+# /wm/staticflowpusher/list/all/json, y solo vuelve a pedir al controlador lo que haya cambiado.
+#
+# Formato (little-endian), pensado para abrirse con mmap sin decodificarlo entero:
+#   cabecera   firma, versión, instante de cada sección (segundos desde epoch), arranque del
+#              controlador y su resumen (switches, hosts, enlaces) cuando se guardó
+#   secciones  (desplazamiento, tamaño) de devices, ips, links y flows
+#   devices    registros de tamaño fijo ordenados por MAC: una MAC se busca por búsqueda
+#              binaria directamente sobre el fichero mapeado
+#   ips        (IPv4, MAC) ordenados por IP
+#   links      enlaces dirigidos
+#   flows      flujos de FlowIndex.export(), en JSON comprimido con zlib
+#
+#   python3 state_snapshot.py /tmp/sdn_state.snap      # muestra el contenido de una instantánea
+
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import struct
+import socket
+import argparse
+from collections import namedtuple
+
+import requests
+
+from controllers import SUMMARY_PATH, UPTIME_PATH
+
+# --- CONFIGURACIÓN ---
+MAGIC = b"SDNSNAP\x00"
+FORMAT_VERSION = 1
+# Diferencia máxima (segundos) entre dos cálculos del arranque del controlador para
+# considerar que sigue siendo la misma ejecución
+EPOCH_TOLERANCE = 5
+
+HEADER = struct.Struct("<8sIddddd3I")
+SECTION = struct.Struct("<QQ")
+SECTIONS = ("devices", "ips", "links", "flows")
+# MAC, DPID, puerto, lastSeen (segundos desde epoch)
+DEVICE = struct.Struct("<6sQId")
+# IPv4, MAC
+IP = struct.Struct("<4s6s")
+# DPID y puerto de origen, DPID y puerto de destino
+LINK = struct.Struct("<QIQI")
+
+# Arranque del controlador (segundos desde epoch) y su resumen, para validar una instantánea
+ControllerEpoch = namedtuple("ControllerEpoch", ["started", "switches", "hosts", "links"])
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def _mac_bytes(mac):
+    raw = bytes.fromhex(mac.replace(':', ''))
+    if len(raw) != 6:
+        raise ValueError(f"MAC no válida: {mac}")
+    return raw
+
+
+def _mac_text(raw):
+    return ':'.join(f"{b:02x}" for b in raw)
+
+
+def _dpid_int(dpid):
+    return int(dpid.replace(':', ''), 16)
+
+
+def _dpid_text(value):
+    return ':'.join(f"{b:02x}" for b in value.to_bytes(8, "big"))
+
+
+def controller_epoch(base_url, session=None, timeout=10, cluster=None):
+    """
+    Consulta el tiempo en marcha y el resumen del controlador (dos respuestas de pocos
+    bytes). Con 'cluster' se suman los resúmenes y el arranque es el de la instancia
+    arrancada más tarde; tienen que responder todas. Retorna un ControllerEpoch o None.
+    """
+    if cluster is not None:
+        uptimes = [data for _, data in cluster.get_each(UPTIME_PATH)]
+        summaries = [data for _, data in cluster.get_each(SUMMARY_PATH)]
+        if len(uptimes) != len(cluster) or len(summaries) != len(cluster):
+            return None
+    else:
+        session = session or requests
+        try:
+            uptimes, summaries = [], []
+            for path, results in ((UPTIME_PATH, uptimes), (SUMMARY_PATH, summaries)):
+                response = session.get(base_url + path, timeout=timeout)
+                response.raise_for_status()
+                results.append(response.json())
+        except (requests.RequestException, ValueError) as e:
+            log(f"  [!] Error al consultar el estado de Floodlight: {e}")
+            return None
+    now = time.time()
+    try:
+        return ControllerEpoch(
+            started=max(now - u["systemUptimeMsec"] / 1000.0 for u in uptimes),
+            switches=sum(int(s.get("# Switches", 0)) for s in summaries),
+            hosts=sum(int(s.get("# hosts", 0)) for s in summaries),
+            links=sum(int(s.get("# inter-switch links", 0)) for s in summaries))
+    except (KeyError, TypeError, ValueError) as e:
+        log(f"  [!] Respuesta inesperada del estado de Floodlight: {e}")
+        return None
+
+
+def same_run(a, b):
+    """
+    True si dos ControllerEpoch son de la misma ejecución del controlador.
+    """
+    return abs(a.started - b.started) < EPOCH_TOLERANCE
+
+
+def write_snapshot(path, epoch, devices=(), devices_at=0.0, ips=None, links=(), links_at=0.0, flows=None, flows_at=0.0):
+    """
+    Escribe una instantánea de forma atómica (fichero temporal y rename), de modo que un
+    proceso que tenga mapeada la anterior la sigue leyendo entera.
+    'devices' son tuplas (mac, dpid, puerto, lastSeen); 'ips' es ipv4 -> mac; 'links' son
+    tuplas (dpid, puerto, dpid, puerto); 'flows' es el resultado de FlowIndex.export().
+    Los elementos que no se pueden codificar (p. ej. puertos no numéricos) se omiten.
+    Retorna el tamaño en bytes.
+    """
+    device_records = []
+    for mac, dpid, port, last_seen in devices:
+        try:
+            device_records.append(DEVICE.pack(_mac_bytes(mac), _dpid_int(dpid), int(port), last_seen or 0.0))
+        except (ValueError, struct.error):
+            continue
+    ip_records = []
+    for ip, mac in (ips or {}).items():
+        try:
+            ip_records.append(IP.pack(socket.inet_aton(ip), _mac_bytes(mac)))
+        except (OSError, ValueError):
+            continue
+    link_records = []
+    for src, src_port, dst, dst_port in links:
+        try:
+            link_records.append(LINK.pack(_dpid_int(src), int(src_port), _dpid_int(dst), int(dst_port)))
+        except (ValueError, struct.error):
+            continue
+    # Los registros empiezan por la clave: ordenar los bytes es ordenar por MAC o por IP
+    device_records.sort()
+    ip_records.sort()
+    blobs = [b"".join(device_records), b"".join(ip_records), b"".join(link_records),
+             zlib.compress(json.dumps(flows, separators=(',', ':')).encode(), 1) if flows is not None else b""]
+
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    table = b""
+    for blob in blobs:
+        table += SECTION.pack(offset, len(blob))
+        offset += len(blob)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, time.time(), devices_at, links_at, flows_at if flows is not None else 0.0,
+                         epoch.started, epoch.switches, epoch.hosts, epoch.links)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header + table)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+    return offset
+
+
+class StateSnapshot:
+    """
+    Instantánea abierta con mmap. Las búsquedas de MAC e IP son búsquedas binarias sobre
+    el fichero mapeado, de modo que abrirla no decodifica nada: un proceso que solo
+    necesita dos o tres MACs lee unas pocas páginas.
+    """
+    def __init__(self, path, mm, header, sections):
+        self.path = path
+        self._mm = mm
+        _, _, self.created, self.devices_at, self.links_at, self.flows_at, started, switches, hosts, links = header
+        self.epoch = ControllerEpoch(started, switches, hosts, links)
+        # nombre -> (desplazamiento, tamaño en bytes)
+        self._sections = sections
+
+    @classmethod
+    def open(cls, path):
+        """
+        Abre una instantánea. Retorna None si no existe o no es válida.
+        """
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            header = HEADER.unpack_from(mm, 0)
+            sections = {name: SECTION.unpack_from(mm, HEADER.size + i * SECTION.size) for i, name in enumerate(SECTIONS)}
+        except struct.error:
+            mm.close()
+            return None
+        records = {"devices": DEVICE, "ips": IP, "links": LINK}
+        if (header[0] != MAGIC or header[1] != FORMAT_VERSION
+                or any(offset + size > len(mm) for offset, size in sections.values())
+                or any(sections[name][1] % record.size for name, record in records.items())):
+            mm.close()
+            return None
+        return cls(path, mm, header, sections)
+
+    def __len__(self):
+        return self._sections["devices"][1] // DEVICE.size
+
+    def _find(self, section, record, key):
+        """
+        Búsqueda binaria del registro cuya clave (sus primeros bytes) es 'key'.
+        """
+        offset, size = self._sections[section]
+        lo, hi = 0, size // record.size
+        count = hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = offset + mid * record.size
+            if self._mm[start:start + len(key)] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        start = offset + lo * record.size
+        if lo < count and self._mm[start:start + len(key)] == key:
+            return record.unpack_from(self._mm, start)
+        return None
+
+    def device(self, mac):
+        """
+        Retorna (dpid, puerto, lastSeen) de una MAC, o None si no está.
+        """
+        try:
+            found = self._find("devices", DEVICE, _mac_bytes(mac))
+        except ValueError:
+            return None
+        if found is None:
+            return None
+        _, dpid, port, last_seen = found
+        return _dpid_text(dpid), str(port), last_seen or None
+
+    def mac_for_ip(self, ip):
+        try:
+            found = self._find("ips", IP, socket.inet_aton(ip))
+        except OSError:
+            return None
+        return _mac_text(found[1]) if found is not None else None
+
+    def devices(self):
+        """
+        Produce (mac, dpid, puerto, lastSeen) de todos los dispositivos.
+        """
+        offset, size = self._sections["devices"]
+        for raw, dpid, port, last_seen in DEVICE.iter_unpack(self._mm[offset:offset + size]):
+            yield _mac_text(raw), _dpid_text(dpid), str(port), last_seen or None
+
+    def ips(self):
+        offset, size = self._sections["ips"]
+        return {socket.inet_ntoa(ip): _mac_text(mac) for ip, mac in IP.iter_unpack(self._mm[offset:offset + size])}
+
+    def links(self):
+        offset, size = self._sections["links"]
+        return [(_dpid_text(src), src_port, _dpid_text(dst), dst_port)
+                for src, src_port, dst, dst_port in LINK.iter_unpack(self._mm[offset:offset + size])]
+
+    def flows(self):
+        """
+        Flujos guardados (ver FlowIndex.export()), o None si no se guardaron.
+        """
+        offset, size = self._sections["flows"]
+        if not size:
+            return None
+        return json.loads(zlib.decompress(self._mm[offset:offset + size]))
+
+    def close(self):
+        self._mm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Muestra el contenido de una instantánea de estado del gestor SDN.")
+    parser.add_argument('fichero', help="Fichero de la instantánea (SDN_SNAPSHOT).")
+    parser.add_argument('--mac', nargs='*', default=[], help="MACs a buscar en la tabla de dispositivos.")
+    args = parser.parse_args()
+
+    snapshot = StateSnapshot.open(args.fichero)
+    if snapshot is None:
+        log(f"[!] {args.fichero} no existe o no es una instantánea válida.")
+        sys.exit(1)
+    now = time.time()
+    flows = snapshot.flows()
+    print(f"Instantánea de hace {now - snapshot.created:.0f} s ({os.path.getsize(args.fichero)} bytes)")
+    print(f"  Controlador arrancado hace {now - snapshot.epoch.started:.0f} s: {snapshot.epoch.switches} switches, "
+          f"{snapshot.epoch.hosts} hosts, {snapshot.epoch.links} enlaces")
+    print(f"  Dispositivos: {len(snapshot)} (de hace {now - snapshot.devices_at:.0f} s)")
+    print(f"  Enlaces: {len(snapshot.links())}" + (f" (de hace {now - snapshot.links_at:.0f} s)" if snapshot.links_at else ""))
+    if flows is not None:
+        print(f"  Flujos: {len(flows)} (de hace {now - snapshot.flows_at:.0f} s)")
+    for mac in args.mac:
+        print(f"  {mac}: {snapshot.device(mac)}")
+    snapshot.close()
+
+if __name__ == "__main__":
+    main()
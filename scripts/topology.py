@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import threading
+from collections import deque
+
+import requests
+
+from metrics import span
+from controllers import LINKS_PATH
+
+# --- CONFIGURACIÓN DE LA TOPOLOGÍA ---
+# Segundos tras los que se vuelve a consultar la lista de enlaces
+DEFAULT_MAX_AGE = 30
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def _hop(dpid, port):
+    """
+    Un elemento de ruta con el mismo formato que devuelve /wm/topology/route.
+    """
+    return {'switch': dpid, 'port': {'portNumber': port}}
+
+
+class TopologyGraph:
+    """
+    Grafo en memoria de switches y enlaces construido a partir de /wm/topology/links/json.
+
+    Para cada switch raíz (el punto de conexión de un servidor de servicios) se guarda
+    un árbol de caminos mínimos en saltos, igual que la ruta por defecto de Floodlight.
+    Con él, la ruta directa e inversa de cualquier usuario hacia ese servidor se obtiene
+    recorriendo el árbol, sin llamar a /wm/topology/route.
+
+    Con 'cluster' (ver controllers.py) el grafo es la unión de los enlaces que ve cada
+    instancia de Floodlight, de modo que las rutas cruzan de un dominio a otro.
+    """
+    def __init__(self, links_url, timeout=10, max_age=DEFAULT_MAX_AGE, session=None, logger=log, cluster=None):
+        self.links_url = links_url
+        self.cluster = cluster
+        self.timeout = timeout
+        self.max_age = max_age
+        self.session = session or requests
+        self.log = logger
+        # Conjunto de enlaces dirigidos (src_dpid, src_port, dst_dpid, dst_port)
+        self._links = set()
+        # dpid -> {vecino: {(puerto_local, puerto_vecino), ...}}; puede haber enlaces paralelos
+        self._adjacency = {}
+        # dpid raíz -> {dpid: (siguiente_dpid, puerto_salida, puerto_entrada_siguiente)}
+        self._trees = {}
+        self._last_refresh = None
+        # Instante (segundos desde epoch) de la última descarga de la lista de enlaces
+        self.downloaded_at = None
+        self._lock = threading.Lock()
+        # Solo un hilo descarga los enlaces a la vez
+        self._refresh_lock = threading.Lock()
+
+    def _stale(self):
+        return self._last_refresh is None or time.monotonic() - self._last_refresh >= self.max_age
+
+    def _ensure_fresh(self):
+        """
+        Descarga los enlaces si han caducado. Mientras un hilo los descarga, los demás siguen
+        con el grafo actual; solo esperan a la descarga si todavía no hay ninguno.
+        """
+        if not self._stale():
+            return
+        if self._refresh_lock.acquire(blocking=self._last_refresh is None):
+            try:
+                if self._stale():
+                    self._refresh()
+            finally:
+                self._refresh_lock.release()
+
+    def refresh(self):
+        """
+        Descarga la lista de enlaces y aplica solo los cambios. Retorna True si tuvo éxito.
+        """
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self):
+        with span("topology.links") as s:
+            if self.cluster is not None:
+                results = self.cluster.get_each(LINKS_PATH)
+                s.set(instancias=len(results))
+                if not results:
+                    self.log("  [!] Error al obtener los enlaces de Floodlight: ninguna instancia respondió.")
+                    return False
+                links = [link for _, instance_links in results for link in instance_links]
+                self.apply_links(links)
+                self.downloaded_at = time.time()
+                return True
+            try:
+                response = self.session.get(self.links_url, timeout=self.timeout)
+                s.set_response(response)
+                response.raise_for_status()
+                links = response.json()
+            except (requests.RequestException, ValueError) as e:
+                self.log(f"  [!] Error al obtener los enlaces de Floodlight: {e}")
+                return False
+        self.apply_links(links)
+        self.downloaded_at = time.time()
+        return True
+
+    def load_links(self, links, downloaded_at):
+        """
+        Parte de los enlaces dirigidos (src_dpid, src_port, dst_dpid, dst_port) de una
+        instantánea ya validada contra el controlador, como si se acabaran de descargar.
+        """
+        self.apply_links([{'src-switch': src, 'src-port': src_port, 'dst-switch': dst, 'dst-port': dst_port,
+                           'direction': 'unidirectional'} for src, src_port, dst, dst_port in links])
+        self.downloaded_at = downloaded_at
+
+    def export_links(self):
+        """
+        Retorna (enlaces dirigidos, instante de su descarga) para guardarlos en una
+        instantánea, o (set(), None) si aún no se han descargado.
+        """
+        with self._lock:
+            if self.downloaded_at is None:
+                return set(), None
+            return set(self._links), self.downloaded_at
+
+    def apply_links(self, links):
+        """
+        Sustituye el conjunto de enlaces por 'links' (formato de /wm/topology/links/json)
+        añadiendo y quitando solo las aristas que cambiaron. Los árboles de caminos mínimos
+        se descartan únicamente si la topología cambió.
+        """
+        new_links = set()
+        for link in links:
+            src, src_port = link['src-switch'], link['src-port']
+            dst, dst_port = link['dst-switch'], link['dst-port']
+            new_links.add((src, src_port, dst, dst_port))
+            if link.get('direction', 'bidirectional') == 'bidirectional':
+                new_links.add((dst, dst_port, src, src_port))
+
+        with self._lock:
+            added = new_links - self._links
+            removed = self._links - new_links
+            for src, src_port, dst, dst_port in removed:
+                neighbours = self._adjacency.get(src, {})
+                ports = neighbours.get(dst, set())
+                ports.discard((src_port, dst_port))
+                # El vecino sigue si queda otro enlace paralelo hacia él
+                if not ports:
+                    neighbours.pop(dst, None)
+                if not neighbours:
+                    self._adjacency.pop(src, None)
+            for src, src_port, dst, dst_port in added:
+                self._adjacency.setdefault(src, {}).setdefault(dst, set()).add((src_port, dst_port))
+            self._links = new_links
+            self._last_refresh = time.monotonic()
+            if added or removed:
+                self._trees.clear()
+                self.log(f"  [*] Topología actualizada: {len(self._adjacency)} switches, "
+                         f"+{len(added)}/-{len(removed)} enlaces.")
+
+    def switch_ports(self):
+        """
+        Conjunto de (dpid, puerto) que unen dos switches; el resto de puertos son de hosts.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return {(src, str(src_port)) for src, src_port, _, _ in self._links}
+
+    def _tree(self, root):
+        """
+        Árbol de caminos mínimos (BFS) hacia 'root'. Debe llamarse con el lock tomado.
+        """
+        tree = self._trees.get(root)
+        if tree is not None:
+            return tree
+        tree = {root: None}
+        queue = deque([root])
+        while queue:
+            current = queue.popleft()
+            # Los enlaces son simétricos: quien es vecino de 'current' puede llegar a él. De
+            # varios enlaces paralelos se usa siempre el de puertos menores.
+            for neighbour, ports in self._adjacency.get(current, {}).items():
+                if neighbour not in tree:
+                    local_port, neighbour_port = min(ports, key=lambda p: (str(p[0]), str(p[1])))
+                    tree[neighbour] = (current, neighbour_port, local_port)
+                    queue.append(neighbour)
+        self._trees[root] = tree
+        return tree
+
+    def precompute(self, root_dpids):
+        """
+        Calcula por adelantado los árboles de los switches raíz indicados.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            for root in root_dpids:
+                self._tree(root)
+
+    def routes(self, src_dpid, src_port, dst_dpid, dst_port):
+        """
+        Retorna (ruta_directa, ruta_inversa) entre dos puntos de conexión con el formato de
+        /wm/topology/route (pares entrada/salida por switch), o (None, None) si no hay camino.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            tree = self._tree(dst_dpid)
+            if src_dpid not in tree:
+                return None, None
+            # Saltos (dpid, puerto_entrada, puerto_salida) desde el origen hasta la raíz
+            hops = []
+            current, in_port = src_dpid, src_port
+            while tree[current] is not None:
+                next_dpid, out_port, next_in_port = tree[current]
+                hops.append((current, in_port, out_port))
+                current, in_port = next_dpid, next_in_port
+            hops.append((dst_dpid, in_port, dst_port))
+
+        forward, reverse = [], []
+        for dpid, in_port, out_port in hops:
+            forward += [_hop(dpid, in_port), _hop(dpid, out_port)]
+        for dpid, in_port, out_port in reversed(hops):
+            reverse += [_hop(dpid, out_port), _hop(dpid, in_port)]
+        return forward, reverse
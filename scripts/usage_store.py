@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Histórico del tráfico de cada sesión a partir de los contadores de los flujos 'conn-*' y
+# 'qtn-*' (los recoge bandwidth_monitor.py con --uso) y consultas sobre él:
+#
+#   python3 usage_store.py --desde 24h --top 10                  # los que más tráfico movieron, por rol
+#   python3 usage_store.py --desde 2026-10-01 --hasta 2026-10-08 --rol ROLE=estudiante --top 20
+#   python3 usage_store.py --mac fa:16:3e:f5:25:93 --desde 7d --paso 1h
+#
+# Almacén de solo añadir por columnas: cada día es un directorio con un fichero por columna
+# (arrays de ancho fijo: instante, MAC, rol, bytes y paquetes de subida, de bajada y
+# descartados por cuarentena), y las MACs y los roles se guardan una vez en diccionarios
+# (macs.txt, roles.txt) y en las columnas solo su número. Las consultas mapean las columnas
+# con mmap, localizan la ventana de tiempo por búsqueda binaria (las filas se añaden en
+# orden) y agregan con operaciones vectoriales de NumPy, sin crear un objeto por fila.
+# Un semestre se conserva o se archiva por días borrando o moviendo sus directorios.
+
+import os
+import sys
+import time
+import calendar
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+# --- CONFIGURACIÓN ---
+# Directorio del almacén (se puede cambiar con la variable de entorno SDN_USAGE_DIR)
+USAGE_PATH = os.environ.get("SDN_USAGE_DIR", "/tmp/sdn_usage")
+# Segundos de tráfico que se acumulan en memoria antes de añadir una fila por host
+DEFAULT_INTERVAL = 60
+
+# Columnas del almacén y su tipo en disco (little-endian)
+COLUMNS = (
+    ("time", "<u4"),            # fin del intervalo, segundos desde epoch
+    ("mac", "<u4"),             # número de la MAC en macs.txt
+    ("role", "<u2"),            # número del rol en roles.txt (0 = sin sesión)
+    ("tx_bytes", "<u8"),        # del host hacia los servicios (flujos 'fwd')
+    ("rx_bytes", "<u8"),        # de los servicios hacia el host (flujos 'rev')
+    ("dropped_bytes", "<u8"),   # descartado por su cuarentena ('qtn-*-drop-all')
+    ("tx_packets", "<u4"),
+    ("rx_packets", "<u4"),
+    ("dropped_packets", "<u4"),
+)
+# Columnas de tráfico, en el orden en que se reciben en append()
+TRAFFIC = [name for name, _ in COLUMNS[3:]]
+BYTES = TRAFFIC[:3]
+# Resumen de un día cerrado: una fila por (rol, MAC) con la suma de su tráfico
+ROLLUP_DTYPE = np.dtype([("mac", "<u4"), ("role", "<u2")] + [(name, "<u8") for name in TRAFFIC])
+
+# Tráfico de un host en una ventana de tiempo
+Usage = namedtuple("Usage", ["mac", "role", "tx_bytes", "rx_bytes", "dropped_bytes"])
+
+
+def log(message):
+    """
+    Función helper para imprimir mensajes a stderr, que es lo que freeRADIUS suele registrar.
+    """
+    print(message, file=sys.stderr)
+
+
+def _day(when):
+    return time.strftime("%Y-%m-%d", time.gmtime(when))
+
+
+class UsageStore:
+    """
+    Almacén por columnas del tráfico de cada host. Un solo proceso añade filas (el
+    colector); cualquiera puede consultarlo a la vez, porque una fila solo cuenta cuando
+    está escrita en todas las columnas.
+    """
+    def __init__(self, path=USAGE_PATH):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.macs = self._load_keys("macs.txt")
+        self.roles = self._load_keys("roles.txt")
+        if not self.roles:
+            self._add_key("roles.txt", self.roles, {}, "")
+        self._mac_ids = {mac: i for i, mac in enumerate(self.macs)}
+        self._role_ids = {role: i for i, role in enumerate(self.roles)}
+        # Segmento (día) en el que se está escribiendo y último instante escrito
+        self._segment = None
+        self._last_time = 0
+
+    def _refresh_keys(self):
+        """
+        Relee los diccionarios por si el colector (otro proceso) añadió MACs o roles: las
+        filas que los usan se escriben después que ellos.
+        """
+        for name, keys, ids in (("macs.txt", self.macs, self._mac_ids), ("roles.txt", self.roles, self._role_ids)):
+            for key in self._load_keys(name)[len(keys):]:
+                ids[key] = len(keys)
+                keys.append(key)
+
+    def _load_keys(self, name):
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def _add_key(self, name, keys, ids, key):
+        with open(os.path.join(self.path, name), "a") as f:
+            f.write(key + "\n")
+        ids[key] = len(keys)
+        keys.append(key)
+        return ids[key]
+
+    def _ids(self, name, keys, ids, values):
+        return np.array([ids[v] if v in ids else self._add_key(name, keys, ids, v) for v in values], dtype=np.int64)
+
+    @staticmethod
+    def _rows(segment):
+        """
+        Filas completas de un segmento: las que están escritas en todas las columnas.
+        """
+        rows = None
+        for name, dtype in COLUMNS:
+            try:
+                size = os.path.getsize(os.path.join(segment, name)) // np.dtype(dtype).itemsize
+            except FileNotFoundError:
+                size = 0
+            rows = size if rows is None else min(rows, size)
+        return rows
+
+    def _open_segment(self, day):
+        """
+        Prepara el segmento de un día para añadir filas, descartando una fila a medio
+        escribir si el colector se interrumpió durante una escritura.
+        """
+        segment = os.path.join(self.path, day)
+        os.makedirs(segment, exist_ok=True)
+        rows = self._rows(segment)
+        for name, dtype in COLUMNS:
+            column = os.path.join(segment, name)
+            if os.path.exists(column) and os.path.getsize(column) != rows * np.dtype(dtype).itemsize:
+                os.truncate(column, rows * np.dtype(dtype).itemsize)
+        if rows:
+            last = np.memmap(os.path.join(segment, "time"), dtype=COLUMNS[0][1], mode="r", shape=(rows,))[-1]
+            self._last_time = max(self._last_time, int(last))
+        self._segment = day
+        return segment
+
+    def append(self, when, macs, roles, traffic):
+        """
+        Añade una fila por host: 'macs' y 'roles' son listas y 'traffic' un array
+        (hosts x 6) con las columnas de TRAFFIC. Retorna el número de filas añadidas.
+        """
+        if not len(macs):
+            return 0
+        # Las filas de un segmento quedan en orden de tiempo aunque el reloj retroceda
+        when = max(int(when), self._last_time)
+        day = _day(when)
+        segment = os.path.join(self.path, day) if self._segment == day else self._open_segment(day)
+        columns = {
+            "time": np.full(len(macs), when),
+            "mac": self._ids("macs.txt", self.macs, self._mac_ids, macs),
+            "role": self._ids("roles.txt", self.roles, self._role_ids, roles),
+        }
+        traffic = np.asarray(traffic)
+        for i, name in enumerate(TRAFFIC):
+            columns[name] = np.round(traffic[:, i])
+        for name, dtype in COLUMNS:
+            with open(os.path.join(segment, name), "ab") as f:
+                f.write(columns[name].astype(dtype).tobytes())
+        self._last_time = when
+        return len(macs)
+
+    def _columns(self, segment, rows):
+        return {name: np.memmap(os.path.join(segment, name), dtype=dtype, mode="r", shape=(rows,))
+                for name, dtype in COLUMNS}
+
+    def _rollup(self, segment, rows):
+        """
+        Totales por (rol, MAC) de un día ya cerrado. Se calculan la primera vez que se
+        consulta el día entero y se guardan junto a sus columnas (rollup.<filas>.npy).
+        """
+        path = os.path.join(segment, f"rollup.{rows}.npy")
+        try:
+            return np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            pass
+        columns = self._columns(segment, rows)
+        keys, inverse = np.unique(columns["role"].astype(np.int64) << 32 | columns["mac"], return_inverse=True)
+        rollup = np.zeros(len(keys), dtype=ROLLUP_DTYPE)
+        rollup["role"], rollup["mac"] = keys >> 32, keys & 0xFFFFFFFF
+        for name in TRAFFIC:
+            rollup[name] = np.bincount(inverse, weights=columns[name], minlength=len(keys))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, rollup)
+            os.replace(tmp, path)
+            for name in os.listdir(segment):
+                if name.startswith("rollup.") and name.endswith(".npy") and os.path.join(segment, name) != path:
+                    os.remove(os.path.join(segment, name))
+        except OSError:
+            # Almacén de solo lectura: se recalcula en cada consulta
+            pass
+        return rollup
+
+    def _windows(self, start, end, rollups=False):
+        """
+        Produce, segmento a segmento, las columnas (arrays mapeados) de las filas con
+        start <= instante < end. Con 'rollups', de los días cerrados que caen enteros en la
+        ventana se produce su resumen por (rol, MAC), que no tiene columna 'time'.
+        """
+        first, last, today = _day(start), _day(max(start, end - 1)), _day(time.time())
+        for day in sorted(os.listdir(self.path)):
+            segment = os.path.join(self.path, day)
+            if not (first <= day <= last) or not os.path.isdir(segment):
+                continue
+            rows = self._rows(segment)
+            if not rows:
+                continue
+            day_start = calendar.timegm(time.strptime(day, "%Y-%m-%d"))
+            if rollups and day < today and start <= day_start and day_start + 86400 <= end:
+                yield self._rollup(segment, rows)
+                continue
+            columns = self._columns(segment, rows)
+            times = columns["time"]
+            lo, hi = np.searchsorted(times, start, "left"), np.searchsorted(times, end, "left")
+            if lo < hi:
+                yield {name: column[lo:hi] for name, column in columns.items()}
+
+    def _totals(self, start, end):
+        """
+        Bytes de subida, bajada y descartados por rol y MAC: array (3, roles, MACs).
+        """
+        self._refresh_keys()
+        size = len(self.roles) * len(self.macs)
+        totals = np.zeros((len(BYTES), size))
+        for window in self._windows(start, end, rollups=True):
+            key = window["role"].astype(np.int64) * len(self.macs) + window["mac"]
+            for i, name in enumerate(BYTES):
+                totals[i] += np.bincount(key, weights=window[name], minlength=size)
+        return totals.reshape(len(BYTES), len(self.roles), len(self.macs))
+
+    def top_talkers(self, start, end, n=10, role=None):
+        """
+        Retorna rol -> lista de Usage de los 'n' hosts que más bytes (subida, bajada y
+        descartados) movieron entre 'start' y 'end' (segundos desde epoch), de mayor a menor.
+        Con 'role', solo ese rol. Un host que cambió de rol aparece en cada uno con su parte.
+        """
+        totals = self._totals(start, end)
+        moved = totals.sum(axis=0)
+        role_ids = np.flatnonzero(moved.any(axis=1))
+        if role is not None:
+            role_ids = [r for r in role_ids if self.roles[r] == role]
+        talkers = {}
+        for role_id in role_ids:
+            row = moved[role_id]
+            candidates = np.flatnonzero(row) if np.count_nonzero(row) <= n else np.argpartition(-row, n)[:n]
+            order = candidates[np.argsort(-row[candidates], kind="stable")]
+            talkers[self.roles[role_id]] = [
+                Usage(self.macs[mac], self.roles[role_id], *(int(v) for v in totals[:, role_id, mac])) for mac in order]
+        return talkers
+
+    def by_role(self, start, end):
+        """
+        Retorna rol -> (hosts, bytes de subida, de bajada, descartados) entre 'start' y 'end'.
+        """
+        totals = self._totals(start, end)
+        hosts = (totals.sum(axis=0) > 0).sum(axis=1)
+        sums = totals.sum(axis=2)
+        return {self.roles[r]: (int(hosts[r]), *(int(v) for v in sums[:, r])) for r in np.flatnonzero(hosts)}
+
+    def history(self, mac, start, end, step):
+        """
+        Tráfico de una MAC entre 'start' y 'end' en intervalos de 'step' segundos.
+        Retorna una lista de (inicio del intervalo, bytes de subida, de bajada, descartados).
+        """
+        self._refresh_keys()
+        mac_id = self._mac_ids.get(mac.lower())
+        buckets = max(1, int(np.ceil((end - start) / step)))
+        totals = np.zeros((buckets, 3))
+        if mac_id is not None:
+            for window in self._windows(start, end):
+                select = window["mac"] == mac_id
+                bucket = ((window["time"][select] - start) // step).astype(np.intp)
+                for i, name in enumerate(BYTES):
+                    totals[:, i] += np.bincount(bucket, weights=window[name][select], minlength=buckets)
+        return [(start + i * step, *(int(v) for v in totals[i])) for i in range(buckets)]
+
+    def __len__(self):
+        total = 0
+        for day in os.listdir(self.path):
+            if os.path.isdir(os.path.join(self.path, day)):
+                total += self._rows(os.path.join(self.path, day))
+        return total
+
+
+class UsageRecorder:
+    """
+    Acumula en memoria el tráfico de cada host entre dos escrituras y cada 'interval'
+    segundos añade una fila por host con tráfico a 'store', con el rol de su sesión según
+    el registro de flujos ('registry', FlowRegistry) si se indica.
+    """
+    def __init__(self, store, registry=None, interval=DEFAULT_INTERVAL, logger=log):
+        self.store = store
+        self.registry = registry
+        self.interval = interval
+        self.log = logger
+        # Por posición de host: columnas de TRAFFIC acumuladas desde la última escritura
+        self.sums = np.zeros((0, len(TRAFFIC)))
+        self.macs = []
+        self._next = None
+        self.rows = 0
+
+    def add(self, macs, traffic, now):
+        """
+        Suma el tráfico de un sondeo: 'traffic' es un array (hosts x 6) cuya fila i es la
+        del host macs[i]. 'now' en segundos desde epoch.
+        """
+        if len(traffic) > len(self.sums):
+            self.sums = np.vstack([self.sums, np.zeros((max(len(traffic), 2 * len(self.sums)) - len(self.sums),
+                                                        len(TRAFFIC)))])
+        self.sums[:len(traffic)] += traffic
+        self.macs = macs
+        if self._next is None:
+            self._next = now + self.interval
+        elif now >= self._next:
+            self._next = max(self._next + self.interval, now)
+            self.flush(now)
+
+    def flush(self, now=None):
+        """
+        Añade al almacén las filas acumuladas. Retorna el número de filas añadidas.
+        """
+        active = np.flatnonzero(self.sums.any(axis=1))
+        if not len(active):
+            return 0
+        roles = {}
+        if self.registry is not None:
+            roles = dict(self.registry.sessions())
+        macs = [self.macs[i] for i in active]
+        try:
+            added = self.store.append(now or time.time(), macs, [roles.get(mac) or "" for mac in macs], self.sums[active])
+        except OSError as e:
+            self.log(f"[!] No se pudo guardar el histórico de tráfico en {self.store.path}: {e}")
+            return 0
+        self.sums[active] = 0
+        self.rows += added
+        return added
+
+
+def parse_time(text, now=None):
+    """
+    Instante (segundos desde epoch) de '24h', '7d', '30m' (hace tanto tiempo), 'ahora' o
+    una fecha ISO ('2026-10-01' o '2026-10-01T08:00', en hora local).
+    """
+    now = now or time.time()
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text == "ahora":
+        return now
+    if text[-1:] in units and text[:-1].replace('.', '', 1).isdigit():
+        return now - float(text[:-1]) * units[text[-1]]
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(text, fmt))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"instante no válido: {text}")
+
+
+def _duration(text):
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text[-1:] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def _mb(value):
+    return f"{value / 1e6:,.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas sobre el histórico de tráfico de las sesiones.")
+    parser.add_argument('--dir', default=USAGE_PATH, help=f"Directorio del almacén (por defecto {USAGE_PATH}).")
+    parser.add_argument('--desde', type=parse_time, default="24h", help="Inicio de la ventana: 24h, 7d, 2026-10-01... (por defecto 24h).")
+    parser.add_argument('--hasta', type=parse_time, default="ahora", help="Fin de la ventana (por defecto ahora).")
+    parser.add_argument('--top', type=int, default=10, help="Hosts por rol en la lista de los que más tráfico movieron.")
+    parser.add_argument('--rol', help="Solo este rol.")
+    parser.add_argument('--mac', help="Histórico de una MAC en lugar de la lista por rol.")
+    parser.add_argument('--paso', type=_duration, default=3600, help="Intervalo del histórico de --mac: 15m, 1h, 1d... (por defecto 1h).")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        log(f"[!] {args.dir} no existe: el histórico lo recoge 'bandwidth_monitor.py --uso'.")
+        sys.exit(1)
+    store = UsageStore(args.dir)
+    start = time.perf_counter()
+    if args.mac:
+        history = store.history(args.mac, args.desde, args.hasta, args.paso)
+        for when, tx, rx, dropped in history:
+            if tx or rx or dropped:
+                print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(when))}  subida {_mb(tx):>12}  "
+                      f"bajada {_mb(rx):>12}" + (f"  descartado {_mb(dropped)}" if dropped else ""))
+    else:
+        totals = store.by_role(args.desde, args.hasta)
+        talkers = store.top_talkers(args.desde, args.hasta, args.top, args.rol)
+        for role, usages in sorted(talkers.items()):
+            hosts, tx, rx, dropped = totals[role]
+            print(f"{role or '(sin sesión)'}: {hosts} hosts, subida {_mb(tx)}, bajada {_mb(rx)}"
+                  + (f", descartado {_mb(dropped)}" if dropped else ""))
+            for usage in usages:
+                print(f"  {usage.mac}  {_mb(usage.tx_bytes + usage.rx_bytes):>12}  (subida {_mb(usage.tx_bytes)}, "
+                      f"bajada {_mb(usage.rx_bytes)}" + (f", descartado {_mb(usage.dropped_bytes)}" if usage.dropped_bytes else "") + ")")
+    log(f"[*] Consulta resuelta en {(time.perf_counter() - start) * 1000:.1f} ms.")
+
+if __name__ == "__main__":
+    main()
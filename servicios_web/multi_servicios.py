@@ -1,5 +1,19 @@
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from threading import Thread
+import os
+import time
+import asyncio
+import argparse
+import mimetypes
+
+servicios = [
+    (8081, "Bienvenido al servidor de servicio1\n"),
+    (8082, "Bienvenido al servidor de servicio2\n"),
+    (8083, "Bienvenido al servidor de servicio3\n")
+]
+
+# Tamaño máximo de la cabecera de una petición en el modo asyncio
+MAX_CABECERA = 16 * 1024
 
 def iniciar_servicio(puerto, mensaje):
     class Handler(BaseHTTPRequestHandler):
@@ -12,15 +26,198 @@ def iniciar_servicio(puerto, mensaje):
     print(f"Servicio en puerto {puerto} iniciado.")
     server.serve_forever()
 
-servicios = [
-    (8081, "Bienvenido al servidor de servicio1\n"),
-    (8082, "Bienvenido al servidor de servicio2\n"),
-    (8083, "Bienvenido al servidor de servicio3\n")
-]
+def modo_clasico():
+    for puerto, mensaje in servicios:
+        Thread(target=iniciar_servicio, args=(puerto, mensaje), daemon=True).start()
+
+    # Mantener el proceso vivo
+    input("Presiona ENTER para detener los servicios...\n")
+
+# --- MODO ASYNCIO ---
+# Un único bucle de eventos atiende todos los puertos, con conexiones persistentes
+# (keep-alive). Las respuestas de cada servicio se codifican una sola vez al arrancar
+# y los ficheros de --estaticos se envían con sendfile.
+
+def respuesta(codigo, motivo, cuerpo=b"", tipo="text/plain; charset=utf-8", cerrar=False):
+    cabecera = (f"HTTP/1.1 {codigo} {motivo}\r\n"
+                f"Content-Type: {tipo}\r\n"
+                f"Content-Length: {len(cuerpo)}\r\n"
+                f"Connection: {'close' if cerrar else 'keep-alive'}\r\n\r\n").encode()
+    return cabecera + cuerpo
+
+NO_ENCONTRADO = respuesta(404, "Not Found", b"No encontrado\n")
+PETICION_INCORRECTA = respuesta(400, "Bad Request", b"", cerrar=True)
+
+def leer_peticion(cabecera):
+    """
+    Retorna (metodo, ruta, mantener_conexion, longitud_cuerpo) de una cabecera HTTP.
+    """
+    lineas = cabecera.decode("latin-1").split("\r\n")
+    metodo, ruta, version = lineas[0].split(" ", 2)
+    campos = {}
+    for linea in lineas[1:]:
+        if ":" in linea:
+            nombre, valor = linea.split(":", 1)
+            campos[nombre.strip().lower()] = valor.strip().lower()
+    conexion = campos.get("connection", "")
+    if version == "HTTP/1.0":
+        mantener = conexion == "keep-alive"
+    else:
+        mantener = conexion != "close"
+    return metodo, ruta.split("?", 1)[0], mantener, int(campos.get("content-length", 0) or 0)
+
+class ServicioAsyncio:
+    """
+    Servicio de un puerto. 'estaticos' es un directorio cuyos ficheros se sirven en /static/<nombre>.
+    """
+    def __init__(self, puerto, mensaje, estaticos=None):
+        self.puerto = puerto
+        self.estaticos = estaticos
+        self.ok = respuesta(200, "OK", mensaje.encode())
+        self.ok_cerrar = respuesta(200, "OK", mensaje.encode(), cerrar=True)
+
+    async def atender(self, reader, writer):
+        try:
+            while True:
+                try:
+                    cabecera = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                try:
+                    metodo, ruta, mantener, longitud = leer_peticion(cabecera)
+                except ValueError:
+                    writer.write(PETICION_INCORRECTA)
+                    await writer.drain()
+                    return
+                if longitud:
+                    await reader.readexactly(longitud)
+
+                if ruta.startswith("/static/") and self.estaticos:
+                    await self.enviar_fichero(writer, ruta[len("/static/"):], mantener)
+                elif metodo == "GET":
+                    writer.write(self.ok if mantener else self.ok_cerrar)
+                else:
+                    writer.write(NO_ENCONTRADO)
+                await writer.drain()
+                if not mantener:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def enviar_fichero(self, writer, nombre, mantener):
+        ruta = os.path.join(self.estaticos, os.path.basename(nombre))
+        if not nombre or not os.path.isfile(ruta):
+            writer.write(NO_ENCONTRADO)
+            return
+        tipo = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+        with open(ruta, "rb") as f:
+            tamano = os.fstat(f.fileno()).st_size
+            cabecera = (f"HTTP/1.1 200 OK\r\nContent-Type: {tipo}\r\nContent-Length: {tamano}\r\n"
+                        f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n").encode()
+            writer.write(cabecera)
+            await writer.drain()
+            # sendfile copia el fichero al socket desde el núcleo; si el transporte no lo
+            # admite, asyncio lo envía por bloques
+            await asyncio.get_running_loop().sendfile(writer.transport, f)
+
+async def servir_asyncio(host, estaticos):
+    servidores = []
+    for puerto, mensaje in servicios:
+        servicio = ServicioAsyncio(puerto, mensaje, estaticos)
+        servidores.append(await asyncio.start_server(servicio.atender, host, puerto,
+                                                     limit=MAX_CABECERA, backlog=1024))
+        print(f"Servicio en puerto {puerto} iniciado (asyncio).")
+    await asyncio.gather(*(s.serve_forever() for s in servidores))
+
+def modo_asyncio(host, estaticos):
+    try:
+        asyncio.run(servir_asyncio(host, estaticos))
+    except KeyboardInterrupt:
+        print("Servicios detenidos.")
+
+# --- PRUEBA DE CARGA ---
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+async def cliente(host, puerto, ruta, fin, latencias, errores):
+    """
+    Una conexión persistente que repite GET <ruta> hasta 'fin'.
+    """
+    peticion = f"GET {ruta} HTTP/1.1\r\nHost: {host}:{puerto}\r\n\r\n".encode()
+    reader = writer = None
+    while time.perf_counter() < fin:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, puerto)
+            inicio = time.perf_counter()
+            writer.write(peticion)
+            cabecera = await reader.readuntil(b"\r\n\r\n")
+            # Un servidor HTTP/1.0 (el modo clásico) cierra la conexión tras cada respuesta
+            longitud, cerrar = None, cabecera.startswith(b"HTTP/1.0")
+            for linea in cabecera.decode("latin-1").split("\r\n")[1:]:
+                nombre, _, valor = linea.partition(":")
+                if nombre.lower() == "content-length":
+                    longitud = int(valor)
+                elif nombre.lower() == "connection":
+                    cerrar = valor.strip().lower() == "close"
+            if longitud is not None:
+                await reader.readexactly(longitud)
+            else:
+                await reader.read()
+                cerrar = True
+            latencias.append(time.perf_counter() - inicio)
+            if cerrar:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            errores[0] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+async def carga(host, conexiones, duracion, ruta):
+    fin = time.perf_counter() + duracion
+    resultados = {}
+    tareas = []
+    for puerto, _ in servicios:
+        latencias, errores = [], [0]
+        resultados[puerto] = (latencias, errores)
+        tareas += [cliente(host, puerto, ruta, fin, latencias, errores) for _ in range(conexiones)]
+    inicio = time.perf_counter()
+    await asyncio.gather(*tareas)
+    total = time.perf_counter() - inicio
+
+    print(f"{'puerto':>6} {'peticiones':>10} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for puerto, (latencias, errores) in resultados.items():
+        print(f"{puerto:>6} {len(latencias):>10} {len(latencias) / total:>10.1f} "
+              f"{percentil(latencias, 50) * 1000:>8.2f} {percentil(latencias, 99) * 1000:>8.2f} {errores[0]:>8}")
 
-for puerto, mensaje in servicios:
-    Thread(target=iniciar_servicio, args=(puerto, mensaje), daemon=True).start()
+def main():
+    parser = argparse.ArgumentParser(description="Servicios web por rol (puertos 8081-8083).")
+    parser.add_argument('--modo', choices=["clasico", "asyncio"], default="clasico",
+                        help="'clasico': un HTTPServer por puerto; 'asyncio': un bucle de eventos para todos, con keep-alive.")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--estaticos', help="Directorio con ficheros a servir en /static/<nombre> (modo asyncio).")
+    parser.add_argument('--carga', metavar="HOST", help="No servir: lanzar una prueba de carga contra los servicios de HOST.")
+    parser.add_argument('--conexiones', type=int, default=50, help="Conexiones simultáneas por puerto en la prueba de carga.")
+    parser.add_argument('--duracion', type=float, default=10.0, help="Segundos que dura la prueba de carga.")
+    parser.add_argument('--ruta', default="/", help="Ruta pedida en la prueba de carga.")
+    args = parser.parse_args()
 
-# Mantener el proceso vivo
-input("Presiona ENTER para detener los servicios...\n")
+    if args.carga:
+        asyncio.run(carga(args.carga, args.conexiones, args.duracion, args.ruta))
+    elif args.modo == "asyncio":
+        modo_asyncio(args.host, args.estaticos)
+    else:
+        modo_clasico()
 
+if __name__ == "__main__":
+    main()